@@ -1,71 +1,61 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+import asyncio
 import tempfile
 import shutil
 import os
-from src import nfe_xml_parser, danfe_ocr_parser, hybrid_extractor
+from functools import partial
+from src import artifacts, classifier, cnpj_registry, config, csv_ingest, deadline, dedup, events, nfe_xml_parser, danfe_ocr_parser, hybrid_extractor, items, lanes, profiling, results, splitter, templates
+from src.fileutils import sha256_file
+from src.memory import WorkerRecycler
+from src.models import clean_cnpj
+from src.records import InvoiceRecord
+from fastapi.responses import StreamingResponse
+from src.serialization import json_response, render_invoice, render_invoices, sse_event
 
 app = FastAPI()
+recycler = WorkerRecycler()
 
 @app.post("/upload")
-async def upload_invoice(file: UploadFile = File(...)):
+async def upload_invoice(request: Request, file: UploadFile = File(...),
+                         itens_format: str = Query("rows", pattern="^(rows|columnar)$"),
+                         duplicates: str = Query("flag", pattern="^(flag|reject)$"),
+                         impostos_itens: bool = False):
     if not file.filename:
         raise HTTPException(status_code=400, detail="Nome de arquivo inválido")
     
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.filename}") as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        path = tmp.name
+    # Prazo da requisição (cabeçalho ou REQUEST_BUDGET_MS), checado entre páginas e etapas
+    request_deadline = deadline.from_headers(request.headers)
+    
+    path = await asyncio.to_thread(_save_upload, file)
 
     try:
         ext = path.split('.')[-1].lower()
+        # Hash e tipo pelo conteúdo (magic bytes, raiz do XML, camada de texto do PDF)
+        # fora do event loop: o hash de um upload de GB travaria todas as faixas
+        document_hash, doc_class = await asyncio.to_thread(identify, path)
         
-        # SISTEMA HÍBRIDO - Tenta múltiplas abordagens
-        invoice = None
-        extraction_method = "unknown"
-        
-        # PRIMEIRO: Tenta parser específico se for XML
-        if ext == "xml":
-            try:
-                invoice = nfe_xml_parser.extract_from_xml(path)
-                extraction_method = "xml_parser"
-            except Exception as e:
-                print(f"XML parser failed: {e}")
-        
-        # SEGUNDO: Tenta extração híbrida (regex + spaCy + IA)
-        if invoice is None or is_incomplete(invoice):
-            try:
-                hybrid_result = hybrid_extractor.extract_from_file(path, ext)
-                if hybrid_result and is_more_complete(hybrid_result, invoice):
-                    invoice = hybrid_result
-                    extraction_method = "hybrid"
-            except Exception as e:
-                print(f"Hybrid extraction failed: {e}")
-        
-        # TERCEIRO: Fallback para OCR especializado
-        if invoice is None or is_incomplete(invoice):
-            try:
-                if ext == "pdf":
-                    ocr_result = danfe_ocr_parser.extract_from_pdf(path)
-                elif ext in ("png", "jpg", "jpeg"):
-                    ocr_result = danfe_ocr_parser.extract_from_image(path)
-                else:
-                    ocr_result = None
-                
-                if ocr_result and is_more_complete(ocr_result, invoice):
-                    invoice = ocr_result
-                    extraction_method = "ocr"
-            except Exception as e:
-                print(f"OCR extraction failed: {e}")
-        
-        if invoice is None:
-            return {"error": "Não foi possível extrair dados da nota fiscal"}
-        
-        # Adiciona metadados sobre o método de extração
-        result = invoice if isinstance(invoice, dict) else invoice.model_dump()
-        result["extraction_method"] = extraction_method
-        result["extraction_completeness"] = calculate_completeness(result)
-        
-        return result
+        # Faixa pelo custo esperado: XML não espera atrás da fila de OCR
+        lane = lanes.lane_for(doc_class)
+        with deadline.scope(request_deadline):
+            work = asyncio.ensure_future(lanes.run(lane, process_document, path, ext, document_hash, doc_class,
+                                                   request.headers, itens_format, duplicates, impostos_itens))
+        watcher = asyncio.ensure_future(watch_disconnect(request, request_deadline, work))
+        try:
+            return await work
+        except asyncio.CancelledError:
+            if request_deadline.reason != deadline.CLIENT_DISCONNECTED or asyncio.current_task().cancelling():
+                raise
+            return json_response({"error": "Cliente desconectou"}, status_code=499)
+        finally:
+            watcher.cancel()
         
+    except deadline.DeadlineExceeded as e:
+        # Prazo esgotado ainda na fila da faixa: nada foi extraído
+        return json_response({"error": str(e), "parcial": True, "prazo": request_deadline.summary()},
+                             status_code=504)
+    except lanes.LaneOverloaded as e:
+        return json_response({"error": str(e), "faixa": e.lane}, status_code=503,
+                             headers={"Retry-After": str(config.LANE_RETRY_AFTER)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no processamento: {str(e)}")
     finally:
@@ -73,40 +63,443 @@ async def upload_invoice(file: UploadFile = File(...)):
             os.remove(path)
         except:
             pass
+        # Recicla o worker após N documentos ou RSS acima do limite
+        recycler.document_done()
+
+async def watch_disconnect(request: Request, request_deadline: deadline.Deadline, work: asyncio.Future):
+    """Cliente desconectado: cancela o prazo (a extração para no próximo ponto de checagem)"""
+    while not work.done():
+        if await request.is_disconnected():
+            request_deadline.cancel(deadline.CLIENT_DISCONNECTED)
+            if not request_deadline.admitted:
+                work.cancel()  # ainda na fila da faixa: nem começa
+            return
+        await asyncio.sleep(config.DISCONNECT_POLL_MS / 1000)
+
+@app.post("/upload/stream")
+async def upload_invoice_stream(request: Request, file: UploadFile = File(...),
+                                itens_format: str = Query("rows", pattern="^(rows|columnar)$"),
+                                duplicates: str = Query("flag", pattern="^(flag|reject)$"),
+                                impostos_itens: bool = False):
+    """Mesma extração do /upload com progresso em Server-Sent Events.
+
+    Eventos: classificacao, etapa (inicio/fim), pagina, campo (valor, fonte,
+    confianca) e, no fim, resultado (corpo do /upload) ou erro.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Nome de arquivo inválido")
+    
+    request_deadline = deadline.from_headers(request.headers)
+    path = await asyncio.to_thread(_save_upload, file)
+    ext = path.split('.')[-1].lower()
+    listener = events.EventListener()
+    
+    async def stream():
+        work = None
+        try:
+            document_hash, doc_class = await asyncio.to_thread(identify, path)
+            lane = lanes.lane_for(doc_class)
+            yield sse_event("classificacao", {**doc_class, "faixa": lane})
+            
+            with deadline.scope(request_deadline), events.scope(listener):
+                work = asyncio.ensure_future(lanes.run(lane, process_document, path, ext, document_hash,
+                                                       doc_class, request.headers, itens_format, duplicates,
+                                                       impostos_itens))
+            # Repassa os eventos da thread da faixa até a extração terminar
+            while True:
+                next_event = asyncio.ensure_future(listener.queue.get())
+                done, _ = await asyncio.wait({next_event, work}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event in done:
+                    yield sse_event(*next_event.result())
+                    continue
+                next_event.cancel()
+                break
+            while not listener.queue.empty():
+                yield sse_event(*listener.queue.get_nowait())
+            
+            response = work.result()
+            if isinstance(response, StreamingResponse):
+                body = b"".join([chunk async for chunk in response.body_iterator])
+            else:
+                body = response.body
+            yield sse_event("resultado" if response.status_code < 400 else "erro", body)
+        except deadline.DeadlineExceeded as e:
+            yield sse_event("erro", {"error": str(e), "parcial": True, "prazo": request_deadline.summary()})
+        except lanes.LaneOverloaded as e:
+            yield sse_event("erro", {"error": str(e), "faixa": e.lane})
+        except Exception as e:
+            yield sse_event("erro", {"error": f"Erro no processamento: {str(e)}"})
+        finally:
+            if work is not None and not work.done():
+                # Cliente fechou o stream: mesma política do watch_disconnect
+                request_deadline.cancel(deadline.CLIENT_DISCONNECTED)
+                if not request_deadline.admitted:
+                    work.cancel()
+                work.add_done_callback(lambda _: _remove(path))
+            else:
+                _remove(path)
+            recycler.document_done()
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _save_upload(file: UploadFile) -> str:
+    """Copia o upload para um arquivo temporário (em thread: pode ter GBs)"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.filename}") as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        return tmp.name
+
+def identify(path: str) -> tuple:
+    """(hash SHA-256, classificação) do documento; lê o arquivo, então roda fora do event loop"""
+    return sha256_file(path), classifier.classify(path)
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@app.get("/lanes")
+async def lane_metrics():
+    """Fila, vagas ocupadas e tempos de espera de cada faixa (deste worker)"""
+    return json_response(lanes.metrics())
+
+@app.get("/notas")
+def list_invoices(cnpj_emitente: str = None, cnpj_destinatario: str = None, numero: str = None,
+                  chave_acesso: str = None,
+                  data_inicio: str = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+                  data_fim: str = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+                  limit: int = Query(50, ge=1), cursor: str = None, itens: bool = False):
+    """Notas gravadas, mais recentes primeiro; passe `proximo` como `cursor` para a página seguinte"""
+    store = results.get_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Armazenamento de notas desligado (RESULTS_ENABLED)")
+    filters = {"cnpj_emitente": clean_cnpj(cnpj_emitente), "cnpj_destinatario": clean_cnpj(cnpj_destinatario),
+               "numero": numero, "chave_acesso": chave_acesso, "data_inicio": data_inicio, "data_fim": data_fim}
+    try:
+        return json_response(store.query(filters, limit, cursor, itens))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/notas/totais")
+def invoice_totals(cnpj_emitente: str = None, mes_inicio: str = Query(None, pattern=r"^\d{4}-\d{2}$"),
+                   mes_fim: str = Query(None, pattern=r"^\d{4}-\d{2}$")):
+    """Notas e valor total por emitente e mês (AAAA-MM)"""
+    store = results.get_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Armazenamento de notas desligado (RESULTS_ENABLED)")
+    return json_response({"totais": store.monthly_totals(clean_cnpj(cnpj_emitente), mes_inicio, mes_fim)})
+
+@app.get("/notas/{nota_id}")
+def get_invoice(nota_id: int):
+    store = results.get_store()
+    nota = store.get(nota_id) if store else None
+    if nota is None:
+        raise HTTPException(status_code=404, detail="Nota não encontrada")
+    return json_response(nota)
 
-def is_incomplete(invoice_data) -> bool:
+def process_document(path: str, ext: str, document_hash: str, doc_class: dict, headers,
+                     itens_format: str, duplicates: str, impostos_itens: bool = False):
+    """Separação, checagem de duplicatas e extração (roda na thread da faixa)"""
+    # Vários DANFEs no mesmo PDF: separa por nota (chave de acesso / FOLHA 1/N)
+    groups = None
+    if doc_class["formato"] == "pdf" and doc_class["paginas"] > 1 and doc_class["tipo"] in SPLIT_TYPES:
+        with profiling.stage("split"):
+            groups = splitter.split(path)
+        if len(groups) < 2:
+            groups = None
+    
+    # Duplicatas: hash do arquivo e chave de acesso (sem OCR/NER) antes das etapas caras
+    index = dedup.get_index()
+    duplicata = None
+    if index:
+        probe = [] if groups else dedup.probe_keys(path, doc_class["formato"])
+        duplicata = index.find([f"hash:{document_hash}"] + probe)
+        if duplicata and duplicates == "reject":
+            return json_response({"error": "Nota fiscal já processada", "duplicata": duplicata},
+                                 status_code=409)
+    
+    if groups:
+        return extract_many(path, groups, doc_class, document_hash, duplicates, itens_format)
+    
+    # CSV de ERP com colunas reconhecidas: notas agrupadas em streaming (senão, cascata normal)
+    if doc_class["formato"] == "csv":
+        response = ingest_csv(path, doc_class, document_hash, duplicates, itens_format)
+        if response is not None:
+            return response
+    
+    # Profiling opcional (cabeçalho com segredo ou amostragem); desligado não custa nada
+    if profiling.should_profile(headers):
+        with profiling.RequestProfile(document_hash) as profile:
+            invoice, meta = extract_invoice(path, ext, doc_class, document_hash)
+        profile.save()
+        meta["timings"] = profile.timings
+    else:
+        invoice, meta = extract_invoice(path, ext, doc_class, document_hash)
+    
+    if invoice is None:
+        if meta.get("parcial"):
+            return json_response({"error": "Prazo esgotado antes de extrair dados da nota fiscal",
+                                  "parcial": True, "prazo": meta["prazo"]}, status_code=504)
+        return json_response({"error": "Não foi possível extrair dados da nota fiscal"})
+    
+    # Mesma nota por outro canal (ex.: XML e foto do DANFE): chave de acesso ou CNPJ/série/número
+    if index:
+        duplicata = check_duplicate(index, invoice, meta, document_hash, duplicates, duplicata,
+                                    [f"hash:{document_hash}"])
+        if duplicata and duplicates == "reject":
+            return json_response({"error": "Nota fiscal já processada", "duplicata": duplicata},
+                                 status_code=409)
+    
+    # Fica gravada para consulta (GET /notas); a gravação é em lote, fora da resposta
+    results.save(invoice, meta, document_hash)
+    
+    # orjson direto (sem jsonable_encoder); itens em streaming se forem muitos;
+    # impostos item a item (XML da NF-e) só com ?impostos_itens=true
+    return render_invoice(invoice, meta, itens_format, impostos_itens)
+
+def check_duplicate(index, invoice: InvoiceRecord, meta: dict, document_hash: str,
+                    duplicates: str, duplicata: dict = None, extra_keys: list = ()) -> dict:
+    """Registra a nota no índice de duplicatas e devolve o registro anterior, se houver"""
+    # Consulta + gravação atômicas: envios simultâneos da mesma nota não passam os dois como novos
+    keys = dedup.record_keys(invoice) + list(extra_keys)
+    duplicata = index.claim(keys, document_hash, meta["extraction_method"]) or duplicata
+    if duplicata and duplicates != "reject":
+        meta["duplicata"] = duplicata
+    return duplicata
+
+def extract_many(path: str, groups: list, doc_class: dict, document_hash: str,
+                 duplicates: str, itens_format: str):
+    """PDF com várias notas: extrai cada grupo de páginas em paralelo"""
+    with profiling.stage("split_extract"):
+        # Os processos do pool recebem o tempo que resta do prazo
+        left = deadline.remaining()
+        budget_ms = max(1.0, left * 1000) if left is not None else 0
+        extracted = splitter.extract_groups(path, groups, partial(extract_part, budget_ms=budget_ms))
+    
+    index = dedup.get_index()
+    notas, falhas, rejeitadas = [], [], []
+    for pages, (invoice, meta) in zip(groups, extracted):
+        meta["paginas"] = [page + 1 for page in pages]
+        if invoice is None:
+            falhas.append(meta["paginas"])
+            continue
+        if index:
+            duplicata = check_duplicate(index, invoice, meta, document_hash, duplicates)
+            if duplicata and duplicates == "reject":
+                rejeitadas.append({"paginas": meta["paginas"], "duplicata": duplicata})
+                continue
+        notas.append((invoice, meta))
+        results.save(invoice, meta, document_hash)
+    if index:
+        index.claim([f"hash:{document_hash}"], document_hash, "split")
+    
+    meta = {"extraction_method": "split", "total_notas": len(notas), "classificacao": doc_class}
+    if any(note_meta.get("parcial") for _, note_meta in extracted):
+        meta["parcial"] = True
+    if falhas:
+        meta["paginas_sem_extracao"] = falhas
+    if rejeitadas:
+        meta["rejeitadas"] = rejeitadas
+    return render_invoices(notas, meta, itens_format)
+
+def ingest_csv(path: str, doc_class: dict, document_hash: str, duplicates: str, itens_format: str):
+    """CSV com uma linha por item: uma nota por grupo de linhas (None se as colunas não forem reconhecidas).
+
+    As notas vão para o armazenamento (GET /notas) à medida que são lidas; a
+    resposta só as traz inteiras até CSV_INLINE_MAX_NOTAS. Acima disso vem o
+    resumo com as contagens, e a memória fica limitada ao bloco do leitor.
+    """
+    try:
+        reader = csv_ingest.CsvReader(path)
+    except ValueError as e:
+        print(f"CSV sem esquema reconhecido: {e}")
+        return None
+    
+    index = dedup.get_index()
+    notas, rejeitadas = [], []
+    total = duplicadas = total_rejeitadas = 0
+    with profiling.stage("csv_ingest"):
+        for invoice in reader:
+            meta = {"extraction_method": "csv", "extraction_completeness": calculate_completeness(invoice)}
+            if invoice.itens:
+                meta["itens_conferencia"] = items.check_totals(invoice.itens, invoice.valor_total,
+                                                               invoice.valor_produtos)
+            if index:
+                duplicata = check_duplicate(index, invoice, meta, document_hash, duplicates)
+                if duplicata and duplicates == "reject":
+                    total_rejeitadas += 1
+                    if len(rejeitadas) < config.CSV_INLINE_MAX_NOTAS:
+                        rejeitadas.append({"numero": invoice.numero, "duplicata": duplicata})
+                    continue
+                duplicadas += duplicata is not None
+            results.save(invoice, meta, document_hash)
+            total += 1
+            if notas is not None:
+                notas.append((invoice, meta))
+                if len(notas) > config.CSV_INLINE_MAX_NOTAS:
+                    notas = None  # grande demais para a resposta: só o resumo
+    if index:
+        index.claim([f"hash:{document_hash}"], document_hash, "csv")
+    
+    meta = {"extraction_method": "csv", "total_notas": total, "classificacao": doc_class,
+            "csv": reader.stats()}
+    if reader.partial:
+        meta.update({"parcial": True, "prazo": deadline.current().summary()})
+    if duplicadas:
+        meta["duplicadas"] = duplicadas
+    if total_rejeitadas:
+        meta.update({"total_rejeitadas": total_rejeitadas, "rejeitadas": rejeitadas})
+    if notas is None:
+        meta["notas_na_resposta"] = False
+        meta["gravadas"] = results.get_store() is not None
+        return json_response(meta)
+    if len(notas) == 1 and not total_rejeitadas and not reader.partial:
+        invoice, note_meta = notas[0]
+        note_meta.update({"classificacao": doc_class, "csv": meta["csv"]})
+        return render_invoice(invoice, note_meta, itens_format)
+    return render_invoices(notas, meta, itens_format)
+
+def extract_part(path: str, budget_ms: float = 0) -> tuple:
+    """Extrai uma nota de um PDF separado (no processo do pool) com o prazo restante"""
+    with deadline.scope(deadline.Deadline(budget_ms)):
+        return extract_invoice(path, "pdf")
+
+# Engines por tipo de documento (src/classifier.py), na ordem de tentativa
+ROUTES = {
+    "nfe_xml": ("xml_parser", "hybrid"),
+    "danfe_pdf": ("template", "ocr", "hybrid"),
+    "danfe_scan": ("ocr",),
+    "nfse": ("hybrid", "ocr"),
+    "photo": ("ocr",),
+    "csv": ("hybrid",),
+}
+FALLBACK_ROUTE = ("xml_parser", "template", "hybrid", "ocr")
+IMAGE_EXTS = ("png", "jpg", "jpeg")
+SPLIT_TYPES = ("danfe_pdf", "nfce", "desconhecido")
+
+def route_for(doc_class: dict) -> tuple:
+    """Sequência de engines para o documento classificado"""
+    if doc_class["tipo"] == "nfce":
+        # NFC-e: XML estruturado ou DANFE NFC-e impresso
+        return ROUTES["nfe_xml"] if doc_class["formato"] == "xml" else ROUTES["danfe_pdf"]
+    return ROUTES.get(doc_class["tipo"], FALLBACK_ROUTE)
+
+def _content_ext(doc_class: dict, ext: str) -> str:
+    """Extensão coerente com o conteúdo (arquivos com extensão errada/ausente)"""
+    formato = doc_class["formato"]
+    if formato == "imagem":
+        return ext if ext in IMAGE_EXTS else "png"
+    return formato if formato in ("pdf", "xml", "csv") else ext
+
+def run_engine(engine: str, path: str, ext: str, state: dict) -> InvoiceRecord:
+    """Executa uma engine da cascata (None se ela não se aplica ao formato)"""
+    if engine == "xml_parser":
+        return nfe_xml_parser.extract_from_xml(path) if ext == "xml" else None
+    if engine == "template":
+        if ext != "pdf" or not config.TEMPLATES_ENABLED:
+            return None
+        # Emitente com layout conhecido -> leitura direta por coordenadas
+        state["layout"] = templates.read_layout(path)
+        return templates.extract(state["layout"]) if state["layout"] else None
+    if engine == "hybrid":
+        return hybrid_extractor.extract_from_file(path, ext)
+    if ext == "pdf":
+        return danfe_ocr_parser.extract_from_pdf(path)
+    if ext in IMAGE_EXTS:
+        return danfe_ocr_parser.extract_from_image(path)
+    return None
+
+def extract_invoice(path: str, ext: str, doc_class: dict = None, document_hash: str = None) -> tuple:
+    """Cascata de extração roteada pelo tipo do documento; retorna (registro, metadados)"""
+    if doc_class is None:
+        with profiling.stage("classify"):
+            doc_class = classifier.classify(path)
+    ext = _content_ext(doc_class, ext)
+    if document_hash is None and config.ARTIFACTS_ENABLED:
+        document_hash = sha256_file(path)
+    
+    # SISTEMA HÍBRIDO - cada engine só roda se a anterior ficou incompleta
+    # (texto nativo, OCR e palavras já calculados para este documento vêm do cache)
+    invoice = None
+    extraction_method = "unknown"
+    state = {"layout": None}
+    with artifacts.document(document_hash):
+        for engine in route_for(doc_class):
+            if invoice is not None and not is_incomplete(invoice):
+                break
+            # Prazo esgotado: fica com a melhor extração até aqui
+            if deadline.stop(engine):
+                break
+            try:
+                with profiling.stage(engine):
+                    result = run_engine(engine, path, ext, state)
+                if result and is_more_complete(result, invoice):
+                    invoice = result
+                    extraction_method = engine
+                # Campos novos desta engine (só com /upload/stream)
+                events.fields(result, engine)
+            except deadline.DeadlineExceeded as e:
+                print(f"{engine} interrompida: {e}")
+                break
+            except Exception as e:
+                print(f"{engine} extraction failed: {e}")
+    
+    partial_meta = {}
+    if deadline.interrupted():
+        partial_meta = {"parcial": True, "prazo": deadline.current().summary()}
+    if invoice is None:
+        return None, {"classificacao": doc_class, **partial_meta}
+    
+    # Extração genérica validada ensina/atualiza o template do emitente (só com o documento inteiro)
+    if state["layout"] is not None and extraction_method in ("hybrid", "ocr") and not partial_meta:
+        try:
+            templates.learn(state["layout"], invoice)
+        except Exception as e:
+            print(f"Template learning failed: {e}")
+    
+    # Confere/preenche nomes das partes pelo índice de CNPJ (XML já é oficial)
+    nomes_registro = cnpj_registry.fill_names(invoice, overwrite=extraction_method != "xml_parser")
+    
+    # Metadados sobre o método de extração
+    meta = {
+        "extraction_method": extraction_method,
+        "extraction_completeness": calculate_completeness(invoice),
+        "classificacao": doc_class,
+    }
+    if invoice.itens:
+        # Soma dos itens x total dos produtos (ou da nota)
+        meta["itens_conferencia"] = items.check_totals(invoice.itens, invoice.valor_total, invoice.valor_produtos)
+    if nomes_registro:
+        meta["nomes_registro"] = nomes_registro
+    meta.update(partial_meta)
+    return invoice, meta
+
+def is_incomplete(invoice: InvoiceRecord) -> bool:
     """Verifica se a extração está muito incompleta"""
-    if not invoice_data:
+    if not invoice:
         return True
     
-    data = invoice_data if isinstance(invoice_data, dict) else invoice_data.model_dump()
-    
     # Considera incompleto se faltam campos críticos
     critical_fields = ['numero', 'cnpj_emitente', 'valor_total']
-    filled_critical = sum(1 for field in critical_fields if data.get(field))
+    filled_critical = sum(1 for field in critical_fields if invoice.get(field))
     
     return filled_critical < 2  # Menos de 2 campos críticos preenchidos
 
-def is_more_complete(new_data, old_data) -> bool:
+def is_more_complete(new_data: InvoiceRecord, old_data: InvoiceRecord) -> bool:
     """Compara qual extração é mais completa"""
     if not old_data:
         return True
     
-    new_dict = new_data if isinstance(new_data, dict) else new_data.model_dump()
-    old_dict = old_data if isinstance(old_data, dict) else old_data.model_dump()
-    
-    new_filled = sum(1 for v in new_dict.values() if v not in [None, "", [], {}])
-    old_filled = sum(1 for v in old_dict.values() if v not in [None, "", [], {}])
-    
-    return new_filled > old_filled
+    return new_data.filled_count() > old_data.filled_count()
 
-def calculate_completeness(invoice_data) -> float:
+def calculate_completeness(invoice: InvoiceRecord) -> float:
     """Calcula percentual de completude da extração"""
-    if not invoice_data:
+    if not invoice:
         return 0.0
     
     fields = ['numero', 'data_emissao', 'cnpj_emitente', 'nome_emitente', 
               'cnpj_destinatario', 'nome_destinatario', 'valor_total']
     
-    filled = sum(1 for field in fields if invoice_data.get(field))
-    return round(filled / len(fields) * 100, 1)
\ No newline at end of file
+    filled = sum(1 for field in fields if invoice.get(field))
+    return round(filled / len(fields) * 100, 1)
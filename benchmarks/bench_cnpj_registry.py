@@ -0,0 +1,59 @@
+# benchmark: construção e latência de consulta do índice offline de CNPJ
+#
+# python benchmarks/bench_cnpj_registry.py --rows 1000000 [--csv Empresas0.zip]
+#
+# Sem --csv gera um arquivo sintético no formato da Receita (';', latin-1).
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cnpj_registry import CNPJRegistry, build_index
+from src.memory import current_rss_mb
+
+def write_synthetic(path: str, rows: int):
+    rng = np.random.default_rng(0)
+    basicos = rng.choice(10 ** 8, size=rows, replace=False)
+    with open(path, "w", encoding="latin-1", newline="") as f:
+        for b in basicos:
+            f.write(f'"{b:08d}";"EMPRESA {b} COMERCIO LTDA";"2062";"49";"1000,00";"01";""\n')
+    return basicos
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--csv", nargs="*")
+    ap.add_argument("--lookups", type=int, default=100_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = args.csv
+        if not sources:
+            sources = [os.path.join(tmp, "Empresas.csv")]
+            write_synthetic(sources[0], args.rows)
+        out = os.path.join(tmp, "index")
+        meta = build_index(sources, out)
+        print(f"construção: {meta['registros']:,} registros em {meta['tempo_s']} s")
+
+        rss_before = current_rss_mb()
+        registry = CNPJRegistry(out)
+        keys = np.asarray(registry.keys[np.random.default_rng(1).integers(0, len(registry), args.lookups)])
+        queries = [k.decode() + "000100" for k in keys]
+        misses = [f"{q:08d}000100" for q in np.random.default_rng(2).integers(0, 10 ** 8, args.lookups)]
+
+        for label, batch in (("encontrados", queries), ("aleatórios", misses)):
+            latencies = []
+            for q in batch:
+                t = time.perf_counter_ns()
+                registry.lookup(q)
+                latencies.append(time.perf_counter_ns() - t)
+            lat = np.array(latencies) / 1000
+            print(f"{label:>12}: p50 {np.percentile(lat, 50):.1f} µs  p99 {np.percentile(lat, 99):.1f} µs")
+        print(f"RSS adicional após {2 * args.lookups:,} consultas: {current_rss_mb() - rss_before:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# benchmark: validação de CNPJ em lote (NumPy) x escalar
+#
+# python benchmarks/bench_cnpj_validation.py --n 1000000
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.validators import is_valid_cnpj, validate_cnpj_batch
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    ints = rng.integers(10 ** 13, 10 ** 14, args.n, dtype=np.int64)
+    as_bytes = ints.astype("S14")
+    as_str = ints.astype("U14")
+
+    def rate(fn, data, n):
+        start = time.perf_counter()
+        fn(data)
+        return n / (time.perf_counter() - start)
+
+    sample = [s.decode() for s in as_bytes[:100_000]]
+    print(f"escalar (str)       {rate(lambda d: [is_valid_cnpj(x) for x in d], sample, len(sample)):>14,.0f} IDs/s")
+    print(f"lote int64          {rate(validate_cnpj_batch, ints, args.n):>14,.0f} IDs/s")
+    print(f"lote bytes S14      {rate(validate_cnpj_batch, as_bytes, args.n):>14,.0f} IDs/s")
+    print(f"lote unicode U14    {rate(validate_cnpj_batch, as_str, args.n):>14,.0f} IDs/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmark: CSV de ERP inteiro no engine 'python' + to_string x ingestão em blocos
+#
+# python benchmarks/bench_csv_ingest.py --rows 50000 200000 1000000 [--chunk-rows 100000]
+#
+# CSV sintético no formato dos exports (';', cp1252, vírgula decimal, uma linha
+# por item, 1-20 itens por nota). Cada medição roda em um subprocesso próprio
+# para que o pico de RSS (ru_maxrss) reflita só aquele modo. O modo antigo
+# só roda até --old-max-rows (to_string de milhões de linhas leva minutos).
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEADER = ("Chave de Acesso;Número;Série;Data Emissão;CNPJ Emitente;Razão Social;CNPJ Destinatário;"
+          "Código;Descrição;NCM;CFOP;Unidade;Qtd;Valor Unitário;Valor Item\n")
+
+def _brl(value: float) -> str:
+    return f"{value:_.2f}".replace(".", ",").replace("_", ".")
+
+def build_csv(path: str, rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    written, numero = 0, 0
+    with open(path, "w", encoding="cp1252", newline="") as f:
+        f.write(HEADER)
+        while written < rows:
+            numero += 1
+            chave = f"35240111222333000181550010{numero:09d}1{numero % 10:08d}"[:44]
+            head = (f"{chave};{numero};1;{rng.randint(1, 28):02d}/03/2024;11.222.333/0001-81;"
+                    f"Indústria Exemplo Ltda;98.765.432/0001-98")
+            for i in range(min(rng.randint(1, 20), rows - written)):
+                qtd = rng.randint(1, 50)
+                unit = rng.randint(100, 500_000) / 100
+                f.write(f"{head};{i:06d};Produto {i} açúcar;84713012;5102;UN;{qtd};"
+                        f"{_brl(unit)};{_brl(qtd * unit)}\n")
+                written += 1
+
+def measure(path: str, mode: str, chunk_rows: int) -> dict:
+    """Executado no subprocesso: lê o CSV e informa tempo e pico de RSS"""
+    from src.memory import peak_rss_mb
+    import pandas as pd
+    from src import csv_ingest
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "python":
+        df = pd.read_csv(path, dtype=str, sep=None, engine="python", encoding="cp1252")
+        notas, text = df.iloc[:, 1].nunique(), df.to_string()
+    else:
+        reader = csv_ingest.CsvReader(path, chunk_rows=chunk_rows, engine=mode)
+        notas = sum(1 for _ in reader)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "notas": notas,
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[50_000, 200_000, 1_000_000])
+    ap.add_argument("--chunk-rows", type=int, default=100_000)
+    ap.add_argument("--old-max-rows", type=int, default=200_000)
+    ap.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.chunk_rows)))
+        return
+
+    modes = ["python", "c"]
+    try:
+        import pyarrow  # noqa: F401
+        modes.append("pyarrow")
+    except ImportError:
+        pass
+
+    print(f"{'linhas':>9} {'MB':>6} {'modo':>8} {'tempo (s)':>10} {'linhas/s':>10} {'notas':>7} {'delta RSS MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"bench_{rows}.csv")
+            build_csv(path, rows)
+            size = os.path.getsize(path) / (1024 * 1024)
+            for mode in modes:
+                if mode == "python" and rows > args.old_max_rows:
+                    continue
+                cmd = [sys.executable, __file__, "--child", path, mode, "--chunk-rows", str(args.chunk_rows)]
+                out = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=ROOT)
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                delta = r["peak_rss_mb"] - r["baseline_rss_mb"]
+                print(f"{rows:>9} {size:>6.1f} {mode:>8} {r['seconds']:>10} {rows / r['seconds']:>10,.0f} "
+                      f"{r['notas']:>7} {delta:>13.1f}")
+
+if __name__ == "__main__":
+    main()
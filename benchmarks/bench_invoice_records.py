@@ -0,0 +1,51 @@
+# benchmark: registro interno (slots) x Pydantic em cada etapa, por nº de itens
+#
+# python benchmarks/bench_invoice_records.py --items 10 1000 10000
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import Invoice, InvoiceItem
+from src.records import InvoiceRecord, ItemRecord
+
+HEADER = dict(numero="983041", data_emissao="15/10/2025",
+              cnpj_emitente="12.345.678/0001-95", nome_emitente="EMPRESA EXEMPLO LTDA",
+              cnpj_destinatario="98.765.432/0001-98", nome_destinatario="CLIENTE EXEMPLO SA",
+              valor_total=1234.56, impostos={})
+
+def pydantic_path(n: int) -> dict:
+    """Fluxo anterior: InvoiceItem por linha e Invoice(...).model_dump() no extrator"""
+    itens = [InvoiceItem(descricao=f"PRODUTO {i}", quantidade=1, valor_unitario=10.0, valor_total=10.0)
+             for i in range(n)]
+    data = Invoice(itens=itens, **HEADER).model_dump()
+    # is_incomplete / is_more_complete percorrendo o dict
+    sum(1 for v in data.values() if v not in [None, "", [], {}])
+    sum(1 for v in data.values() if v not in [None, "", [], {}])
+    return data
+
+def record_path(n: int) -> dict:
+    """Fluxo atual: ItemRecord por linha, validação só na resposta"""
+    itens = [ItemRecord(f"PRODUTO {i}", 1, 10.0, 10.0) for i in range(n)]
+    record = InvoiceRecord.from_fields(itens=itens, **HEADER)
+    record.filled_count()
+    record.filled_count()
+    return record.to_model().model_dump()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, nargs="+", default=[10, 1000, 10000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'itens':>8} {'pydantic (ms)':>14} {'registro (ms)':>14} {'ganho':>7}")
+    for n in args.items:
+        number = max(1, 20000 // max(n, 1))
+        old = min(timeit.repeat(lambda: pydantic_path(n), number=number, repeat=args.repeat)) / number
+        new = min(timeit.repeat(lambda: record_path(n), number=number, repeat=args.repeat)) / number
+        print(f"{n:>8} {old * 1000:>14.3f} {new * 1000:>14.3f} {old / new:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmark: extração de itens do DANFE (tempo linear; memória do gerador x lista)
+#
+# "pico gerador" é a conferência de totais percorrendo parse_items direto;
+# "pico lista" é o que a nota guarda (InvoiceRecord.itens)
+#
+# python benchmarks/bench_item_extraction.py --items 1000 10000 100000
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import items
+
+def item_lines(n: int):
+    yield "DADOS DOS PRODUTOS / SERVIÇOS"
+    for i in range(n):
+        yield f"{i:06d} PRODUTO DE TESTE {i} 84713012 000 5102 UN 2,0000 5,00 10,00 0,00 0,00"
+        if i % 10 == 0:
+            yield "COM DESCRIÇÃO EM DUAS LINHAS"
+    yield "DADOS ADICIONAIS"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    args = ap.parse_args()
+
+    print(f"{'itens':>8} {'tempo (s)':>10} {'itens/s':>12} {'pico gerador KB':>16} {'pico lista KB':>14} "
+          f"{'B/item':>8} {'confere':>8}")
+    for n in args.items:
+        lines = list(item_lines(n))
+
+        start = time.perf_counter()
+        check = items.check_totals(items.parse_items(lines), produtos_total=n * 10.0)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        items.check_totals(items.parse_items(lines), produtos_total=n * 10.0)
+        streamed = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        parsed = list(items.parse_items(lines))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del parsed
+
+        print(f"{n:>8} {elapsed:>10.3f} {n / elapsed:>12,.0f} {streamed / 1024:>16,.0f} {peak / 1024:>14,.0f} "
+              f"{peak / n:>8,.0f} {str(check['confere']):>8}")
+
+if __name__ == "__main__":
+    main()
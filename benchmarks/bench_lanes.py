@@ -0,0 +1,87 @@
+# benchmark: latência dos XMLs com uma fila única x faixas separadas (src/lanes.py)
+#
+# python benchmarks/bench_lanes.py --text-jobs 40 --ocr-jobs 40 --xml-jobs 200
+#
+# Carga sintética com o perfil de GIL de cada engine:
+#   - "texto" (pdfplumber/pdfminer, spaCy) é Python puro: laço de CPU que segura o GIL;
+#   - "OCR" roda no processo do Tesseract: a thread só espera (sleep, GIL livre);
+#   - "XML" é um parse curto em Python (CPU).
+# Faixas separadas tiram os XMLs da fila atrás do backlog, mas as threads da
+# faixa de texto continuam disputando o GIL com a thread do XML: a linha
+# "faixas" mostra esse custo em relação ao XML sozinho ("só XML").
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.lanes import Lane, _percentile
+
+def burn(ms: float):
+    """CPU em Python puro por `ms` (segura o GIL, como o pdfminer)"""
+    end = time.perf_counter() + ms / 1000
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+def wait(ms: float):
+    time.sleep(ms / 1000)  # Tesseract em subprocesso: a thread não segura o GIL
+
+WORK = {"text": burn, "ocr": wait, "xml": burn}
+
+async def scenario(lane_for, args, kinds) -> list:
+    latencies = []
+    cost = {"text": args.text_ms, "ocr": args.ocr_ms, "xml": args.xml_ms}
+    count = {"text": args.text_jobs, "ocr": args.ocr_jobs, "xml": args.xml_jobs}
+
+    async def submit(kind: str):
+        start = time.perf_counter()
+        await lane_for(kind).run(WORK[kind], cost[kind])
+        if kind == "xml":
+            latencies.append(time.perf_counter() - start)
+
+    jobs = [submit(kind) for kind in kinds for _ in range(count[kind])]
+    await asyncio.gather(*jobs)
+    return latencies
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--text-jobs", type=int, default=40)
+    ap.add_argument("--text-ms", type=float, default=100)
+    ap.add_argument("--ocr-jobs", type=int, default=40)
+    ap.add_argument("--ocr-ms", type=float, default=200)
+    ap.add_argument("--xml-jobs", type=int, default=200)
+    ap.add_argument("--xml-ms", type=float, default=3)
+    ap.add_argument("--workers", type=int, default=4, help="concorrência total")
+    args = ap.parse_args()
+
+    def shared():
+        lane = Lane("unica", args.workers, 10_000, "wait", 3600)
+        return lambda kind: lane
+
+    def separate():
+        heavy = max(1, (args.workers - 1) // 2)
+        lanes = {"text": Lane("text", heavy, 10_000, "wait", 3600),
+                 "ocr": Lane("ocr", heavy, 10_000, "wait", 3600),
+                 "xml": Lane("structured", 1, 10_000, "wait", 3600)}
+        return lambda kind: lanes[kind]
+
+    runs = (
+        ("só XML", separate, ("xml",)),
+        ("fila única", shared, ("text", "ocr", "xml")),
+        ("faixas", separate, ("text", "ocr", "xml")),
+        ("faixas, só OCR", separate, ("ocr", "xml")),
+    )
+    print(f"{'cenário':<16} {'XML p50 ms':>11} {'XML p99 ms':>11} {'XML max ms':>11} {'total s':>8}")
+    for name, build, kinds in runs:
+        start = time.perf_counter()
+        latencies = asyncio.run(scenario(build(), args, kinds))
+        total = time.perf_counter() - start
+        print(f"{name:<16} {_percentile(latencies, 0.5):>11.1f} {_percentile(latencies, 0.99):>11.1f} "
+              f"{_percentile(latencies, 1.0):>11.1f} {total:>8.2f}")
+
+if __name__ == "__main__":
+    main()
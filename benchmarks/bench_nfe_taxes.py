@@ -0,0 +1,67 @@
+# benchmark: parse do XML da NF-e só com cabeçalho/itens x com impostos por item
+#
+# python benchmarks/bench_nfe_taxes.py --items 10 1000 5000
+#
+# NF-e sintética com ICMS, IPI, PIS e COFINS em cada <det>. Compara
+# _read_xml(taxes=False) com o parse completo (colunas NumPy + totais por CST
+# conferidos com o ICMSTot) e confere se os totais batem. As duas versões rodam
+# intercaladas e vale o melhor tempo de cada (menos sensível a ruído da máquina).
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.nfe_xml_parser import _read_xml
+
+DET = ('<det nItem="{n}"><prod><cProd>{n:05d}</cProd><xProd>PRODUTO {n}</xProd><NCM>84713012</NCM>'
+       '<CFOP>5102</CFOP><uCom>UN</uCom><qCom>2.0000</qCom><vUnCom>5.00</vUnCom><vProd>10.00</vProd></prod>'
+       '<imposto><vTotTrib>3.10</vTotTrib><ICMS><ICMS{cst}><orig>0</orig><CST>{cst}</CST><modBC>3</modBC>'
+       '<vBC>10.00</vBC><pICMS>18.00</pICMS><vICMS>1.80</vICMS></ICMS{cst}></ICMS>'
+       '<IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vBC>10.00</vBC><pIPI>5.00</pIPI><vIPI>0.50</vIPI></IPITrib></IPI>'
+       '<PIS><PISAliq><CST>01</CST><vBC>10.00</vBC><pPIS>1.65</pPIS><vPIS>0.17</vPIS></PISAliq></PIS>'
+       '<COFINS><COFINSAliq><CST>01</CST><vBC>10.00</vBC><pCOFINS>7.60</pCOFINS><vCOFINS>0.76</vCOFINS>'
+       '</COFINSAliq></COFINS></imposto></det>')
+
+def build_xml(path: str, items: int):
+    dets = "".join(DET.format(n=n + 1, cst="00" if n % 3 else "20") for n in range(items))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+            '<NFe><infNFe Id="NFe35251011222333000181550010009830411000000011" versao="4.00">'
+            '<ide><serie>1</serie><nNF>983041</nNF><dhEmi>2025-10-15T10:30:00-03:00</dhEmi></ide>'
+            '<emit><CNPJ>11222333000181</CNPJ><xNome>EMPRESA EXEMPLO LTDA</xNome></emit>'
+            '<dest><CNPJ>12345678000195</CNPJ><xNome>CLIENTE EXEMPLO SA</xNome></dest>'
+            f'{dets}<total><ICMSTot><vBC>{items * 10:.2f}</vBC><vICMS>{items * 1.8:.2f}</vICMS>'
+            f'<vProd>{items * 10:.2f}</vProd><vIPI>{items * 0.5:.2f}</vIPI><vPIS>{items * 0.17:.2f}</vPIS>'
+            f'<vCOFINS>{items * 0.76:.2f}</vCOFINS><vNF>{items * 10.5:.2f}</vNF></ICMSTot></total>'
+            '</infNFe></NFe></nfeProc>')
+
+def best_times(fns: list, repeat: int) -> list:
+    best = [float("inf")] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            start = time.perf_counter()
+            fn()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return [seconds * 1000 for seconds in best]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, nargs="+", default=[10, 1000, 5000])
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    print(f"{'itens':>6} {'sem impostos ms':>16} {'com impostos ms':>16} {'razão':>6} {'confere':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for items in args.items:
+            path = os.path.join(tmp, f"nfe_{items}.xml")
+            build_xml(path, items)
+            header, full = best_times([lambda: _read_xml(path, taxes=False), lambda: _read_xml(path)], args.repeat)
+            confere = _read_xml(path).impostos.get("confere")
+            print(f"{items:>6} {header:>16.2f} {full:>16.2f} {full / header:>6.2f} {str(confere):>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmark: pico de RSS x número de páginas na extração de PDF
+#
+# python benchmarks/bench_pdf_memory.py --pages 1 10 50 200 [--ocr]
+#
+# Cada medição roda em um subprocesso próprio para que o pico de RSS
+# (ru_maxrss) reflita apenas aquele documento.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LINES = [
+    "DANFE - DOCUMENTO AUXILIAR DA NOTA FISCAL ELETRONICA",
+    "NF-e N. 983.041 SERIE 1",
+    "EMITENTE: EMPRESA EXEMPLO LTDA CNPJ 12.345.678/0001-95",
+    "DESTINATARIO: CLIENTE EXEMPLO SA CNPJ 98.765.432/0001-98",
+    "DATA DE EMISSAO 15/10/2025",
+]
+
+def build_pdf(path: str, pages: int, items_per_page: int = 40, header=None):
+    """Gera um PDF de texto simples (sem dependências) com N páginas.
+
+    `header(p)` pode devolver as linhas de cabeçalho de cada página (padrão: LINES).
+    """
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * pages
+    kids = []
+    for p in range(pages):
+        lines = (header(p) if header else LINES) + [
+            f"{p * items_per_page + i:05d} PRODUTO {i} 84713012 5102 UN 1,0000 10,00 10,00"
+            for i in range(items_per_page)
+        ] + ["VALOR TOTAL DA NOTA R$ 400,00", f"FOLHA {p + 1}/{pages}"]
+        stream = ["BT /F1 8 Tf 30 800 Td 10 TL"]
+        stream += [f"({line}) Tj T*" for line in lines]
+        stream.append("ET")
+        data = "\n".join(stream).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def measure(pdf_path: str, ocr: bool) -> dict:
+    """Executado no subprocesso: extrai e informa tempo e pico de RSS"""
+    from src import danfe_ocr_parser
+    from src.memory import peak_rss_mb
+
+    parser = danfe_ocr_parser.parser
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if ocr:
+        text = parser._extract_ocr_text(pdf_path)
+    else:
+        text = parser._extract_native_pdf_text(pdf_path)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "chars": len(text),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50, 200])
+    ap.add_argument("--ocr", action="store_true", help="mede o caminho de OCR (300 DPI)")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.ocr)))
+        return
+
+    print(f"{'páginas':>8} {'tempo (s)':>10} {'RSS base':>9} {'RSS pico':>9} {'delta MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"bench_{pages}.pdf")
+            build_pdf(path, pages)
+            cmd = [sys.executable, __file__, "--child", path] + (["--ocr"] if args.ocr else [])
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=ROOT)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            delta = r["peak_rss_mb"] - r["baseline_rss_mb"]
+            print(f"{pages:>8} {r['seconds']:>10} {r['baseline_rss_mb']:>9} {r['peak_rss_mb']:>9} {delta:>9.1f}")
+
+if __name__ == "__main__":
+    main()
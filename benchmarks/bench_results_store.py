@@ -0,0 +1,80 @@
+# benchmark: gravação em lote e consultas do armazenamento de notas (src/results.py)
+#
+# python benchmarks/bench_results_store.py --notas 1000000 [--db /tmp/bench_results.sqlite3]
+#
+# Gera notas sintéticas (2.000 emitentes, 24 meses, 5 itens cada), grava pelo
+# ResultStore em lotes e mede a latência das consultas da API: filtro por
+# emitente com paginação por cursor, número, período e totais por mês.
+# Com --db existente e --notas 0 só repete as consultas.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.records import InvoiceRecord, ItemRecord
+from src.results import ResultStore
+
+EMITENTES = [f"{11_000_000 + i:08d}000181" for i in range(2000)]
+
+def build(store: ResultStore, total: int, seed: int = 7):
+    rng = random.Random(seed)
+    for n in range(total):
+        itens = [ItemRecord(descricao=f"Produto {i}", quantidade=1.0, valor_unitario=10.0, valor_total=10.0,
+                            codigo=f"{i:05d}", ncm="84713012", cfop="5102", unidade="UN") for i in range(5)]
+        store.add(InvoiceRecord(numero=str(n + 1), serie="1", data_emissao=f"{rng.randint(1, 28):02d}/"
+                                f"{rng.randint(1, 12):02d}/{rng.choice((2023, 2024))}",
+                                cnpj_emitente=rng.choice(EMITENTES), cnpj_destinatario="98765432000198",
+                                itens=itens, valor_total=50.0), {"extraction_method": "bench"}, f"bench{n}")
+    store.flush()
+
+def timed(fn, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)[len(samples) // 2] * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--notas", type=int, default=1_000_000)
+    ap.add_argument("--db", default="/tmp/bench_results.sqlite3")
+    ap.add_argument("--batch", type=int, default=5000)
+    args = ap.parse_args()
+
+    if args.notas:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    store = ResultStore(args.db, batch_size=args.batch, flush_ms=0)
+    if args.notas:
+        start = time.perf_counter()
+        build(store, args.notas)
+        elapsed = time.perf_counter() - start
+        print(f"gravação: {args.notas} notas em {elapsed:.1f}s ({args.notas / elapsed:,.0f} notas/s, "
+              f"{os.path.getsize(args.db) / 2**20:.0f} MB)")
+
+    emitente = EMITENTES[7]
+    page = store.query({"cnpj_emitente": emitente}, 50)
+    for _ in range(5):
+        page = store.query({"cnpj_emitente": emitente}, 50, page["proximo"])
+    queries = {
+        "emitente, 1ª página (50)": lambda: store.query({"cnpj_emitente": emitente}, 50),
+        "emitente, página 6 (cursor)": lambda: store.query({"cnpj_emitente": emitente}, 50, page["proximo"]),
+        "emitente + período": lambda: store.query({"cnpj_emitente": emitente, "data_inicio": "2024-03-01",
+                                                    "data_fim": "2024-03-31"}, 50),
+        "número": lambda: store.query({"numero": "4242"}, 50),
+        "período (todos)": lambda: store.query({"data_inicio": "2024-06-01", "data_fim": "2024-06-30"}, 50),
+        "nota com itens": lambda: store.get(4242),
+        "totais emitente/mês": lambda: store.monthly_totals(emitente, "2023-01", "2024-12"),
+        "totais do mês (todos)": lambda: store.monthly_totals(None, "2024-06", "2024-06"),
+    }
+    print(f"{'consulta':<30} {'p50 ms':>8}")
+    for name, fn in queries.items():
+        print(f"{name:<30} {timed(fn):>8.2f}")
+
+if __name__ == "__main__":
+    main()
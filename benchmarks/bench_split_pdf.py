@@ -0,0 +1,76 @@
+# benchmark: PDF com N DANFEs em sequência, extração sequencial x paralela
+#
+# python benchmarks/bench_split_pdf.py --notas 10 50 100 --folhas 2 [--workers 8]
+#
+# Cada nota tem chave de acesso própria e "FOLHA k/N"; mede a separação e a
+# extração de todas as notas com 1 processo e com o pool (SPLIT_WORKERS).
+import argparse
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pdf_memory import build_pdf
+
+def chave_acesso(numero: int) -> str:
+    """Chave de acesso válida (DV módulo 11) para o CNPJ 11.222.333/0001-81"""
+    base = f"352510112223330001815500{1:01d}{numero:09d}1{numero:08d}"
+    total = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(base)))
+    dv = 11 - total % 11
+    return base + str(0 if dv >= 10 else dv)
+
+def header(p: int, folhas: int) -> list:
+    numero, folha = p // folhas + 1, p % folhas + 1
+    chave = chave_acesso(numero)
+    return [
+        "DANFE DOCUMENTO AUXILIAR DA NOTA FISCAL ELETRONICA",
+        "EMPRESA EXEMPLO LTDA CNPJ 11.222.333/0001-81",
+        f"NF-e N. {numero // 1000:03d}.{numero % 1000:03d} SERIE 1 FOLHA {folha}/{folhas}",
+        "CHAVE DE ACESSO " + " ".join(chave[i:i + 4] for i in range(0, 44, 4)),
+        "DESTINATARIO CLIENTE EXEMPLO SA CNPJ 12.345.678/0001-95",
+        "DATA DA EMISSAO 15/10/2025",
+        f"VALOR TOTAL DA NOTA R$ {numero},00",
+    ]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--notas", type=int, nargs="+", default=[10, 50, 100])
+    ap.add_argument("--folhas", type=int, default=2, help="páginas por nota")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    from src import config, splitter
+    import app
+
+    extract = partial(app.extract_invoice, ext="pdf")
+    print(f"{'notas':>6} {'páginas':>8} {'separar (s)':>12} {'1 proc (s)':>11} "
+          f"{f'{args.workers} procs (s)':>13} {'ganho':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for notas in args.notas:
+            path = os.path.join(tmp, f"lote_{notas}.pdf")
+            build_pdf(path, notas * args.folhas, items_per_page=10,
+                      header=partial(header, folhas=args.folhas))
+
+            start = time.perf_counter()
+            groups = splitter.split(path)
+            split_s = time.perf_counter() - start
+            assert len(groups) == notas, f"{len(groups)} grupos para {notas} notas"
+
+            timings = []
+            for workers in (1, args.workers):
+                config.SPLIT_WORKERS = workers
+                splitter._pool = None
+                start = time.perf_counter()
+                results = splitter.extract_groups(path, groups, extract)
+                timings.append(time.perf_counter() - start)
+                assert sum(1 for invoice, _ in results if invoice) == notas
+            print(f"{notas:>6} {notas * args.folhas:>8} {split_s:>12.3f} {timings[0]:>11.2f} "
+                  f"{timings[1]:>13.2f} {timings[0] / timings[1]:>5.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# benchmark: memória exclusiva (USS) e proporcional (PSS) por worker
+#
+# python benchmarks/bench_worker_memory.py --workers 4
+#
+# Compara dois modos com N processos filhos:
+#   separado -> cada worker carrega os modelos após o fork (uvicorn --workers)
+#   pre-fork -> o master carrega e congela (gc.freeze) antes do fork (serve.py)
+import argparse
+import gc
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from src.memory import process_memory
+
+def _workload():
+    """Simula tráfego para que o GC rode nos workers"""
+    from src import nlp_models
+    nlp = nlp_models.invoice_ner()
+    for _ in range(20):
+        nlp("NOTA FISCAL 12345 CNPJ 12.345.678/0001-95 VALOR TOTAL R$ 1.234,56")
+    gc.collect()
+
+def run(workers: int, preload: bool) -> list:
+    if preload:
+        from src import nlp_models
+        nlp_models.preload()
+        gc.collect()
+        gc.freeze()
+
+    pids = []
+    for _ in range(workers):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            if not preload:
+                from src import nlp_models
+                nlp_models.preload()
+            _workload()
+            os.write(w, b"1")
+            time.sleep(3600)
+            os._exit(0)
+        os.close(w)
+        os.read(r, 1)  # espera o worker ficar pronto
+        os.close(r)
+        pids.append(pid)
+
+    stats = [process_memory(pid) for pid in pids]
+    for pid in pids:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--mode", choices=["separado", "pre-fork"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.mode:
+        stats = run(args.workers, preload=args.mode == "pre-fork")
+        uss = sum(s["uss_mb"] for s in stats) / len(stats)
+        pss = sum(s["pss_mb"] for s in stats) / len(stats)
+        rss = sum(s["rss_mb"] for s in stats) / len(stats)
+        print(f"{args.mode:>9} {args.workers:>8} {rss:>12.1f} {pss:>12.1f} {uss:>12.1f}")
+        return
+
+    import subprocess
+    print(f"{'modo':>9} {'workers':>8} {'RSS médio':>12} {'PSS médio':>12} {'USS médio':>12}")
+    # Cada modo roda em um interpretador limpo
+    for mode in ("separado", "pre-fork"):
+        subprocess.run([sys.executable, __file__, "--workers", str(args.workers), "--mode", mode], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# reprocessamento incremental de um acervo de notas
+#
+# python reprocess.py acervo/ --out resultados.jsonl
+#
+# Cada documento é identificado pelo hash do conteúdo. Se o resultado da
+# versão atual do pipeline (regras de parse + modelo NER) já existe no cache
+# de artefatos, o documento é pulado; senão a extração roda de novo e só as
+# etapas cuja versão mudou são recalculadas (texto nativo, OCR e palavras
+# vêm do cache). Suba a versão em src/artifacts.STAGE_VERSIONS ao alterar
+# uma etapa. As notas também vão para o armazenamento de consulta
+# (src/results.py, em lotes) se RESULTS_ENABLED estiver ligado.
+import argparse
+import os
+import sys
+import time
+import orjson
+from src import artifacts, config, results
+from src.fileutils import sha256_file
+from src.records import InvoiceRecord
+
+EXTENSIONS = {"pdf", "xml", "png", "jpg", "jpeg", "csv", "txt"}
+
+def _files(paths: list):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.rsplit(".", 1)[-1].lower() in EXTENSIONS:
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def main():
+    ap = argparse.ArgumentParser(description="Reprocessa um acervo reaproveitando os artefatos em cache")
+    ap.add_argument("paths", nargs="+", help="arquivos ou diretórios")
+    ap.add_argument("--out", help="grava os resultados em JSON lines")
+    ap.add_argument("--force", action="store_true",
+                    help="reextrai mesmo quando o resultado da versão atual já existe")
+    args = ap.parse_args()
+
+    if not config.ARTIFACTS_ENABLED:
+        sys.exit("ARTIFACTS_ENABLED está desligado: não há cache para reaproveitar")
+
+    from app import extract_invoice
+
+    version = artifacts.pipeline_version()
+    print(f"Versão do pipeline: {version}")
+    out = open(args.out, "ab") if args.out else None
+    counts = {"processados": 0, "em_cache": 0, "sem_extracao": 0, "erros": 0}
+    start = time.perf_counter()
+    try:
+        for path in _files(args.paths):
+            document_hash = sha256_file(path)
+            result = None if args.force else artifacts.store.get(document_hash, "extraction", version)
+            if result is not None:
+                counts["em_cache"] += 1
+            else:
+                try:
+                    ext = path.rsplit(".", 1)[-1].lower()
+                    invoice, meta = extract_invoice(path, ext, document_hash=document_hash)
+                except Exception as e:
+                    print(f"{path}: erro: {e}")
+                    counts["erros"] += 1
+                    continue
+                result = {"nota": invoice.as_dict() if invoice else None, **meta}
+                artifacts.store.put(document_hash, "extraction", result, version)
+                counts["processados" if invoice else "sem_extracao"] += 1
+                print(f"{path}: {meta.get('extraction_method', 'sem extração')}")
+            if result["nota"]:
+                results.save(InvoiceRecord.from_dict(result["nota"]), result, document_hash)
+            if out:
+                out.write(orjson.dumps({"arquivo": path, "hash": document_hash, **result},
+                                       option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+    finally:
+        if out:
+            out.close()
+        store = results.get_store()
+        if store:
+            store.flush()
+
+    print(f"Documentos: {counts} em {time.perf_counter() - start:.1f}s")
+    print(f"Artefatos: {artifacts.store.stats()}")
+
+if __name__ == "__main__":
+    main()
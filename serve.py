@@ -0,0 +1,108 @@
+# servidor pre-fork: carrega os modelos uma vez no master e faz fork dos workers
+#
+# python serve.py --workers 4 --port 8000
+#
+# Os pipelines spaCy são carregados e congelados (gc.freeze) no master; os
+# workers herdam essas páginas copy-on-write em vez de carregar cópias próprias.
+# Workers que saem (ex.: reciclagem por WORKER_MAX_DOCUMENTS) são substituídos.
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import uvicorn
+from src import config
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, sock: socket.socket):
+    # O worker herda os handlers do master; volta ao padrão antes do uvicorn
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+    os._exit(0)
+
+def _spawn(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_worker(app, sock)
+        finally:
+            os._exit(1)
+    print(f"Worker {pid} iniciado")
+    return pid
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor pre-fork do Invoicebot")
+    ap.add_argument("--host", default=config.SERVER_HOST)
+    ap.add_argument("--port", type=int, default=config.SERVER_PORT)
+    ap.add_argument("--workers", type=int, default=config.SERVER_WORKERS)
+    ap.add_argument("--no-preload", action="store_true",
+                    help="cada worker carrega os próprios modelos (para comparação)")
+    args = ap.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py requer fork(); no Windows use: uvicorn app:app --workers N")
+
+    sock = _bind(args.host, args.port)
+    # Workers substituídos ao sair: a reciclagem (src/memory.py) pode encerrá-los
+    os.environ["WORKER_SUPERVISED"] = "1"
+    config.WORKER_SUPERVISED = True
+
+    if args.no_preload:
+        app = "app:app"  # importado por cada worker após o fork
+    else:
+        from app import app
+        from src import nlp_models
+        nlp_models.preload()
+        # Tira os objetos carregados do alcance do GC para que as coletas nos
+        # workers não escrevam nos cabeçalhos (e não copiem as páginas)
+        gc.collect()
+        gc.freeze()
+        print(f"Modelos carregados no master ({gc.get_freeze_count()} objetos congelados)")
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    workers = {_spawn(app, sock) for _ in range(args.workers)}
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        workers.discard(pid)
+        print(f"Worker {pid} saiu (status {status}); iniciando substituto")
+        workers.add(_spawn(app, sock))
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+if __name__ == "__main__":
+    main()
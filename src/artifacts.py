@@ -0,0 +1,125 @@
+# cache persistente de artefatos intermediários (texto nativo, OCR, palavras, XML)
+#
+# Chave: hash SHA-256 do documento + etapa + versão da etapa. Ao mudar uma
+# regex ou retreinar o spaCy, só as etapas seguintes rodam de novo: o OCR e
+# a leitura do PDF vêm do cache. Para invalidar uma etapa, suba a versão em
+# STAGE_VERSIONS.
+#
+#   ARTIFACTS_DIR/<hash[:2]>/<hash>/<etapa>-v<versão>.json.z  (orjson + zlib)
+#
+# As etapas usam `cached(etapa, função)`; o documento atual vem de um
+# ContextVar definido por `document(hash)` (sem documento, nada é gravado).
+# A função marca com `incomplete(motivo)` o que leu pela metade (página com
+# erro, limite de memória): esse valor é usado na requisição, mas não gravado.
+import hashlib
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+import orjson
+from src import config, deadline
+
+STAGE_VERSIONS = {
+    "native_text": 1,   # texto + tabelas do pdfplumber (danfe_ocr_parser)
+    "page_text": 1,     # texto corrido de todas as páginas (templates)
+    "word_boxes": 1,    # palavras com coordenadas da 1ª página (templates)
+    "ocr_text": 2,      # texto do Tesseract por página, com confiança média (v2: pré-processamento)
+    "xml_fields": 2,    # campos lidos do XML da NF-e (2: impostos por item)
+    "parse": 1,         # regex/heurísticas de campos; suba ao alterá-las
+}
+
+_current = ContextVar("artifact_document", default=None)
+_incomplete = ContextVar("artifact_incomplete", default=None)
+_MISSING = object()
+
+@lru_cache(maxsize=None)
+def _ner_model_version() -> str:
+    # meta.json muda a cada treino (métricas), mesmo sem mudar "version"
+    from src.nlp_models import INVOICE_NER_PATH
+    try:
+        with open(os.path.join(INVOICE_NER_PATH, "meta.json"), "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+    except OSError:
+        return "0"
+
+def pipeline_version() -> str:
+    """Versão do resultado final: regras de parse + modelo NER + etapas de entrada"""
+    inputs = "".join(str(v) for s, v in STAGE_VERSIONS.items() if s != "parse")
+    return f"p{STAGE_VERSIONS['parse']}-ner{_ner_model_version()}-in{inputs}"
+
+class ArtifactStore:
+    """Artefatos em arquivos comprimidos, um diretório por documento"""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or config.ARTIFACTS_DIR
+        self.hits = {}
+        self.misses = {}
+
+    def _path(self, doc_hash: str, stage: str, version) -> str:
+        return os.path.join(self.directory, doc_hash[:2], doc_hash, f"{stage}-v{version}.json.z")
+
+    def get(self, doc_hash: str, stage: str, version=None, default=None):
+        path = self._path(doc_hash, stage, STAGE_VERSIONS.get(stage) if version is None else version)
+        try:
+            with open(path, "rb") as f:
+                value = orjson.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, orjson.JSONDecodeError):
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+            return default
+        self.hits[stage] = self.hits.get(stage, 0) + 1
+        return value
+
+    def put(self, doc_hash: str, stage: str, value, version=None):
+        path = self._path(doc_hash, stage, STAGE_VERSIONS.get(stage) if version is None else version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escrita atômica: outro worker pode estar lendo o mesmo documento
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY), 3))
+        os.replace(tmp, path)
+
+    def stats(self) -> dict:
+        return {"acertos": dict(self.hits), "faltas": dict(self.misses)}
+
+# Instância global
+store = ArtifactStore()
+
+@contextmanager
+def document(doc_hash: str):
+    """Define o documento cujos artefatos as etapas vão ler/gravar"""
+    token = _current.set(doc_hash if config.ARTIFACTS_ENABLED else None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def current():
+    return _current.get()
+
+def incomplete(reason: str):
+    """Marca o valor da etapa em cálculo como incompleto (cached() não o grava)"""
+    reasons = _incomplete.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+def cached(stage: str, compute):
+    """Valor da etapa para o documento atual: do cache ou calculado e gravado"""
+    doc_hash = _current.get()
+    if doc_hash is None:
+        return compute()
+    value = store.get(doc_hash, stage, default=_MISSING)
+    if value is _MISSING:
+        token = _incomplete.set([])
+        try:
+            value = compute()
+            reasons = _incomplete.get()
+        finally:
+            _incomplete.reset(token)
+        # Resultado cortado pelo prazo ou lido pela metade não vale como artefato
+        if reasons:
+            print(f"Artefato {stage} incompleto, não gravado: {reasons[0]}")
+        elif not deadline.interrupted():
+            store.put(doc_hash, stage, value)
+    return value
@@ -0,0 +1,122 @@
+# classificação barata do documento antes da extração (roteamento por conteúdo)
+#
+# Olha só o necessário: bytes iniciais (magic), raiz/namespace do XML,
+# se a 1ª página do PDF tem camada de texto e palavras-chave típicas.
+# Tipos: nfe_xml, nfce, danfe_pdf, danfe_scan, nfse, photo, csv, desconhecido
+import os
+import re
+import time
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from unidecode import unidecode
+from src.fileutils import PDFIUM_LOCK
+
+HEAD_BYTES = 64 * 1024
+MIN_TEXT_CHARS = 50  # abaixo disso a página é tratada como imagem (escaneada)
+
+IMAGE_MAGIC = (b"\x89PNG", b"\xff\xd8\xff", b"II*\x00", b"MM\x00*", b"GIF8", b"BM")
+
+# Palavras-chave (maiúsculas, sem acentos e sem espaços) por tipo, em ordem de prioridade
+PDF_SIGNATURES = (
+    ("nfse", ("NFS-E", "NOTAFISCALDESERVICO", "PRESTADORDESERVICO", "TOMADORDESERVICO")),
+    ("nfce", ("NFC-E", "NOTAFISCALDECONSUMIDOR")),
+    ("danfe_pdf", ("DANFE", "DOCUMENTOAUXILIARDANOTAFISCAL", "CHAVEDEACESSO")),
+)
+
+_XML_ROOT_RE = re.compile(rb'<([A-Za-z_][\w.-]*:)?([A-Za-z_][\w.-]*)([^>]*)>')
+_XML_NS_RE = re.compile(rb'xmlns(?::\w+)?="([^"]*)"')
+_XML_MOD_RE = re.compile(rb'<(?:\w+:)?mod>(\d{2})<')
+_CSV_DELIMITERS = (";", ",", "\t", "|")
+
+def _classify_xml(head: bytes) -> tuple:
+    body = re.sub(rb'<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>', b'', head, flags=re.S)
+    match = _XML_ROOT_RE.search(body)
+    if not match:
+        return "desconhecido", ["xml_sem_raiz"]
+    root = match.group(2).decode("ascii", "ignore")
+    namespaces = b" ".join(_XML_NS_RE.findall(head)).decode("ascii", "ignore").lower()
+    sinais = [f"raiz={root}"]
+    if "portalfiscal.inf.br/nfe" in namespaces or root in ("nfeProc", "NFe", "enviNFe"):
+        mod = _XML_MOD_RE.search(head)
+        sinais.append(f"mod={mod.group(1).decode() if mod else '?'}")
+        return ("nfce" if mod and mod.group(1) == b"65" else "nfe_xml"), sinais
+    if "nfse" in namespaces or "abrasf" in namespaces or "nfse" in root.lower():
+        sinais.append("namespace_nfse")
+        return "nfse", sinais
+    return "desconhecido", sinais
+
+def _classify_pdf(path: str) -> tuple:
+    """(tipo, sinais, número de páginas)"""
+    # pdfium lê o texto da página em ~1 ms;
+    # o pdfminer levaria dezenas de ms montando o layout dos caracteres
+    with PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            pages = len(pdf)
+            if pages == 0:
+                return "desconhecido", ["pdf_sem_paginas"], 0
+            page = pdf[0]
+            textpage = page.get_textpage()
+            chars = textpage.get_text_range()
+            images = sum(1 for _ in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE], max_depth=1))
+            textpage.close()
+            page.close()
+        finally:
+            pdf.close()
+    compact = re.sub(r'\s+', '', unidecode(chars).upper())
+    if len(compact) < MIN_TEXT_CHARS:
+        return "danfe_scan", [f"caracteres={len(compact)}", f"imagens={images}"], pages
+    for tipo, keywords in PDF_SIGNATURES:
+        found = [k for k in keywords if k in compact]
+        if found:
+            return tipo, ["camada_texto"] + found, pages
+    return "desconhecido", ["camada_texto"], pages
+
+def _looks_like_csv(head: bytes) -> str:
+    """Delimitador se as primeiras linhas tiverem o mesmo número de colunas"""
+    if b"\x00" in head:
+        return None
+    text = head.decode("utf-8", errors="ignore") or head.decode("latin-1")
+    lines = [line for line in text.splitlines()[:6] if line.strip()]
+    if len(lines) > 1 and len(head) == HEAD_BYTES:
+        lines = lines[:-1]  # última linha pode estar cortada
+    for delimiter in _CSV_DELIMITERS:
+        counts = {line.count(delimiter) for line in lines}
+        if len(lines) >= 2 and len(counts) == 1 and counts.pop() > 0:
+            return delimiter
+    return None
+
+def classify(path: str) -> dict:
+    """Tipo do documento, formato, sinais usados e tempo gasto (ms)"""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+    stripped = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+
+    paginas = 1
+    if b"%PDF" in head[:1024]:
+        formato = "pdf"
+        try:
+            tipo, sinais, paginas = _classify_pdf(path)
+        except Exception as e:
+            tipo, sinais = "desconhecido", [f"pdf_invalido: {e}"]
+    elif head.startswith(IMAGE_MAGIC) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"):
+        formato, tipo, sinais = "imagem", "photo", ["magic_imagem"]
+    elif stripped.startswith(b"<"):
+        formato = "xml"
+        tipo, sinais = _classify_xml(stripped)
+    else:
+        delimiter = _looks_like_csv(head)
+        if delimiter:
+            formato, tipo, sinais = "csv", "csv", [f"delimitador={delimiter!r}"]
+        else:
+            formato, tipo, sinais = "desconhecido", "desconhecido", []
+
+    return {
+        "tipo": tipo,
+        "formato": formato,
+        "sinais": sinais,
+        "paginas": paginas,
+        "bytes": os.path.getsize(path),
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+    }
@@ -0,0 +1,192 @@
+# índice offline de razão social por CNPJ (dados abertos da Receita Federal)
+#
+# Construção (arquivos "Empresas" do dump de CNPJ, .zip ou .csv):
+#   python -m src.cnpj_registry build Empresas0.zip Empresas1.zip ... --out data/cnpj_index
+# Consulta:
+#   python -m src.cnpj_registry lookup 11.222.333/0001-81
+#
+# O índice é um diretório com:
+#   keys.npy   - CNPJ básico (8 posições, bytes 'S8') ordenado; lido via mmap
+#   offsets.npy / lengths.npy - posição de cada razão social em names.bin
+#   names.bin  - razões sociais em UTF-8
+# A busca é binária (np.searchsorted) sobre o mmap: O(log n) e quase nada de RSS.
+import argparse
+import csv
+import io
+import json
+import mmap
+import os
+import re
+import time
+import zipfile
+from datetime import datetime
+import numpy as np
+from unidecode import unidecode
+from src import config
+from src.validators import clean_document, is_valid_cnpj
+
+BUILD_CHUNK = 1_000_000
+
+def _basico(cnpj: str) -> bytes:
+    return clean_document(cnpj)[:8].encode("ascii", "ignore")
+
+def _iter_csv_rows(path: str):
+    """Linhas dos CSVs da Receita (';', latin-1, sem cabeçalho); aceita .zip"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                with zf.open(name) as raw:
+                    text = io.TextIOWrapper(raw, encoding="latin-1", newline="")
+                    yield from csv.reader(text, delimiter=";", quotechar='"')
+    else:
+        with open(path, encoding="latin-1", newline="") as f:
+            yield from csv.reader(f, delimiter=";", quotechar='"')
+
+def build_index(paths: list, out_dir: str) -> dict:
+    """Gera o índice a partir dos arquivos Empresas (CNPJ básico; razão social; ...)"""
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    key_chunks, offset_chunks, length_chunks = [], [], []
+    keys, offsets, lengths = [], [], []
+    position = 0
+
+    with open(os.path.join(out_dir, "names.bin"), "wb") as names:
+        for path in paths:
+            for row in _iter_csv_rows(path):
+                if len(row) < 2 or not row[0]:
+                    continue
+                name = row[1].strip().encode("utf-8")
+                names.write(name)
+                keys.append(row[0].strip().upper().zfill(8).encode("ascii", "ignore"))
+                offsets.append(position)
+                lengths.append(len(name))
+                position += len(name)
+                if len(keys) >= BUILD_CHUNK:
+                    key_chunks.append(np.array(keys, dtype="S8"))
+                    offset_chunks.append(np.array(offsets, dtype=np.uint64))
+                    length_chunks.append(np.array(lengths, dtype=np.uint32))
+                    keys, offsets, lengths = [], [], []
+    key_chunks.append(np.array(keys, dtype="S8"))
+    offset_chunks.append(np.array(offsets, dtype=np.uint64))
+    length_chunks.append(np.array(lengths, dtype=np.uint32))
+
+    all_keys = np.concatenate(key_chunks)
+    order = np.argsort(all_keys, kind="stable")
+    all_keys = all_keys[order]
+    # Chaves repetidas: mantém a primeira ocorrência
+    unique = np.ones(len(all_keys), dtype=bool)
+    unique[1:] = all_keys[1:] != all_keys[:-1]
+    order = order[unique]
+
+    np.save(os.path.join(out_dir, "keys.npy"), all_keys[unique])
+    np.save(os.path.join(out_dir, "offsets.npy"), np.concatenate(offset_chunks)[order])
+    np.save(os.path.join(out_dir, "lengths.npy"), np.concatenate(length_chunks)[order])
+    meta = {
+        "registros": int(unique.sum()),
+        "fontes": [os.path.basename(p) for p in paths],
+        "construido_em": datetime.now().isoformat(timespec="seconds"),
+        "tempo_s": round(time.perf_counter() - start, 1),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return meta
+
+class CNPJRegistry:
+    """Consulta de razão social por CNPJ sobre o índice memory-mapped"""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.keys = np.load(os.path.join(index_dir, "keys.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(index_dir, "lengths.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "names.bin"), "rb") as f:
+            self._names = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, cnpj: str):
+        """Razão social do CNPJ (completo ou básico) ou None"""
+        key = _basico(cnpj)
+        if len(key) != 8:
+            return None
+        i = int(np.searchsorted(self.keys, key))
+        if i >= len(self.keys) or self.keys[i] != key:
+            return None
+        start = int(self.offsets[i])
+        return self._names[start:start + int(self.lengths[i])].decode("utf-8")
+
+_registry = None
+
+def get_registry():
+    """Índice configurado em CNPJ_REGISTRY_DIR (None se não existir)"""
+    global _registry
+    if _registry is None and os.path.exists(os.path.join(config.CNPJ_REGISTRY_DIR, "keys.npy")):
+        _registry = CNPJRegistry(config.CNPJ_REGISTRY_DIR)
+    return _registry
+
+def _normalize_name(name: str) -> set:
+    words = re.sub(r'[^A-Z0-9 ]', ' ', unidecode(name or '').upper()).split()
+    return {w for w in words if w not in ("LTDA", "SA", "S", "A", "ME", "EPP", "EIRELI", "DE", "DA", "DO")}
+
+def names_match(extracted: str, official: str) -> bool:
+    """Compara nomes ignorando acentos, pontuação e sufixos societários"""
+    a, b = _normalize_name(extracted), _normalize_name(official)
+    if not a or not b:
+        return False
+    return len(a & b) / min(len(a), len(b)) >= 0.6
+
+PARTIES = (("cnpj_emitente", "nome_emitente"), ("cnpj_destinatario", "nome_destinatario"))
+
+def fill_names(campos, overwrite: bool = True) -> dict:
+    """Preenche/verifica os nomes das partes pelo CNPJ.
+
+    `campos` é um dict ou InvoiceRecord. Retorna o status por campo:
+    "preenchido", "confirmado" ou "corrigido" (ou "divergente" sem overwrite).
+    """
+    registry = get_registry()
+    if registry is None:
+        return {}
+    status = {}
+    for cnpj_field, name_field in PARTIES:
+        cnpj = campos.get(cnpj_field)
+        if not cnpj or not is_valid_cnpj(cnpj):
+            continue
+        official = registry.lookup(cnpj)
+        if not official:
+            continue
+        current = campos.get(name_field)
+        if not current:
+            new_value, status[name_field] = official, "preenchido"
+        elif names_match(current, official):
+            status[name_field] = "confirmado"
+            continue
+        elif overwrite:
+            new_value, status[name_field] = official, "corrigido"
+        else:
+            status[name_field] = "divergente"
+            continue
+        if isinstance(campos, dict):
+            campos[name_field] = new_value
+        else:
+            setattr(campos, name_field, new_value)
+    return status
+
+def main():
+    ap = argparse.ArgumentParser(description="Índice offline de CNPJ (Receita Federal)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="(re)constrói o índice a partir dos arquivos Empresas")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--out", default=config.CNPJ_REGISTRY_DIR)
+    p = sub.add_parser("lookup", help="consulta a razão social de um CNPJ")
+    p.add_argument("cnpj")
+    p.add_argument("--index", default=config.CNPJ_REGISTRY_DIR)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_index(args.inputs, args.out), indent=2, ensure_ascii=False))
+    else:
+        print(CNPJRegistry(args.index).lookup(args.cnpj))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# configurações do serviço (variáveis de ambiente / .env)
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def _int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+# Profiling por requisição (desligado por padrão)
+PROFILE_SAMPLE_RATE = _float("PROFILE_SAMPLE_RATE", 0.0)  # 0.0 a 1.0
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # segredo do cabeçalho; vazio = cabeçalho ignorado
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Limites de memória
+MAX_DOCUMENT_MEMORY_MB = _float("MAX_DOCUMENT_MEMORY_MB", 0)  # por documento em andamento; 0 = sem limite
+OCR_RESOLUTION = _int("OCR_RESOLUTION", 300)
+
+# Pré-processamento das imagens antes do OCR (src/preprocess.py)
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1").lower() not in ("0", "false", "no")
+OCR_TEXT_HEIGHT = _int("OCR_TEXT_HEIGHT", 32)   # altura alvo dos caracteres (px)
+OCR_MAX_SIDE = _int("OCR_MAX_SIDE", 3500)       # limite quando não há texto para medir
+
+# Reciclagem de workers (0 = desligado)
+WORKER_MAX_DOCUMENTS = _int("WORKER_MAX_DOCUMENTS", 0)
+WORKER_MAX_RSS_MB = _float("WORKER_MAX_RSS_MB", 0)
+# Só recicla com um supervisor que suba outro worker (serve.py liga; gunicorn é detectado)
+WORKER_SUPERVISED = os.getenv("WORKER_SUPERVISED", "0").lower() in ("1", "true", "yes")
+
+# Servidor pre-fork (serve.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = _int("SERVER_PORT", 8000)
+SERVER_WORKERS = _int("SERVER_WORKERS", os.cpu_count() or 1)
+
+# Resposta: itens acima deste limite são enviados em streaming
+STREAM_ITEMS_THRESHOLD = _int("STREAM_ITEMS_THRESHOLD", 1000)
+STREAM_CHUNK_SIZE = _int("STREAM_CHUNK_SIZE", 500)
+
+# Índice offline de CNPJ (python -m src.cnpj_registry build ...)
+CNPJ_REGISTRY_DIR = os.getenv("CNPJ_REGISTRY_DIR", "data/cnpj_index")
+
+# Detecção de notas duplicadas (SQLite + filtro de Bloom)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1").lower() not in ("0", "false", "no")
+DEDUP_DB = os.getenv("DEDUP_DB", "data/dedup.sqlite3")
+DEDUP_BLOOM = os.getenv("DEDUP_BLOOM", "")  # vazio = ao lado do DEDUP_DB (.bloom)
+DEDUP_CAPACITY = _int("DEDUP_CAPACITY", 5_000_000)
+DEDUP_FALSE_POSITIVE = _float("DEDUP_FALSE_POSITIVE", 0.001)
+
+# Templates de layout por emitente (python -m src.templates list)
+TEMPLATES_ENABLED = os.getenv("TEMPLATES_ENABLED", "1").lower() not in ("0", "false", "no")
+TEMPLATES_DIR = os.getenv("TEMPLATES_DIR", "data/templates")
+
+# PDFs com várias notas: processos para extrair as notas em paralelo (por worker do serve.py).
+# Padrão: CPUs divididas entre os workers, para N workers x pool não passar das CPUs
+SPLIT_WORKERS = _int("SPLIT_WORKERS", max(1, (os.cpu_count() or 1) // max(1, SERVER_WORKERS)))
+
+# Cache de artefatos intermediários (texto nativo, OCR, palavras, XML) por hash do documento
+ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "1").lower() not in ("0", "false", "no")
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "data/artifacts")
+
+# Faixas de admissão por custo do documento (src/lanes.py); políticas: reject | wait
+LANE_STRUCTURED_CONCURRENCY = _int("LANE_STRUCTURED_CONCURRENCY", 8)
+LANE_STRUCTURED_QUEUE = _int("LANE_STRUCTURED_QUEUE", 256)
+LANE_STRUCTURED_POLICY = os.getenv("LANE_STRUCTURED_POLICY", "wait")
+LANE_STRUCTURED_TIMEOUT = _float("LANE_STRUCTURED_TIMEOUT", 10.0)  # s na fila
+LANE_TEXT_CONCURRENCY = _int("LANE_TEXT_CONCURRENCY", os.cpu_count() or 1)
+LANE_TEXT_QUEUE = _int("LANE_TEXT_QUEUE", 64)
+LANE_TEXT_POLICY = os.getenv("LANE_TEXT_POLICY", "reject")
+LANE_TEXT_TIMEOUT = _float("LANE_TEXT_TIMEOUT", 30.0)
+LANE_TEXT_MAX_PAGES = _int("LANE_TEXT_MAX_PAGES", 50)  # acima disso vai para a faixa de OCR
+LANE_OCR_CONCURRENCY = _int("LANE_OCR_CONCURRENCY", max(1, (os.cpu_count() or 1) // 2))
+LANE_OCR_QUEUE = _int("LANE_OCR_QUEUE", 32)
+LANE_OCR_POLICY = os.getenv("LANE_OCR_POLICY", "reject")
+LANE_OCR_TIMEOUT = _float("LANE_OCR_TIMEOUT", 120.0)
+LANE_STRUCTURED_MAX_CSV_MB = _float("LANE_STRUCTURED_MAX_CSV_MB", 5)  # CSV maior vai para a faixa bulk
+LANE_BULK_CONCURRENCY = _int("LANE_BULK_CONCURRENCY", 1)
+LANE_BULK_QUEUE = _int("LANE_BULK_QUEUE", 8)
+LANE_BULK_POLICY = os.getenv("LANE_BULK_POLICY", "reject")
+LANE_BULK_TIMEOUT = _float("LANE_BULK_TIMEOUT", 300.0)
+LANE_RETRY_AFTER = _int("LANE_RETRY_AFTER", 5)  # s, cabeçalho Retry-After do 503
+
+# Prazo por requisição (src/deadline.py); 0 = sem prazo (só cancela se o cliente desconectar)
+REQUEST_BUDGET_MS = _int("REQUEST_BUDGET_MS", 0)
+DEADLINE_HEADER = os.getenv("DEADLINE_HEADER", "X-Deadline-Ms")
+DISCONNECT_POLL_MS = _int("DISCONNECT_POLL_MS", 500)
+
+# Ingestão de CSV de ERP (src/csv_ingest.py); engine: auto (pyarrow se instalado) | c | pyarrow
+CSV_CHUNK_ROWS = _int("CSV_CHUNK_ROWS", 100_000)
+CSV_SAMPLE_BYTES = _int("CSV_SAMPLE_BYTES", 64 * 1024)
+CSV_ENGINE = os.getenv("CSV_ENGINE", "auto")
+CSV_SCHEMA = os.getenv("CSV_SCHEMA", "")  # JSON {campo: coluna}; campos de item com prefixo "item."
+CSV_INLINE_MAX_NOTAS = _int("CSV_INLINE_MAX_NOTAS", 100)  # acima disso o /upload devolve só o resumo
+
+# Notas extraídas gravadas em SQLite para consulta (src/results.py, GET /notas)
+RESULTS_ENABLED = os.getenv("RESULTS_ENABLED", "1").lower() not in ("0", "false", "no")
+RESULTS_DB = os.getenv("RESULTS_DB", "data/results.sqlite3")
+RESULTS_BATCH_SIZE = _int("RESULTS_BATCH_SIZE", 500)
+RESULTS_FLUSH_MS = _int("RESULTS_FLUSH_MS", 1000)  # intervalo da gravação em lote
+# Fila pendente acima de N lotes: quem enfileira grava junto (o gravador não deu conta)
+RESULTS_MAX_PENDING_BATCHES = _int("RESULTS_MAX_PENDING_BATCHES", 4)
+RESULTS_MAX_PAGE = _int("RESULTS_MAX_PAGE", 1000)
+RESULTS_MAX_RETRIES = _int("RESULTS_MAX_RETRIES", 3)  # tentativas por nota com o banco travado
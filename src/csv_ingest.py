@@ -0,0 +1,321 @@
+# ingestão de CSV de ERP (uma linha por item de nota) em blocos de tamanho fixo
+#
+#   python -m src.csv_ingest export.csv --out notas.jsonl [--schema schema.json] [--store]
+#
+# 1. Delimitador, encoding e separador decimal saem de uma amostra do início
+#    (CSV_SAMPLE_BYTES): nada do sniffer do engine 'python' varrendo o arquivo;
+# 2. leitura em blocos de CSV_CHUNK_ROWS linhas com o engine C do pandas (ou o
+#    leitor em streaming do pyarrow, se instalado), só das colunas mapeadas;
+# 3. colunas -> campos de InvoiceRecord/ItemRecord por apelidos normalizados
+#    (DEFAULT_SCHEMA, sobreposto pelo JSON de CSV_SCHEMA);
+# 4. linhas consecutivas com a mesma chave (chave de acesso ou CNPJ/série/número)
+#    formam uma nota. Só a nota aberta na borda do bloco passa para o próximo,
+#    então a memória fica limitada ao bloco. O export precisa vir ordenado por
+#    nota: linhas da mesma nota separadas por outras viram notas distintas.
+import argparse
+import csv
+import json
+import re
+import time
+import numpy as np
+import orjson
+import pandas as pd
+from unidecode import unidecode
+from src import config, deadline, memory, results
+from src.fileutils import sha256_file
+from src.records import InvoiceRecord, ItemRecord
+
+try:
+    from pyarrow import csv as pa_csv
+    import pyarrow as pa
+except ImportError:
+    pa_csv = None
+
+DELIMITERS = (";", ",", "\t", "|")
+SNIFF_LINES = 50
+KEY_FIELDS = (("chave_acesso",), ("cnpj_emitente", "serie", "numero"))
+NUMERIC_FIELDS = ("valor_total", "valor_produtos", "item.quantidade", "item.valor_unitario", "item.valor_total")
+_DECIMAL_COMMA_RE = re.compile(r'^-?(?:R\$\s*)?\d{1,3}(?:\.\d{3})*,\d+$|^-?\d+,\d+$')
+_DECIMAL_POINT_RE = re.compile(r'^-?(?:R\$\s*)?\d{1,3}(?:,\d{3})*\.\d+$|^-?\d+\.\d+$')
+
+# Campo -> apelidos do cabeçalho (já normalizados: sem acento, minúsculos, "_")
+DEFAULT_SCHEMA = {
+    "chave_acesso": ["chave_acesso", "chave_de_acesso", "chave", "chave_nfe", "chnfe"],
+    "numero": ["numero", "numero_nota", "numero_da_nota", "numero_nf", "num_nf", "nf", "nnf", "nota"],
+    "serie": ["serie", "serie_nf"],
+    "data_emissao": ["data_emissao", "data_de_emissao", "dt_emissao", "emissao", "data", "dhemi"],
+    "cnpj_emitente": ["cnpj_emitente", "cnpj_fornecedor", "emitente_cnpj", "cnpj"],
+    "nome_emitente": ["nome_emitente", "razao_social_emitente", "emitente", "fornecedor", "razao_social"],
+    "cnpj_destinatario": ["cnpj_destinatario", "cnpj_cliente", "destinatario_cnpj"],
+    "nome_destinatario": ["nome_destinatario", "destinatario", "cliente"],
+    "valor_total": ["valor_total_nota", "valor_nota", "total_nota", "valor_total_nf", "vnf", "valor_total"],
+    "valor_produtos": ["valor_produtos", "total_produtos", "valor_total_produtos"],
+    "item.descricao": ["descricao", "descricao_item", "produto", "descricao_produto", "xprod"],
+    "item.quantidade": ["quantidade", "qtd", "qtde", "qcom"],
+    "item.valor_unitario": ["valor_unitario", "vl_unitario", "preco_unitario", "vuncom"],
+    "item.valor_total": ["valor_item", "valor_total_item", "total_item", "vl_item", "vprod", "valor"],
+    "item.codigo": ["codigo", "codigo_produto", "cod_produto", "cprod", "sku"],
+    "item.ncm": ["ncm"],
+    "item.cfop": ["cfop"],
+    "item.unidade": ["unidade", "un", "ucom"],
+}
+
+def normalize_header(name: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', unidecode(str(name)).lower()).strip('_')
+
+def load_schema(path: str = None) -> dict:
+    """Esquema padrão sobreposto pelo JSON {campo: coluna ou [colunas]} (CSV_SCHEMA)"""
+    schema = {field: list(aliases) for field, aliases in DEFAULT_SCHEMA.items()}
+    path = path or config.CSV_SCHEMA
+    if path:
+        with open(path, encoding="utf-8") as f:
+            custom = json.load(f)
+        for field, aliases in custom.items():
+            if field not in schema:
+                raise ValueError(f"Campo desconhecido no esquema CSV: {field}")
+            aliases = [aliases] if isinstance(aliases, str) else aliases
+            schema[field] = [normalize_header(alias) for alias in aliases]
+    return schema
+
+def map_columns(header: list, schema: dict) -> dict:
+    """Campo -> nome original da coluna (cada coluna atende a um campo só)"""
+    columns = {}
+    for name in header:
+        columns.setdefault(normalize_header(name), name)
+    mapping, used = {}, set()
+    for field, aliases in schema.items():
+        for alias in aliases:
+            if alias in columns and alias not in used:
+                mapping[field] = columns[alias]
+                used.add(alias)
+                break
+    return mapping
+
+def _encoding(head: bytes) -> str:
+    try:
+        head.decode("utf-8")
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        # Exports de ERP no Windows; cp1252 não define alguns bytes
+        try:
+            head.decode("cp1252")
+            return "cp1252"
+        except UnicodeDecodeError:
+            return "latin-1"
+
+def _delimiter(lines: list) -> str:
+    """Delimitador com o mesmo número de colunas (>1) no maior número de linhas"""
+    best, best_score = None, 0
+    for delimiter in DELIMITERS:
+        counts = [len(row) for row in csv.reader(lines, delimiter=delimiter)]
+        if not counts or counts[0] < 2:
+            continue
+        score = sum(1 for count in counts if count == counts[0])
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+def sniff(path: str, sample_bytes: int = None) -> dict:
+    """Delimitador, encoding, separador decimal e cabeçalho a partir do início do arquivo"""
+    sample_bytes = sample_bytes or config.CSV_SAMPLE_BYTES
+    with open(path, "rb") as f:
+        head = f.read(sample_bytes)
+    if len(head) == sample_bytes and b"\n" in head:
+        head = head[:head.rindex(b"\n")]  # última linha pode estar cortada
+    encoding = _encoding(head)
+    lines = [line for line in head.decode(encoding).splitlines() if line.strip()][:SNIFF_LINES]
+    delimiter = _delimiter(lines)
+    if delimiter is None:
+        raise ValueError("Delimitador do CSV não identificado")
+
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    values = [value.strip() for row in rows[1:] for value in row]
+    comma = sum(1 for value in values if _DECIMAL_COMMA_RE.match(value))
+    point = sum(1 for value in values if _DECIMAL_POINT_RE.match(value))
+    decimal = "," if delimiter != "," and comma >= point and comma else "."
+    return {"delimitador": delimiter, "encoding": encoding, "decimal": decimal,
+            "cabecalho": rows[0], "bytes_linha": len(head) // max(1, len(lines))}
+
+def _to_number(series: pd.Series, decimal: str) -> np.ndarray:
+    """Texto -> float vetorizado ("R$ 1.234,56" ou "1234.56"); vazio/inválido -> None"""
+    # np.char roda em C; o .str do pandas chama Python a cada célula
+    text = np.char.strip(np.asarray(series, dtype=str), " R$\t")
+    if decimal == ",":
+        text = np.char.replace(np.char.replace(text, ".", ""), ",", ".")
+    else:
+        text = np.char.replace(text, ",", "")
+    values = pd.to_numeric(text.astype(object), errors="coerce").astype(np.float64)
+    numbers = values.astype(object)
+    numbers[np.isnan(values)] = None
+    return numbers
+
+class CsvReader:
+    """Itera as notas de um CSV de itens; linhas, blocos e o dialeto ficam como estatística.
+
+    ValueError na criação se o dialeto ou as colunas não forem reconhecidos.
+    """
+
+    def __init__(self, path: str, schema: dict = None, chunk_rows: int = None, engine: str = None):
+        self.path = path
+        self.dialect = sniff(path)
+        self.mapping = map_columns(self.dialect["cabecalho"], schema or load_schema())
+        self.key = next((fields for fields in KEY_FIELDS if all(f in self.mapping for f in fields)),
+                        tuple(f for f in ("cnpj_emitente", "serie", "numero") if f in self.mapping))
+        if not any(f in self.mapping for f in ("chave_acesso", "numero")):
+            raise ValueError(f"CSV sem coluna de chave de acesso ou número da nota: {self.dialect['cabecalho']}")
+        if "item.descricao" not in self.mapping and "item.valor_total" not in self.mapping:
+            raise ValueError("CSV sem colunas de item (descrição/valor)")
+        self.invoice_fields = [field for field in self.mapping if not field.startswith("item.")]
+        self.chunk_rows = chunk_rows or config.CSV_CHUNK_ROWS
+        engine = engine or config.CSV_ENGINE
+        self.engine = "pyarrow" if engine in ("pyarrow", "auto") and pa_csv is not None else "c"
+        self.rows = 0
+        self.chunks = 0
+        self.invoices = 0
+        self.partial = False
+
+    def _read_pandas(self):
+        with pd.read_csv(self.path, sep=self.dialect["delimitador"], encoding=self.dialect["encoding"],
+                         encoding_errors="replace", dtype=str, keep_default_na=False,
+                         usecols=list(self.mapping.values()), chunksize=self.chunk_rows,
+                         engine="c") as reader:
+            yield from reader
+
+    def _read_pyarrow(self):
+        columns = list(self.mapping.values())
+        encoding = "utf8" if self.dialect["encoding"] == "utf-8-sig" else self.dialect["encoding"]
+        reader = pa_csv.open_csv(
+            self.path,
+            read_options=pa_csv.ReadOptions(encoding=encoding,
+                                            block_size=max(1 << 20, self.chunk_rows * self.dialect["bytes_linha"])),
+            parse_options=pa_csv.ParseOptions(delimiter=self.dialect["delimitador"]),
+            convert_options=pa_csv.ConvertOptions(include_columns=columns, strings_can_be_null=False,
+                                                  column_types={name: pa.string() for name in columns}),
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+
+    def _columns(self, chunk: pd.DataFrame) -> dict:
+        """Campo -> array do bloco (números já convertidos; texto cru, limpo ao montar a nota)"""
+        arrays = {}
+        for field, column in self.mapping.items():
+            if field in NUMERIC_FIELDS:
+                arrays[field] = _to_number(chunk[column], self.dialect["decimal"])
+            else:
+                arrays[field] = chunk[column].to_numpy(dtype=object)
+        return arrays
+
+    def _keys(self, arrays: dict) -> np.ndarray:
+        keys = self._join(arrays, self.key)
+        fallback = KEY_FIELDS[1]
+        if self.key == KEY_FIELDS[0] and all(f in self.mapping for f in fallback):
+            # Chave de acesso em branco (nota sem NF-e no ERP): agrupa por CNPJ/série/número
+            blank = np.char.str_len(np.char.strip(keys.astype(str))) == 0
+            if blank.any():
+                keys = np.where(blank, self._join(arrays, fallback).astype(str),
+                                keys.astype(str))
+        return keys
+
+    @staticmethod
+    def _join(arrays: dict, fields: tuple) -> np.ndarray:
+        if len(fields) == 1:
+            return arrays[fields[0]]
+        keys = arrays[fields[0]].astype(str)
+        for field in fields[1:]:
+            keys = np.char.add(np.char.add(keys, "\x1f"), arrays[field].astype(str))
+        return keys
+
+    def _items(self, arrays: dict, start: int, end: int) -> list:
+        empty = [None] * (end - start)
+        text = lambda name: [(v or "").strip() or None for v in arrays[name][start:end]] if name in arrays else empty
+        number = lambda name: arrays[name][start:end] if name in arrays else empty
+        return [ItemRecord(descricao=descricao or "", quantidade=quantidade, valor_unitario=unitario,
+                           valor_total=total, codigo=codigo, ncm=ncm, cfop=cfop, unidade=unidade)
+                for descricao, quantidade, unitario, total, codigo, ncm, cfop, unidade in zip(
+                    text("item.descricao"), number("item.quantidade"), number("item.valor_unitario"),
+                    number("item.valor_total"), text("item.codigo"), text("item.ncm"), text("item.cfop"),
+                    text("item.unidade"))]
+
+    def _invoice(self, arrays: dict, row: int) -> InvoiceRecord:
+        campos = {}
+        for field in self.invoice_fields:
+            value = arrays[field][row]
+            campos[field] = (value.strip() or None) if isinstance(value, str) else value
+        return InvoiceRecord.from_fields(**campos)
+
+    def _finish(self, invoice: InvoiceRecord) -> InvoiceRecord:
+        # Sem a coluna valor_produtos o campo fica None: a soma dos itens faria a
+        # conferência (check_totals) comparar os itens com eles mesmos
+        self.invoices += 1
+        return invoice
+
+    def __iter__(self):
+        read = self._read_pyarrow if self.engine == "pyarrow" else self._read_pandas
+        open_key, open_invoice = None, None
+        for chunk in read():
+            # Prazo da requisição (src/deadline.py): devolve as notas completas até aqui
+            if deadline.stop("csv_ingest"):
+                self.partial = True
+                return
+            self.chunks += 1
+            self.rows += len(chunk)
+            if not len(chunk):
+                continue
+            arrays = self._columns(chunk)
+            keys = self._keys(arrays)
+            # Início de cada grupo de linhas consecutivas com a mesma chave
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            ends = np.append(starts[1:], len(keys))
+            for start, end in zip(starts, ends):
+                items = self._items(arrays, start, end)
+                if open_invoice is not None and keys[start] == open_key:
+                    open_invoice.itens.extend(items)  # nota que atravessa a borda do bloco
+                    continue
+                if open_invoice is not None:
+                    yield self._finish(open_invoice)
+                open_key, open_invoice = keys[start], self._invoice(arrays, start)
+                open_invoice.itens = items
+        if open_invoice is not None:
+            yield self._finish(open_invoice)
+
+    def stats(self) -> dict:
+        return {"linhas": self.rows, "blocos": self.chunks, "notas": self.invoices, "engine": self.engine,
+                "delimitador": self.dialect["delimitador"], "encoding": self.dialect["encoding"],
+                "decimal": self.dialect["decimal"], "colunas": self.mapping}
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingestão de CSV de itens de notas (export de ERP)")
+    ap.add_argument("inputs", nargs="+")
+    ap.add_argument("--out", help="JSONL com uma nota por linha")
+    ap.add_argument("--schema", default=config.CSV_SCHEMA, help="JSON {campo: coluna}")
+    ap.add_argument("--chunk-rows", type=int, default=config.CSV_CHUNK_ROWS)
+    ap.add_argument("--store", action="store_true", help="grava as notas em RESULTS_DB (src/results.py)")
+    args = ap.parse_args()
+
+    schema = load_schema(args.schema)
+    out = open(args.out, "wb") if args.out else None
+    store = results.ResultStore(flush_ms=0) if args.store else None
+    try:
+        for path in args.inputs:
+            start = time.perf_counter()
+            csv_reader = CsvReader(path, schema, args.chunk_rows)
+            document_hash = sha256_file(path) if store else None
+            for invoice in csv_reader:
+                if out:
+                    out.write(orjson.dumps(invoice.as_dict()) + b"\n")
+                if store:
+                    store.add(invoice, {"extraction_method": "csv"}, document_hash)
+            elapsed = time.perf_counter() - start
+            stats = csv_reader.stats()
+            print(f"{path}: {stats['notas']} notas, {stats['linhas']} linhas em {elapsed:.2f}s "
+                  f"({stats['linhas'] / max(elapsed, 1e-9):,.0f} linhas/s, engine={stats['engine']}, "
+                  f"pico RSS {memory.peak_rss_mb():.0f} MB)")
+            print(f"  colunas: {stats['colunas']}")
+    finally:
+        if out:
+            out.close()
+        if store:
+            store.close()
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,11 @@ import cv2
 import numpy as np
 import os
 import subprocess
-from src.models import Invoice, InvoiceItem
+from src.records import InvoiceRecord
+from src import artifacts, cnpj_registry, config, deadline, events, items, preprocess, profiling
+from src.fileutils import PDFIUM_LOCK
+from src.memory import DocumentMemoryGuard, MemoryLimitExceeded
+from src.validators import CNPJ_PATTERN, find_chave_acesso, valid_cnpjs
 
 class DANFEParser:
     def __init__(self):
@@ -58,65 +62,125 @@ class DANFEParser:
         except:
             return False
 
-    def extract_from_pdf(self, pdf_path: str) -> dict:
+    def extract_from_pdf(self, pdf_path: str) -> InvoiceRecord:
         """Extrai dados de PDF com foco em DANFE"""
         try:
             # PRIMEIRO: Tenta extração de texto nativo (mais confiável para DANFEs)
-            text_native = self._extract_native_pdf_text(pdf_path)
+            with profiling.stage("danfe_native_text"):
+                text_native = self._extract_native_pdf_text(pdf_path)
             if text_native and len(text_native.strip()) > 100:
                 print("=== USANDO TEXTO NATIVO DO PDF ===")
-                result = self._parse_danfe_text(text_native, "native")
+                with profiling.stage("danfe_parse"):
+                    result = self._parse_danfe_text(text_native, "native")
                 if self._is_valid_extraction(result):
                     return result
             
             # SEGUNDO: Tenta OCR apenas se necessário
             if self.tesseract_available:
-                text_ocr = self._extract_ocr_text(pdf_path)
+                with profiling.stage("danfe_ocr_text"):
+                    text_ocr = self._extract_ocr_text(pdf_path)
                 if text_ocr and len(text_ocr.strip()) > 100:
                     print("=== USANDO OCR ===")
-                    result = self._parse_danfe_text(text_ocr, "ocr")
+                    with profiling.stage("danfe_parse"):
+                        result = self._parse_danfe_text(text_ocr, "ocr")
                     if self._is_valid_extraction(result):
                         return result
             
-            return {"error": "Não foi possível extrair dados suficientes"}
+            print("Não foi possível extrair dados suficientes")
+            return None
             
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Erro na extração PDF: {str(e)}")
 
     def _extract_native_pdf_text(self, pdf_path: str) -> str:
         """Extrai texto nativo do PDF (mais confiável para DANFEs)"""
-        text = ""
+        return artifacts.cached("native_text", lambda: self._read_native_pdf_text(pdf_path))
+
+    def _read_native_pdf_text(self, pdf_path: str) -> str:
+        parts = []
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    # Extrai texto
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                    
-                    # Extrai tabelas
-                    tables = page.extract_tables()
-                    for table in tables:
-                        for row in table:
-                            if any(cell for cell in row if cell):
-                                text += ' | '.join(str(cell) for cell in row if cell) + "\n"
+            with DocumentMemoryGuard() as guard, pdfplumber.open(pdf_path) as pdf:
+                for number, page in enumerate(pdf.pages, start=1):
+                    # Prazo esgotado: fica com o texto das páginas já lidas
+                    if deadline.stop("native_text"):
+                        break
+                    try:
+                        # Extrai texto
+                        page_text = page.extract_text()
+                        if page_text:
+                            parts.append(page_text)
+                        self._page_progress("native_text", number, len(pdf.pages), page_text, "native")
+                        
+                        # Extrai tabelas (a parte mais lenta em PDFs patológicos)
+                        if deadline.stop("native_tables"):
+                            break
+                        tables = page.extract_tables()
+                        for table in tables:
+                            for row in table:
+                                if any(cell for cell in row if cell):
+                                    parts.append(' | '.join(str(cell) for cell in row if cell))
+                        guard.check(number)
+                    except MemoryLimitExceeded as e:
+                        artifacts.incomplete(str(e))
+                        print(f"Erro na extração nativa: {e}")
+                        break
+                    except Exception as e:
+                        # Página com erro não derruba as seguintes (e o texto não vai para o cache)
+                        artifacts.incomplete(f"página {number}: {e}")
+                        print(f"Erro na extração nativa da página {number}: {e}")
+                    finally:
+                        # Libera caches de layout/objetos da página antes da próxima
+                        page.close()
         except Exception as e:
+            artifacts.incomplete(str(e))
             print(f"Erro na extração nativa: {e}")
-        return text
+        return "\n".join(parts) + "\n" if parts else ""
 
     def _extract_ocr_text(self, pdf_path: str) -> str:
         """Extrai texto via OCR"""
-        text = ""
+        # O OCR é a etapa mais cara: o resultado por página fica no cache de artefatos
+        pages = artifacts.cached("ocr_text", lambda: self._ocr_pdf_pages(pdf_path))
+        parts = [page["texto"] for page in pages if page["texto"]]
+        return "\n".join(parts) + "\n" if parts else ""
+
+    def _ocr_pdf_pages(self, pdf_path: str) -> list:
+        """OCR de cada página: [{"texto": ..., "confianca": ...}]"""
+        pages = []
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    img = page.to_image(resolution=300).original
-                    ocr_text = self._try_ocr_with_fallback(img)
-                    if ocr_text:
-                        text += ocr_text + "\n"
+            with DocumentMemoryGuard() as guard, pdfplumber.open(pdf_path) as pdf:
+                for number, page in enumerate(pdf.pages, start=1):
+                    if deadline.stop("ocr_text"):
+                        break
+                    img = None
+                    try:
+                        with PDFIUM_LOCK:
+                            img = page.to_image(resolution=config.OCR_RESOLUTION).original
+                        pages.append(self._ocr_with_confidence(img))
+                        confianca = pages[-1]["confianca"]
+                        self._page_progress("ocr_text", number, len(pdf.pages), pages[-1]["texto"], "ocr",
+                                            confianca / 100 if confianca is not None else None)
+                        guard.check(number)
+                    except deadline.DeadlineExceeded:
+                        break  # Tesseract morto pelo timeout: mantém as páginas anteriores
+                    except MemoryLimitExceeded as e:
+                        artifacts.incomplete(str(e))
+                        print(f"Erro no OCR: {e}")
+                        break
+                    except Exception as e:
+                        # Falha do Tesseract numa página: segue com as demais, sem gravar no cache
+                        artifacts.incomplete(f"página {number}: {e}")
+                        print(f"Erro no OCR da página {number}: {e}")
+                    finally:
+                        # Raster de 300 DPI ocupa dezenas de MB: descarta já
+                        if img is not None:
+                            img.close()
+                        page.close()
         except Exception as e:
+            artifacts.incomplete(str(e))
             print(f"Erro no OCR: {e}")
-        return text
+        return pages
 
     def _try_ocr_with_fallback(self, image) -> str:
         """Tenta OCR com fallbacks de idioma"""
@@ -128,9 +192,46 @@ class DANFEParser:
         except:
             return pytesseract.image_to_string(image)
 
-    def _is_valid_extraction(self, result: dict) -> bool:
+    def _ocr_with_confidence(self, image, photo: bool = False) -> dict:
+        """OCR com a confiança média das palavras (0-100) e o texto remontado em linhas"""
+        # Mesmo pré-processamento para fotos e páginas escaneadas
+        image = preprocess.prepare_image(image, photo)
+        data = self._image_to_data(image)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if conf < 0 or not word.strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(conf)
+        return {
+            "texto": "\n".join(" ".join(words) for words in lines.values()),
+            "confianca": round(sum(confidences) / len(confidences), 1) if confidences else None,
+        }
+
+    def _image_to_data(self, image) -> dict:
+        """pytesseract.image_to_data com fallback de idioma e o prazo da requisição como timeout"""
+        timeout = deadline.tesseract_timeout("ocr_text")
+        for lang in (self.tesseract_lang, None):
+            try:
+                return pytesseract.image_to_data(image, lang=lang, timeout=timeout,
+                                                 output_type=pytesseract.Output.DICT)
+            except RuntimeError as e:
+                # O pytesseract mata o processo quando o timeout estoura
+                if timeout and "timeout" in str(e).lower():
+                    deadline.current().cancel("prazo esgotado")
+                    deadline.check("ocr_text")
+                if lang is None:
+                    raise
+            except Exception:
+                if lang is None:
+                    raise
+
+    def _is_valid_extraction(self, result: InvoiceRecord) -> bool:
         """Verifica se a extração é válida"""
-        if 'error' in result:
+        if result is None:
             return False
         
         # Considera válido se tem pelo menos 2 campos críticos
@@ -138,15 +239,40 @@ class DANFEParser:
         filled = sum(1 for field in critical_fields if result.get(field))
         return filled >= 1
 
-    def _parse_danfe_text(self, text: str, source: str) -> dict:
+    def _parse_danfe_text(self, text: str, source: str) -> InvoiceRecord:
         """Analisa texto de DANFE com padrões específicos"""
         print(f"=== ANALISANDO DANFE ({source}) ===")
         print(f"Texto completo: {text}")
         
+        # 1-4. NÚMERO, DATA, CNPJs E VALOR TOTAL
+        campos = self._header_fields(text)
+        
+        # 5. NOMES - primeiro pelo índice de CNPJ, heurística só no que faltar
+        cnpj_registry.fill_names(campos)
+        if not campos.get('nome_emitente'):
+            campos['nome_emitente'] = self._extract_nome_emitente_danfe(text)
+        if not campos.get('nome_destinatario'):
+            campos['nome_destinatario'] = self._extract_nome_destinatario_danfe(text)
+        
+        # 6. ITENS
+        campos['itens'] = self._extract_itens_danfe(text)
+        campos['valor_produtos'] = items.find_products_total(text)
+        
+        print("=== RESULTADO ===")
+        for k, v in campos.items():
+            if v: print(f"✅ {k}: {v}")
+            else: print(f"❌ {k}: None")
+        
+        return InvoiceRecord.from_fields(**campos)
+
+    def _header_fields(self, text: str) -> dict:
+        """Campos de cabeçalho (só regex; barato o bastante para rodar por página)"""
         campos = {}
         
         # 1. NÚMERO DA NOTA
         campos['numero'] = self._extract_numero_danfe(text)
+        campos['serie'] = self._extract_serie_danfe(text)
+        campos['chave_acesso'] = find_chave_acesso(text)
         
         # 2. DATA EMISSÃO
         campos['data_emissao'] = self._extract_data_emissao_danfe(text)
@@ -157,20 +283,16 @@ class DANFEParser:
         
         # 4. VALOR TOTAL - BUSCA MAIS AGRESSIVA
         campos['valor_total'] = self._extract_valor_total_danfe(text)
-        
-        # 5. NOMES
-        campos['nome_emitente'] = self._extract_nome_emitente_danfe(text)
-        campos['nome_destinatario'] = self._extract_nome_destinatario_danfe(text)
-        
-        # 6. ITENS
-        campos['itens'] = self._extract_itens_danfe(text)
-        
-        print("=== RESULTADO ===")
-        for k, v in campos.items():
-            if v: print(f"✅ {k}: {v}")
-            else: print(f"❌ {k}: None")
-        
-        return Invoice(**campos).model_dump()
+        return campos
+
+    def _page_progress(self, stage: str, number: int, total: int, text: str, fonte: str,
+                       confianca: float = None):
+        """Progresso da página e campos já visíveis nela (só com /upload/stream)"""
+        if not events.active():
+            return
+        events.emit("pagina", {"etapa": stage, "pagina": number, "paginas": total, "confianca": confianca})
+        if text:
+            events.fields(self._header_fields(text), fonte, confianca, number)
 
     def _extract_numero_danfe(self, text: str) -> str:
         """Extrai número da nota específico para DANFE"""
@@ -191,6 +313,13 @@ class DANFEParser:
         
         return None
 
+    def _extract_serie_danfe(self, text: str) -> str:
+        """Extrai a série (ex.: 'N. 983.041 SÉRIE 1' ou 'SÉRIE: 001')"""
+        match = re.search(r'S[ÉE]RIE\s*[:.]?\s*(\d{1,3})\b', text, re.IGNORECASE)
+        if match:
+            return str(int(match.group(1)))
+        return None
+
     def _extract_data_emissao_danfe(self, text: str) -> str:
         """Extrai data de emissão para DANFE"""
         # Procura qualquer data no formato DD/MM/AAAA
@@ -203,13 +332,13 @@ class DANFEParser:
         return None
 
     def _extract_cnpjs_danfe(self, text: str) -> dict:
-        """Extrai CNPJs para DANFE"""
+        """Extrai CNPJs para DANFE (só os com dígitos verificadores válidos)"""
         result = {}
-        cnpjs = re.findall(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}', text)
+        cnpjs = re.findall(CNPJ_PATTERN, text)
         
         print(f"CNPJs encontrados (formatados): {cnpjs}")
         
-        if not cnpjs:
+        if not valid_cnpjs(cnpjs):
             # Tenta encontrar CNPJs sem formatação
             cnpjs_raw = re.findall(r'\d{14}', text)
             print(f"CNPJs encontrados (raw): {cnpjs_raw}")
@@ -218,9 +347,9 @@ class DANFEParser:
                 formatted = f"{cnpj_raw[:2]}.{cnpj_raw[2:5]}.{cnpj_raw[5:8]}/{cnpj_raw[8:12]}-{cnpj_raw[12:14]}"
                 cnpjs.append(formatted)
         
-        # Remove duplicatas mantendo a ordem
-        cnpjs = list(dict.fromkeys(cnpjs))
-        print(f"CNPJs únicos: {cnpjs}")
+        # Remove duplicatas mantendo a ordem e descarta DV inválido (lixo de OCR)
+        cnpjs = valid_cnpjs(list(dict.fromkeys(cnpjs)))
+        print(f"CNPJs válidos: {cnpjs}")
         
         if len(cnpjs) >= 1:
             result['cnpj_emitente'] = cnpjs[0]
@@ -361,30 +490,9 @@ class DANFEParser:
         return None
 
     def _extract_itens_danfe(self, text: str) -> list:
-        """Extrai itens simplificado para DANFE"""
-        itens = []
-        lines = text.split('\n')
-        
-        for line in lines:
-            if re.match(r'^\d', line.strip()):
-                parts = line.split()
-                if len(parts) >= 2:
-                    descricao = ""
-                    for part in parts[1:]:
-                        if not re.match(r'^\d+[,.]?\d*$', part):
-                            descricao += part + " "
-                    
-                    if descricao.strip():
-                        descricao_limpa = re.sub(r'[^\w\s\.\-/]', '', descricao.strip())
-                        itens.append(InvoiceItem(
-                            descricao=descricao_limpa,
-                            quantidade=1,
-                            valor_unitario=0,
-                            valor_total=0
-                        ))
-        
-        return itens[:5]
-
+        """Extrai os itens completos da tabela de produtos do DANFE"""
+        return list(items.parse_items(text.splitlines()))
+    
     def _normalize_value(self, value: str) -> float:
         """Converte valor para float"""
         if not value:
@@ -414,23 +522,37 @@ class DANFEParser:
             print(f"Erro ao normalizar valor '{value}': {e}")
             return None
 
-    def extract_from_image(self, image_path: str) -> dict:
+    def extract_from_image(self, image_path: str) -> InvoiceRecord:
         """Extrai de imagem (similar ao PDF)"""
         try:
             if self.tesseract_available:
-                img = Image.open(image_path)
-                text = self._try_ocr_with_fallback(img)
+                with profiling.stage("image_ocr_text"):
+                    text = self._extract_image_text(image_path)
                 if text:
-                    return self._parse_danfe_text(text, "image_ocr")
-            return {"error": "Não foi possível extrair dados da imagem"}
+                    with profiling.stage("danfe_parse"):
+                        return self._parse_danfe_text(text, "image_ocr")
+            print("Não foi possível extrair dados da imagem")
+            return None
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Erro na extração de imagem: {str(e)}")
 
+    def _extract_image_text(self, image_path: str) -> str:
+        """Texto da imagem via OCR (com cache de artefatos)"""
+        def ocr():
+            with Image.open(image_path) as img:
+                page = self._ocr_with_confidence(img, photo=True)
+            confianca = page["confianca"] / 100 if page["confianca"] is not None else None
+            self._page_progress("ocr_text", 1, 1, page["texto"], "ocr", confianca)
+            return [page]
+        return artifacts.cached("ocr_text", ocr)[0]["texto"]
+
 # Instância global
 parser = DANFEParser()
 
-def extract_from_pdf(pdf_path: str) -> dict:
+def extract_from_pdf(pdf_path: str) -> InvoiceRecord:
     return parser.extract_from_pdf(pdf_path)
 
-def extract_from_image(image_path: str) -> dict:
+def extract_from_image(image_path: str) -> InvoiceRecord:
     return parser.extract_from_image(image_path)
\ No newline at end of file
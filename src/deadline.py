@@ -0,0 +1,115 @@
+# prazo por requisição com cancelamento cooperativo das etapas de extração
+#
+# O orçamento vem do cabeçalho (DEADLINE_HEADER, em ms) ou de REQUEST_BUDGET_MS
+# e conta desde a chegada da requisição (inclui a espera na faixa). As etapas
+# consultam o prazo entre páginas/etapas:
+#   - `stop(etapa)`: laços que guardam o que já leram (texto das páginas
+#     anteriores) param e devolvem o parcial;
+#   - `check(etapa)`: etapas sem parcial útil levantam DeadlineExceeded.
+# O Tesseract recebe o tempo restante como timeout (o pytesseract mata o
+# processo). Cliente que desconecta cancela o prazo e o trabalho para no
+# próximo ponto de checagem. Resultados cortados saem marcados como parciais
+# e não entram no cache de artefatos.
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src import config
+
+_current = ContextVar("request_deadline", default=None)
+CLIENT_DISCONNECTED = "cliente desconectou"
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str, reason: str = "prazo esgotado"):
+        super().__init__(f"{reason} em '{stage}'")
+        self.stage = stage
+        self.reason = reason
+
+class Deadline:
+    """Prazo de uma requisição (budget_ms=0: sem prazo, só cancelamento)"""
+
+    def __init__(self, budget_ms: float = 0):
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else 0
+        self.expires_at = time.monotonic() + self.budget_ms / 1000 if self.budget_ms else None
+        self.reason = None
+        self.interrupted = []  # etapas cortadas pelo prazo/cancelamento
+        self.admitted = False  # já saiu da fila da faixa (src/lanes.py)
+
+    def remaining(self):
+        """Segundos restantes (None = sem prazo)"""
+        if self.reason:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        if self.reason is None and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.reason = "prazo esgotado"
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelado"):
+        if self.reason is None:
+            self.reason = reason
+
+    def stop(self, stage: str) -> bool:
+        if not self.expired():
+            return False
+        if stage not in self.interrupted:
+            self.interrupted.append(stage)
+        return True
+
+    def check(self, stage: str):
+        if self.stop(stage):
+            raise DeadlineExceeded(stage, self.reason)
+
+    def summary(self) -> dict:
+        return {"orcamento_ms": self.budget_ms or None, "motivo": self.reason,
+                "etapas_interrompidas": list(self.interrupted)}
+
+def from_headers(headers) -> Deadline:
+    """Prazo do cabeçalho (ms) ou o padrão da configuração"""
+    try:
+        budget = float(headers.get(config.DEADLINE_HEADER) or config.REQUEST_BUDGET_MS)
+    except ValueError:
+        budget = config.REQUEST_BUDGET_MS
+    return Deadline(budget)
+
+@contextmanager
+def scope(deadline: Deadline):
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+def current():
+    return _current.get()
+
+def remaining():
+    deadline = _current.get()
+    return deadline.remaining() if deadline else None
+
+def stop(stage: str) -> bool:
+    """True se o prazo acabou (registra a etapa interrompida); sem prazo é sempre False"""
+    deadline = _current.get()
+    return deadline is not None and deadline.stop(stage)
+
+def check(stage: str):
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+def interrupted() -> bool:
+    deadline = _current.get()
+    return deadline is not None and bool(deadline.interrupted)
+
+def tesseract_timeout(stage: str) -> float:
+    """Timeout para o pytesseract (0 = sem limite); levanta se não sobrou tempo"""
+    left = remaining()
+    if left is None:
+        return 0
+    if left <= 0.05:
+        # Não compensa abrir o processo para ser morto em seguida
+        _current.get().cancel("prazo esgotado")
+        check(stage)
+    return left
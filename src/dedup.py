@@ -0,0 +1,228 @@
+# índice de notas já processadas (mesma nota por XML, PDF do e-mail, foto...)
+#
+# Chaves de deduplicação, da mais forte para a mais fraca:
+#   chave:<44 dígitos>            - chave de acesso da NF-e/NFC-e
+#   nf:<cnpj>:<serie>:<numero>    - quando a chave não está disponível
+#   hash:<sha256>                 - mesmo arquivo reenviado
+#
+# O SQLite (WAL) é a fonte da verdade. Na frente dele fica um filtro de Bloom
+# em arquivo memory-mapped: o caso comum ("nunca vi") é respondido só com
+# bits em memória, sem consulta ao disco. Se o arquivo do filtro sumir ou o
+# dimensionamento mudar, ele é reconstruído a partir do SQLite.
+#
+#   python -m src.dedup stats
+#   python -m src.dedup check chave:3525...
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+from datetime import datetime
+from src import config
+from src.validators import clean_document, find_chave_acesso, is_valid_chave_acesso, strip_zeros
+
+_HEADER = struct.Struct("<4sQI")
+_MAGIC = b"IBF1"
+_XML_CHAVE_RE = re.compile(rb'(?:Id="NFe|<chNFe>)(\d{44})')
+
+def bloom_size(capacity: int, false_positive: float) -> tuple:
+    """(bits, funções de hash) ótimos para a capacidade e taxa de falso positivo"""
+    bits = math.ceil(-capacity * math.log(false_positive) / (math.log(2) ** 2))
+    return bits, max(1, round(bits / capacity * math.log(2)))
+
+class BloomFilter:
+    """Filtro de Bloom em arquivo (mmap compartilhado entre os workers)"""
+
+    def __init__(self, path: str, capacity: int, false_positive: float):
+        self.path = path
+        self.bits, self.hashes = bloom_size(capacity, false_positive)
+        size = _HEADER.size + (self.bits + 7) // 8
+        self.created = not self._matches(size)
+        if self.created:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.bits, self.hashes))
+                f.truncate(size)
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    def _matches(self, size: int) -> bool:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) != size:
+            return False
+        with open(self.path, "rb") as f:
+            return f.read(_HEADER.size) == _HEADER.pack(_MAGIC, self.bits, self.hashes)
+
+    def _positions(self, key: str):
+        # Hash duplo (Kirsch-Mitzenmacher) a partir de um único blake2b
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            byte = _HEADER.size + (pos >> 3)
+            self._mm[byte] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        mm = self._mm
+        return all(mm[_HEADER.size + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+def record_keys(invoice) -> list:
+    """Chaves de deduplicação de uma nota extraída (dict ou InvoiceRecord)"""
+    chave = invoice.get("chave_acesso")
+    if chave and is_valid_chave_acesso(chave):
+        return [f"chave:{re.sub(r'[^0-9]', '', chave)}"]
+    cnpj, numero = invoice.get("cnpj_emitente"), invoice.get("numero")
+    if cnpj and numero:
+        serie = strip_zeros(invoice.get("serie") or "")
+        return [f"nf:{clean_document(cnpj)}:{serie}:{strip_zeros(numero)}"]
+    return []
+
+def probe_keys(path: str, ext: str) -> list:
+    """Chaves obtidas sem extração completa (antes das etapas caras).
+
+    XML: chave de acesso no Id/chNFe; PDF: chave no texto nativo da 1ª página.
+    Imagens dependem de OCR e só são verificadas após a extração.
+    """
+    chave = None
+    try:
+        if ext == "xml":
+            with open(path, "rb") as f:
+                match = _XML_CHAVE_RE.search(f.read())
+            if match and is_valid_chave_acesso(match.group(1).decode()):
+                chave = match.group(1).decode()
+        elif ext == "pdf":
+            import pdfplumber
+            with pdfplumber.open(path) as pdf:
+                if pdf.pages:
+                    page = pdf.pages[0]
+                    chave = find_chave_acesso(page.extract_text() or "")
+                    page.close()
+    except Exception as e:
+        print(f"Pré-verificação de duplicata falhou: {e}")
+    return [f"chave:{chave}"] if chave else []
+
+class DedupIndex:
+    """Índice persistente de documentos vistos"""
+
+    def __init__(self, db_path: str = None, bloom_path: str = None,
+                 capacity: int = None, false_positive: float = None):
+        self.db_path = db_path or config.DEDUP_DB
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS documentos (
+            chave TEXT PRIMARY KEY,
+            document_hash TEXT,
+            origem TEXT,
+            primeiro_em TEXT,
+            vezes INTEGER NOT NULL DEFAULT 1)""")
+        # Filtro ao lado do banco (dedup.sqlite3 -> dedup.bloom), salvo se DEDUP_BLOOM for definido
+        bloom_path = bloom_path or config.DEDUP_BLOOM or os.path.splitext(self.db_path)[0] + ".bloom"
+        self.bloom = BloomFilter(bloom_path,
+                                 capacity or config.DEDUP_CAPACITY,
+                                 false_positive or config.DEDUP_FALSE_POSITIVE)
+        self.disk_lookups = 0
+        # As faixas de admissão (src/lanes.py) extraem em threads: conexão e bits do
+        # filtro são compartilhados (o `|=` dos bytes não é atômico)
+        self._lock = threading.Lock()
+        if self.bloom.created:
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        for (key,) in self.db.execute("SELECT chave FROM documentos"):
+            self.bloom.add(key)
+
+    def find(self, keys: list):
+        """Primeiro registro já visto entre as chaves (dict) ou None"""
+        for key in keys:
+            if key not in self.bloom:
+                continue
+            with self._lock:
+                self.disk_lookups += 1
+                row = self.db.execute(
+                    "SELECT chave, document_hash, origem, primeiro_em, vezes FROM documentos WHERE chave = ?",
+                    (key,)).fetchone()
+            if row:
+                return dict(zip(("chave", "document_hash", "origem", "primeiro_em", "vezes"), row))
+        return None
+
+    def claim(self, keys: list, document_hash: str = None, origem: str = None):
+        """Registra as chaves e devolve o primeiro registro que já existia (None se é nova).
+
+        Consulta e gravação numa só transação (BEGIN IMMEDIATE): dois envios
+        simultâneos da mesma nota, em threads ou workers diferentes, não passam
+        os dois como novos.
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        duplicata = None
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for key in keys:
+                    row = self.db.execute(
+                        "SELECT chave, document_hash, origem, primeiro_em, vezes FROM documentos WHERE chave = ?",
+                        (key,)).fetchone()
+                    if row and duplicata is None:
+                        duplicata = dict(zip(("chave", "document_hash", "origem", "primeiro_em", "vezes"), row))
+                        duplicata["vezes"] += 1
+                    self.db.execute(
+                        "INSERT INTO documentos (chave, document_hash, origem, primeiro_em) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(chave) DO UPDATE SET vezes = vezes + 1",
+                        (key, document_hash, origem, now))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            for key in keys:
+                self.bloom.add(key)
+        return duplicata
+
+    def stats(self) -> dict:
+        total, repetidos = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(vezes > 1), 0) FROM documentos").fetchone()
+        return {"chaves": total, "repetidas": repetidos, "bloom_bits": self.bloom.bits,
+                "bloom_hashes": self.bloom.hashes, "consultas_disco": self.disk_lookups}
+
+    def close(self):
+        self.bloom.close()
+        self.db.close()
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Índice configurado (None se DEDUP_ENABLED estiver desligado)"""
+    global _index
+    if _index is None and config.DEDUP_ENABLED:
+        with _index_lock:
+            if _index is None:
+                _index = DedupIndex()
+    return _index
+
+def main():
+    ap = argparse.ArgumentParser(description="Índice de notas duplicadas")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="tamanho do índice e do filtro de Bloom")
+    p = sub.add_parser("check", help="consulta uma chave (chave:..., nf:..., hash:...)")
+    p.add_argument("key")
+    args = ap.parse_args()
+
+    index = DedupIndex()
+    result = index.stats() if args.command == "stats" else index.find([args.key])
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# eventos de progresso da extração (Server-Sent Events em /upload/stream)
+#
+# As etapas rodam na thread da faixa (src/lanes.py) e publicam eventos num
+# ouvinte guardado em ContextVar; o ouvinte repassa para uma asyncio.Queue do
+# loop da requisição. Sem ouvinte (rota /upload normal) tudo é no-op.
+# Eventos:
+#   etapa   {"etapa", "estado": "inicio"|"fim", "ms"}     - via profiling.stage
+#   pagina  {"etapa", "pagina", "paginas", "confianca"}
+#   campo   {"campo", "valor", "fonte", "confianca", "pagina"} - só valores novos
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src.models import clean_cnpj
+
+_current = ContextVar("event_listener", default=None)
+
+# Confiança por origem do valor (OCR usa a confiança média do Tesseract na página)
+SOURCE_CONFIDENCE = {"xml_parser": 1.0, "template": 0.95, "native": 0.9, "ocr": 0.8, "hybrid": 0.7}
+FIELD_EVENTS = ("numero", "serie", "chave_acesso", "data_emissao", "cnpj_emitente", "nome_emitente",
+                "cnpj_destinatario", "nome_destinatario", "valor_total", "valor_produtos")
+_EMPTY = (None, "", [], {})
+
+class EventListener:
+    """Fila de eventos de uma requisição, alimentada por outra thread"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.sent = {}
+
+    def emit(self, event: str, data: dict):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def field(self, name: str, value, fonte: str, confianca: float = None, pagina: int = None):
+        if value in _EMPTY or self.sent.get(name) == value:
+            return
+        self.sent[name] = value
+        self.emit("campo", {"campo": name, "valor": value, "fonte": fonte,
+                            "confianca": SOURCE_CONFIDENCE.get(fonte) if confianca is None else confianca,
+                            "pagina": pagina})
+
+@contextmanager
+def scope(listener: EventListener):
+    token = _current.set(listener)
+    try:
+        yield listener
+    finally:
+        _current.reset(token)
+
+def current():
+    return _current.get()
+
+def active() -> bool:
+    return _current.get() is not None
+
+def emit(event: str, data: dict):
+    listener = _current.get()
+    if listener is not None:
+        listener.emit(event, data)
+
+def fields(campos, fonte: str, confianca: float = None, pagina: int = None):
+    """Publica os campos (dict ou InvoiceRecord) que ainda não foram enviados"""
+    listener = _current.get()
+    if listener is None or not campos:
+        return
+    get = campos.get
+    for name in FIELD_EVENTS:
+        value = get(name)
+        if name.startswith("cnpj_"):
+            value = clean_cnpj(value)  # mesmo formato do resultado final (só dígitos)
+        listener.field(name, value, fonte, confianca, pagina)
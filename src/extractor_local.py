@@ -1,18 +1,19 @@
 # implementação híbrida (regex + spaCy calls)
 
 import re
-import spacy
-from src.models import Invoice, InvoiceItem
+from src.records import InvoiceRecord
+from src.normalizer import normalize_valor
+from src.validators import CNPJ_PATTERN, is_valid_cnpj, valid_cnpjs
+from src import items, nlp_models
 
-nlp = spacy.load("src/nlp/spacy_model")
-# doc = nlp(raw_text)
-# for ent in doc.ents:
-#     print(ent.text, ent.label_)
+nlp = nlp_models.invoice_ner()
+# for label, text in nlp_models.extract_entities(raw_text):
+#     print(text, label)
 
 
 # regex helpers
 
-CNPJ_RE = re.compile(r'(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})')
+CNPJ_RE = re.compile(rf'({CNPJ_PATTERN})')
 VAL_RE = re.compile(r'(\d{1,3}(?:\.\d{3})*,\d{2})')
 NUM_RE = re.compile(r'(?:Nota\s*Fiscal|NF-e)\s*[:\-]?\s*(\d+)', re.I)
 DATE_RE = re.compile(r'(\d{2}/\d{2}/\d{4})')
@@ -20,55 +21,39 @@ EMITENTE_RE = re.compile(r'(?:Emitente|Razão Social|Empresa)\s*[:\-]?\s*(.+)')
 DESTINATARIO_RE = re.compile(r'(?:Destinatário|Cliente)\s*[:\-]?\s*(.+)')
 VAL_TOTAL_RE = re.compile(r'(?:Valor\s*Total|Total\s*da\s*Nota|Valor\s*da\s*Nota)\s*[:\-]?\s*R?\$?\s*([\d.,]+)')
 
-CNPJ_RE = re.compile(r'(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})')
-VAL_RE = re.compile(r'(\d{1,3}(?:\.\d{3})*,\d{2})')
 # ... outros regex ...
 
-def extract_invoice_data_local(raw_text: str) -> Invoice:
-    # 1. Extrai entidades com spaCy
-    doc = nlp(raw_text)
+def extract_invoice_data_local(raw_text: str) -> InvoiceRecord:
+    # 1. Extrai entidades com spaCy (regras primeiro, NER só no que faltar)
     campos_spacy = {}
-    for ent in doc.ents:
-        campos_spacy[ent.label_] = ent.text
+    for label, text in nlp_models.extract_entities(raw_text):
+        campos_spacy.setdefault(label, text)
 
     # 2. Extrai campos com regex (fallback ou complemento)
     numero = campos_spacy.get("NUMERO") or (NUM_RE.search(raw_text).group(1) if NUM_RE.search(raw_text) else None)
     data_emissao = campos_spacy.get("DATA_EMISSAO") or (DATE_RE.search(raw_text).group(1) if DATE_RE.search(raw_text) else None)
-    cnpjs = CNPJ_RE.findall(raw_text)
-    cnpj_emitente = campos_spacy.get("CNPJ_EMITENTE") or (cnpjs[0] if len(cnpjs) > 0 else None)
-    cnpj_destinatario = campos_spacy.get("CNPJ_DESTINATARIO") or (cnpjs[1] if len(cnpjs) > 1 else None)
+    # Candidatos filtrados por dígito verificador antes de escolher os papéis
+    cnpjs = valid_cnpjs(list(dict.fromkeys(CNPJ_RE.findall(raw_text))))
+    cnpj_emitente = campos_spacy.get("CNPJ_EMITENTE")
+    if not cnpj_emitente or not is_valid_cnpj(cnpj_emitente):
+        cnpj_emitente = cnpjs[0] if len(cnpjs) > 0 else None
+    cnpj_destinatario = campos_spacy.get("CNPJ_DESTINATARIO")
+    if not cnpj_destinatario or not is_valid_cnpj(cnpj_destinatario):
+        outros = [c for c in cnpjs if c != cnpj_emitente]
+        cnpj_destinatario = outros[0] if outros else None
     nome_emitente = campos_spacy.get("NOME_EMITENTE") or None
     nome_destinatario = campos_spacy.get("NOME_DESTINATARIO") or None
     valor_total = campos_spacy.get("VALOR_TOTAL") or None
+    if valor_total:
+        try:
+            valor_total = normalize_valor(VAL_RE.search(valor_total).group(1))
+        except (AttributeError, ValueError):
+            valor_total = None
 
-    # 3. Itens (regex/heurística)
-    itens = []
-    linhas = raw_text.split('\n')
-    for linha in linhas:
-        valores = VAL_RE.findall(linha)
-        if len(valores) >= 2:
-            partes = re.split(r'\s{2,}|\t|\|', linha)
-            descricao = partes[0].strip() if len(partes) > 0 else ""
-            quantidade = None
-            valor_unitario = None
-            valor_total_item = None
-            for parte in partes:
-                if re.match(r'^\d+$', parte.strip()):
-                    quantidade = int(parte.strip())
-                elif VAL_RE.match(parte.strip()):
-                    if not valor_unitario:
-                        valor_unitario = parte.strip()
-                    else:
-                        valor_total_item = parte.strip()
-            if descricao and quantidade and valor_unitario and valor_total_item:
-                itens.append(InvoiceItem(
-                    descricao=descricao,
-                    quantidade=quantidade,
-                    valor_unitario=valor_unitario,
-                    valor_total=valor_total_item
-                ))
+    # 3. Itens (regex compiladas, uma passada por linha)
+    itens = items.parse_items(raw_text.split('\n'), generic=True)
 
-    inv = Invoice(
+    inv = InvoiceRecord.from_fields(
         numero=numero,
         data_emissao=data_emissao,
         cnpj_emitente=cnpj_emitente,
@@ -0,0 +1,15 @@
+# utilitários de arquivo compartilhados
+import hashlib
+import threading
+
+# O PDFium não é thread-safe: classificação, separação e rasterização do OCR
+# (page.to_image do pdfplumber) rodam em threads diferentes e passam por aqui
+PDFIUM_LOCK = threading.RLock()
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash SHA-256 do conteúdo do arquivo (identifica o documento)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -1,16 +1,27 @@
 import re
-import spacy
-from src.models import Invoice, InvoiceItem
-from src import nfe_xml_parser, danfe_ocr_parser
+from src.records import InvoiceRecord
+from src.validators import CNPJ_PATTERN, find_chave_acesso, is_valid_cnpj, valid_cnpjs
+from src import cnpj_registry, deadline, nfe_xml_parser, danfe_ocr_parser, nlp_models, profiling
 import tempfile
 import os
 
 class HybridExtractor:
+    # Campo da nota -> label do modelo NER (src/nlp/spacy_model)
+    SPACY_LABELS = {
+        'numero': 'NUMERO',
+        'data_emissao': 'DATA_EMISSAO',
+        'cnpj_emitente': 'CNPJ_EMITENTE',
+        'cnpj_destinatario': 'CNPJ_DESTINATARIO',
+        'nome_emitente': 'NOME_EMITENTE',
+        'nome_destinatario': 'NOME_DESTINATARIO',
+        'valor_total': 'VALOR_TOTAL',
+    }
+
     def __init__(self):
-        # Carrega modelo spaCy se disponível
+        # Carrega modelo spaCy se disponível (instância única por processo)
         try:
-            self.nlp = spacy.load("pt_core_news_sm")
-        except:
+            self.nlp = nlp_models.invoice_ner()
+        except Exception:
             self.nlp = None
             print("spaCy model not available, using regex-only mode")
         
@@ -28,8 +39,8 @@ class HybridExtractor:
                 r'(\d{2}/\d{2}/\d{4})\s*\d{2}:\d{2}:\d{2}',  # Data + hora
             ],
             'cnpj': [
-                r'CNPJ\s*[:\-]?\s*(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})',
-                r'(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})',
+                rf'CNPJ\s*[:\-]?\s*({CNPJ_PATTERN})',
+                rf'({CNPJ_PATTERN})',
             ],
             'valor_total': [
                 r'TOTAL\s*DA\s*NOTA\s*[:\-]?\s*R\$\s*([\d.,]+)',
@@ -38,11 +49,12 @@ class HybridExtractor:
             ]
         }
     
-    def extract_from_file(self, file_path: str, file_ext: str) -> dict:
+    def extract_from_file(self, file_path: str, file_ext: str) -> InvoiceRecord:
         """Abordagem universal para qualquer tipo de nota fiscal"""
         
         # Primeiro: extrai texto do arquivo
-        raw_text = self._extract_raw_text(file_path, file_ext)
+        with profiling.stage("hybrid_raw_text"):
+            raw_text = self._extract_raw_text(file_path, file_ext)
         if not raw_text or len(raw_text.strip()) < 50:
             return None
         
@@ -50,16 +62,24 @@ class HybridExtractor:
         campos = {}
         
         # 1. Extração com regex
-        campos.update(self._extract_with_regex(raw_text))
+        with profiling.stage("hybrid_regex"):
+            campos.update(self._extract_with_regex(raw_text))
+        
+        # Nomes pelo índice offline de CNPJ (dispensa NER quando encontrados)
+        with profiling.stage("hybrid_cnpj_registry"):
+            cnpj_registry.fill_names(campos)
         
-        # 2. Extração com spaCy (se disponível)
-        if self.nlp:
-            campos.update(self._extract_with_spacy(raw_text))
+        # 2. Extração com spaCy (se disponível), só do que o regex não achou
+        # (sem prazo sobrando, fica com o que o regex e o índice de CNPJ acharam)
+        missing = {label for field, label in self.SPACY_LABELS.items() if not campos.get(field)}
+        if self.nlp and missing and not deadline.stop("hybrid_spacy"):
+            with profiling.stage("hybrid_spacy"):
+                campos.update(self._extract_with_spacy(raw_text, missing))
         
         # 3. Validação e correção de campos
         campos = self._validate_and_correct(campos, raw_text)
         
-        return Invoice(**campos).model_dump()
+        return InvoiceRecord.from_fields(**campos)
     
     def _extract_raw_text(self, file_path: str, file_ext: str) -> str:
         """Extrai texto de qualquer tipo de arquivo"""
@@ -76,16 +96,26 @@ class HybridExtractor:
                         return f.read()
             
             elif file_ext == "pdf":
-                return danfe_ocr_parser.DANFEParser()._extract_text_from_pdf(file_path)
+                # Usa a instância global (não repete a detecção do Tesseract)
+                parser = danfe_ocr_parser.parser
+                text = parser._extract_native_pdf_text(file_path)
+                if len(text.strip()) < 50 and parser.tesseract_available:
+                    text = parser._extract_ocr_text(file_path)
+                return text
             
             elif file_ext in ("png", "jpg", "jpeg"):
-                return danfe_ocr_parser.DANFEParser()._extract_text_from_image(file_path)
+                parser = danfe_ocr_parser.parser
+                if not parser.tesseract_available:
+                    return ""
+                return parser._extract_image_text(file_path)
             
             else:
                 # Para outros formatos (txt, csv, etc.)
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     return f.read()
                     
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error extracting raw text: {e}")
             return ""
@@ -108,11 +138,19 @@ class HybridExtractor:
                 campos['data_emissao'] = match.group(1)
                 break
         
+        # Chave de acesso (44 dígitos com DV)
+        chave = find_chave_acesso(text)
+        if chave:
+            campos['chave_acesso'] = chave
+        
         # CNPJs (identifica emitente vs destinatário)
         cnpjs = []
         for pattern in self.patterns['cnpj']:
             cnpjs.extend(re.findall(pattern, text))
         
+        # Só CNPJs com DV válido, sem repetir o mesmo CNPJ nos dois papéis
+        cnpjs = valid_cnpjs(list(dict.fromkeys(cnpjs)))
+        
         # Heurística: primeiro CNPJ geralmente é emitente
         if cnpjs:
             campos['cnpj_emitente'] = cnpjs[0]
@@ -130,25 +168,22 @@ class HybridExtractor:
         
         return campos
     
-    def _extract_with_spacy(self, text: str) -> dict:
-        """Usa spaCy para extração de entidades nomeadas"""
+    def _extract_with_spacy(self, text: str, needed: set) -> dict:
+        """Usa spaCy (regras + NER) para as entidades ainda não encontradas"""
         if not self.nlp or len(text) > 1000000:  # Limite para performance
             return {}
         
         try:
-            doc = self.nlp(text[:500000])  # Processa apenas primeira parte para performance
+            # Processa apenas primeira parte para performance
+            ents = nlp_models.extract_entities(text[:500000], needed)
+            fields = {label: field for field, label in self.SPACY_LABELS.items()}
             campos = {}
             
             # Mapeia entidades do spaCy para nossos campos
-            for ent in doc.ents:
-                if ent.label_ in ["NUMERO_NF", "NUMERO"] and not campos.get('numero'):
-                    campos['numero'] = ent.text
-                elif ent.label_ in ["DATA", "DATA_EMISSAO"] and not campos.get('data_emissao'):
-                    campos['data_emissao'] = ent.text
-                elif ent.label_ in ["CNPJ", "CNPJ_EMITENTE"] and not campos.get('cnpj_emitente'):
-                    campos['cnpj_emitente'] = ent.text
-                elif ent.label_ in ["VALOR", "VALOR_TOTAL"] and not campos.get('valor_total'):
-                    campos['valor_total'] = self._normalize_value(ent.text)
+            for label, value in ents:
+                field = fields.get(label)
+                if label in needed and field and not campos.get(field):
+                    campos[field] = self._normalize_value(value) if field == 'valor_total' else value
             
             return campos
         except Exception as e:
@@ -159,9 +194,9 @@ class HybridExtractor:
         """Valida e corrige campos extraídos"""
         result = campos.copy()
         
-        # Remove CNPJs inválidos (ex: 00.000.000/0000-00)
+        # Remove CNPJs inválidos (DV errado, ex: 00.000.000/0000-00)
         for cnpj_field in ['cnpj_emitente', 'cnpj_destinatario']:
-            if result.get(cnpj_field) and '000000000000' in result[cnpj_field]:
+            if result.get(cnpj_field) and not is_valid_cnpj(result[cnpj_field]):
                 result[cnpj_field] = None
         
         # Tenta encontrar nomes se não encontrados
@@ -201,7 +236,7 @@ class HybridExtractor:
         except:
             return None
     
-    def _xml_data_to_text(self, xml_data: dict) -> str:
+    def _xml_data_to_text(self, xml_data: InvoiceRecord) -> str:
         """Converte dados XML extraídos para texto para processamento adicional"""
         if not xml_data:
             return ""
@@ -223,5 +258,5 @@ class HybridExtractor:
 # Instância global
 extractor = HybridExtractor()
 
-def extract_from_file(file_path: str, file_ext: str) -> dict:
+def extract_from_file(file_path: str, file_ext: str) -> InvoiceRecord:
     return extractor.extract_from_file(file_path, file_ext)
\ No newline at end of file
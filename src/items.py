@@ -0,0 +1,141 @@
+# extração dos itens da nota (tabela "DADOS DOS PRODUTOS / SERVIÇOS")
+#
+# Motor em tempo linear: cada linha passa uma única vez por regex
+# pré-compiladas. Descrições quebradas em várias linhas são juntadas ao item
+# anterior (o item só é emitido quando o próximo começa ou a tabela acaba).
+# parse_items é um gerador: quem só percorre os itens (check_totals, o benchmark)
+# não monta a lista. A lista existe uma vez, em InvoiceRecord.itens, porque a nota
+# é gravada (results) e deduplicada antes de a resposta começar; a resposta em
+# streaming percorre essa lista em blocos (serialization._validated_chunks).
+import re
+from src.records import ItemRecord
+
+_MONEY = r'\d{1,3}(?:\.\d{3})*,\d{2}|\d+,\d{2}'
+
+# CÓDIGO DESCRIÇÃO NCM [CST] CFOP UN QUANT V.UNIT V.TOTAL [BC ICMS V.ICMS V.IPI ALÍQUOTAS...]
+DANFE_ROW_RE = re.compile(
+    r'^\s*(?P<codigo>[0-9A-Za-z][\w.\-/]*)\s+'
+    r'(?P<descricao>\S.*?)\s+'
+    r'(?P<ncm>\d{8}|\d{4}\.\d{2}\.\d{2})\s+'
+    r'(?:(?P<cst>\d{3,4})\s+)?'
+    r'(?P<cfop>[1-35-7]\d{3}|[1-35-7]\.\d{3})\s+'
+    r'(?P<unidade>[A-Za-z][A-Za-z0-9]{0,5})\s+'
+    r'(?P<quantidade>\d{1,3}(?:\.\d{3})*(?:,\d{1,4})?)\s+'
+    r'(?P<valor_unitario>\d{1,3}(?:\.\d{3})*,\d{2,10}|\d+,\d{2,10})\s+'
+    rf'(?P<valor_total>{_MONEY})'
+    r'(?:\s+[\d.,%]+)*\s*$'
+)
+
+# Texto genérico (planilhas/relatórios): DESCRIÇÃO  QTD  V.UNIT  V.TOTAL
+# separados por 2+ espaços, tabulação ou '|'
+GENERIC_ROW_RE = re.compile(
+    r'^\s*(?P<descricao>\S.*?)\s*(?:\s{2,}|\t|\|)\s*'
+    r'(?P<quantidade>\d+)\s*(?:\s{2,}|\t|\|)\s*'
+    rf'(?P<valor_unitario>{_MONEY})\s*(?:\s{{2,}}|\t|\|)\s*'
+    rf'(?P<valor_total>{_MONEY})\s*\|?\s*$'
+)
+
+TABLE_START_RE = re.compile(r'DADOS\s+DOS?\s+PRODUTOS?|PRODUTOS?\s*/\s*SERVI[CÇ]OS', re.IGNORECASE)
+TABLE_END_RE = re.compile(
+    r'DADOS\s+ADICIONAIS|C[AÁ]LCULO\s+DO\s+(?:ISSQN|IMPOSTO)|INFORMA[CÇ][OÕ]ES\s+COMPLEMENTARES'
+    r'|VALOR\s+TOTAL\s+DA\s+NOTA|RESERVADO\s+AO\s+FISCO|FOLHA\s*\d'
+    # cabeçalho repetido no início de cada folha
+    r'|DANFE|DOCUMENTO\s+AUXILIAR|CHAVE\s+DE\s+ACESSO|DESTINAT[AÁ]RIO|NATUREZA\s+DA\s+OPERA',
+    re.IGNORECASE,
+)
+MAX_CONTINUATION_LINES = 3
+# Linha de continuação: texto sem a cara de uma linha de valores
+_CONTINUATION_RE = re.compile(r'^\s*[A-Za-zÀ-ÿ][^|\t]*$')
+_NUMBERS_RE = re.compile(r'\d+[.,]\d+')
+
+PRODUCTS_TOTAL_RE = re.compile(
+    rf'VALOR\s+TOTAL\s+DOS\s+PRODUTOS\s*[:\-]?\s*(?:R\$\s*)?({_MONEY})', re.IGNORECASE)
+
+def _number(value: str) -> float:
+    return float(value.replace('.', '').replace(',', '.'))
+
+def _danfe_item(match) -> ItemRecord:
+    return ItemRecord(
+        descricao=match.group('descricao').strip(),
+        quantidade=_number(match.group('quantidade')),
+        valor_unitario=_number(match.group('valor_unitario')),
+        valor_total=_number(match.group('valor_total')),
+        codigo=match.group('codigo'),
+        ncm=match.group('ncm').replace('.', ''),
+        cfop=match.group('cfop').replace('.', ''),
+        unidade=match.group('unidade').upper(),
+    )
+
+def _generic_item(match) -> ItemRecord:
+    return ItemRecord(
+        descricao=match.group('descricao').strip(),
+        quantidade=float(match.group('quantidade')),
+        valor_unitario=_number(match.group('valor_unitario')),
+        valor_total=_number(match.group('valor_total')),
+    )
+
+def parse_items(lines, generic: bool = False):
+    """Gera os itens (ItemRecord) a partir das linhas de texto, em ordem.
+
+    `lines` pode ser qualquer iterável (ex.: arquivo aberto, gerador por página).
+    Com `generic=True` usa o layout de colunas separadas (DESCRIÇÃO QTD V.UNIT V.TOTAL)
+    em vez da linha de produto do DANFE.
+    """
+    row_re, build = (GENERIC_ROW_RE, _generic_item) if generic else (DANFE_ROW_RE, _danfe_item)
+    pending = None
+    in_table = False
+    continuation = 0  # linhas juntadas ao item pendente; -1 = não cabe mais continuação
+    for line in lines:
+        match = row_re.match(line)
+        if match:
+            if pending is not None:
+                yield pending
+            pending = build(match)
+            in_table = True
+            continuation = 0
+            continue
+        if TABLE_START_RE.search(line):
+            in_table = True
+        elif TABLE_END_RE.search(line):
+            in_table = False
+        elif (pending is not None and in_table and not generic and 0 <= continuation < MAX_CONTINUATION_LINES
+              and _CONTINUATION_RE.match(line) and not _NUMBERS_RE.search(line)):
+            # Descrição longa quebrada logo abaixo da linha do item
+            pending.descricao = f"{pending.descricao} {line.strip()}"
+            continuation += 1
+            continue
+        continuation = -1
+        if not in_table and pending is not None:
+            yield pending
+            pending = None
+    if pending is not None:
+        yield pending
+
+def lines_from_words(lines_of_words) -> list:
+    """Linhas de texto a partir de palavras com coordenadas (já agrupadas por linha)"""
+    return [" ".join(w["text"] for w in line) for line in lines_of_words]
+
+def find_products_total(text: str):
+    """'VALOR TOTAL DOS PRODUTOS' quando valor e rótulo estão na mesma linha"""
+    match = PRODUCTS_TOTAL_RE.search(text or '')
+    return _number(match.group(1)) if match else None
+
+def check_totals(itens, valor_total: float = None, produtos_total: float = None) -> dict:
+    """Confere a soma dos itens com o total dos produtos (ou o total da nota).
+
+    Soma em centavos inteiros para não acumular erro de ponto flutuante.
+    """
+    cents = 0
+    count = 0
+    for item in itens:
+        count += 1
+        if item.valor_total is not None:
+            cents += round(item.valor_total * 100)
+    referencia, total = ("valor_total_produtos", produtos_total) if produtos_total else ("valor_total", valor_total)
+    result = {"itens": count, "soma_itens": cents / 100, "referencia": referencia, "total_referencia": total}
+    if total is None or not count:
+        result["confere"] = None
+        return result
+    result["diferenca"] = round(total - cents / 100, 2)
+    result["confere"] = abs(result["diferenca"]) < 0.01 + 0.0001 * count
+    return result
@@ -0,0 +1,153 @@
+# faixas de admissão por custo do documento (XML em ms x OCR em segundos)
+#
+# Cada faixa tem concorrência, fila e política de sobrecarga próprias, e roda
+# a extração num pool de threads só dela: um XML nunca espera atrás de uma
+# pilha de PDFs escaneados no Tesseract.
+#   structured: XML de NF-e/NFC-e/NFS-e e CSV pequeno (parse direto)
+#   text:       PDF com camada de texto (pdfplumber/templates)
+#   ocr:        PDF escaneado, fotos e PDFs muito longos
+#   bulk:       CSV de ERP acima de LANE_STRUCTURED_MAX_CSV_MB (minutos de laço
+#               Python segurando o GIL; uma thread por padrão)
+# Políticas: "reject" limita a fila (503 imediato quando cheia); "wait" aceita
+# qualquer fila. Nas duas, quem espera mais que o timeout recebe 503.
+# Métricas por processo (cada worker do serve.py tem as suas faixas).
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src import config, deadline
+
+STRUCTURED_FORMATS = ("xml", "csv")
+_MB = 1024 * 1024
+OCR_TYPES = ("danfe_scan", "photo")
+_SAMPLES = 1024  # últimas esperas/durações guardadas para os percentis
+
+class LaneOverloaded(Exception):
+    def __init__(self, lane: str, reason: str):
+        super().__init__(f"Faixa '{lane}' sobrecarregada: {reason}")
+        self.lane = lane
+        self.reason = reason
+
+def _percentile(values, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+class Lane:
+    """Faixa com limite de concorrência, fila limitada e timeout de espera"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, policy: str, timeout: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.policy = policy
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"lane-{name}")
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self._waits = deque(maxlen=_SAMPLES)
+        self._durations = deque(maxlen=_SAMPLES)
+
+    async def run(self, fn, *args):
+        """Espera uma vaga e executa fn(*args) no pool da faixa"""
+        if self.policy == "reject" and self.waiting + self.active >= self.concurrency + self.max_queue:
+            self.rejected += 1
+            raise LaneOverloaded(self.name, f"fila cheia ({self.waiting})")
+        # A espera na fila também consome o prazo da requisição (src/deadline.py)
+        request_deadline = deadline.current()
+        left = request_deadline.remaining() if request_deadline else None
+        timeout = self.timeout if left is None else min(self.timeout, left)
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            if request_deadline is not None:
+                request_deadline.check("fila")
+            raise LaneOverloaded(self.name, f"espera acima de {self.timeout:g}s")
+        finally:
+            self.waiting -= 1
+        if request_deadline is not None:
+            # Daqui em diante o trabalho só para nos pontos de checagem do prazo
+            request_deadline.admitted = True
+        started = time.perf_counter()
+        self._waits.append(started - start)
+        self.admitted += 1
+        self.active += 1
+        try:
+            # Leva o contexto (perfil da requisição, documento dos artefatos) para a thread
+            context = contextvars.copy_context()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, context.run, fn, *args)
+        finally:
+            self.active -= 1
+            self._durations.append(time.perf_counter() - started)
+            self._slots.release()
+
+    def metrics(self) -> dict:
+        waits, durations = list(self._waits), list(self._durations)
+        return {
+            "concorrencia": self.concurrency,
+            "politica": self.policy,
+            "em_execucao": self.active,
+            "na_fila": self.waiting,
+            "fila_maxima": self.max_queue if self.policy == "reject" else None,
+            "admitidos": self.admitted,
+            "rejeitados": self.rejected,
+            "expirados": self.expired,
+            "espera_ms": {"p50": _percentile(waits, 0.5), "p99": _percentile(waits, 0.99),
+                          "max": _percentile(waits, 1.0)},
+            "duracao_ms": {"p50": _percentile(durations, 0.5), "p99": _percentile(durations, 0.99)},
+        }
+
+class LaneScheduler:
+    """Escolhe a faixa pelo tipo/custo do documento e mantém as faixas do processo"""
+
+    def __init__(self):
+        self.lanes = {
+            "structured": Lane("structured", config.LANE_STRUCTURED_CONCURRENCY, config.LANE_STRUCTURED_QUEUE,
+                               config.LANE_STRUCTURED_POLICY, config.LANE_STRUCTURED_TIMEOUT),
+            "text": Lane("text", config.LANE_TEXT_CONCURRENCY, config.LANE_TEXT_QUEUE,
+                         config.LANE_TEXT_POLICY, config.LANE_TEXT_TIMEOUT),
+            "ocr": Lane("ocr", config.LANE_OCR_CONCURRENCY, config.LANE_OCR_QUEUE,
+                        config.LANE_OCR_POLICY, config.LANE_OCR_TIMEOUT),
+            "bulk": Lane("bulk", config.LANE_BULK_CONCURRENCY, config.LANE_BULK_QUEUE,
+                         config.LANE_BULK_POLICY, config.LANE_BULK_TIMEOUT),
+        }
+
+    def lane_for(self, doc_class: dict) -> str:
+        """Faixa pelo custo esperado: parse estruturado, texto nativo ou OCR"""
+        if doc_class["formato"] == "csv" and doc_class.get("bytes", 0) > config.LANE_STRUCTURED_MAX_CSV_MB * _MB:
+            return "bulk"  # export grande não ocupa a faixa rápida dos XMLs
+        if doc_class["formato"] in STRUCTURED_FORMATS:
+            return "structured"
+        if doc_class["tipo"] in OCR_TYPES or doc_class["formato"] == "imagem":
+            return "ocr"
+        if doc_class.get("paginas", 1) > config.LANE_TEXT_MAX_PAGES:
+            return "ocr"  # PDF longo ocupa a faixa por tanto tempo quanto um OCR
+        return "text"
+
+    async def run(self, name: str, fn, *args):
+        return await self.lanes[name].run(fn, *args)
+
+    def metrics(self) -> dict:
+        return {name: lane.metrics() for name, lane in self.lanes.items()}
+
+# Instância global
+scheduler = LaneScheduler()
+
+def lane_for(doc_class: dict) -> str:
+    return scheduler.lane_for(doc_class)
+
+async def run(name: str, fn, *args):
+    return await scheduler.run(name, fn, *args)
+
+def metrics() -> dict:
+    return scheduler.metrics()
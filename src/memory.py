@@ -0,0 +1,132 @@
+# medição de memória, teto por documento e reciclagem de workers
+import os
+import signal
+import sys
+import threading
+from src import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+class MemoryLimitExceeded(MemoryError):
+    pass
+
+def current_rss_mb() -> float:
+    """RSS atual do processo em MB (Linux: /proc; demais: pico)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    """Pico de RSS do processo em MB"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS informa bytes; Linux, KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class DocumentMemoryGuard:
+    """Teto de memória por documento, contado no orçamento do processo.
+
+    O RSS é do processo inteiro: com as faixas (src/lanes.py) vários documentos
+    são extraídos ao mesmo tempo e um não pode ser culpado pela memória do outro.
+    O processo tem MAX_DOCUMENT_MEMORY_MB por documento em andamento, medido a
+    partir do RSS de quando o mais antigo deles começou.
+
+        with DocumentMemoryGuard() as guard:
+            ...
+            guard.check(numero_da_pagina)
+    """
+
+    _lock = threading.Lock()
+    _active = {}  # id(guard) -> RSS inicial
+
+    def __init__(self, limit_mb: float = None):
+        self.limit_mb = config.MAX_DOCUMENT_MEMORY_MB if limit_mb is None else limit_mb
+        self.baseline_mb = 0.0
+
+    def __enter__(self):
+        if self.limit_mb > 0:
+            self.baseline_mb = current_rss_mb()
+            with self._lock:
+                self._active[id(self)] = self.baseline_mb
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._active.pop(id(self), None)
+        return False
+
+    def check(self, page_number: int = None):
+        if self.limit_mb <= 0:
+            return
+        with self._lock:
+            baseline = min(self._active.values(), default=self.baseline_mb)
+            documents = max(1, len(self._active))
+        used = current_rss_mb() - baseline
+        budget = self.limit_mb * documents
+        if used > budget:
+            raise MemoryLimitExceeded(
+                f"Documentos em andamento ({documents}) excederam {budget:.0f} MB "
+                f"(usado {used:.0f} MB, página {page_number})"
+            )
+
+class WorkerRecycler:
+    """Encerra o worker após N documentos ou acima de um RSS limite.
+
+    Só com supervisor (serve.py, gunicorn ou WORKER_SUPERVISED=1), que sobe
+    outro worker no lugar; num `uvicorn app:app` simples o SIGTERM derrubaria
+    o serviço, então só avisa.
+    """
+
+    def __init__(self, max_documents: int = None, max_rss_mb: float = None, supervised: bool = None):
+        self.max_documents = config.WORKER_MAX_DOCUMENTS if max_documents is None else max_documents
+        self.max_rss_mb = config.WORKER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.supervised = supervised
+        self.documents = 0
+        self.recycling = False
+
+    def is_supervised(self) -> bool:
+        if self.supervised is not None:
+            return self.supervised
+        # Lido a cada vez: o serve.py liga a flag no master, depois do import do app
+        return config.WORKER_SUPERVISED or "gunicorn" in os.getenv("SERVER_SOFTWARE", "")
+
+    def should_recycle(self) -> bool:
+        if self.max_documents and self.documents >= self.max_documents:
+            return True
+        return bool(self.max_rss_mb) and current_rss_mb() > self.max_rss_mb
+
+    def document_done(self):
+        """Conta um documento e pede o encerramento gracioso se necessário"""
+        self.documents += 1
+        if not self.recycling and self.should_recycle():
+            self.recycling = True
+            if not self.is_supervised():
+                print(f"Aviso: worker {os.getpid()} passou do limite ({self.documents} documentos, "
+                      f"RSS {current_rss_mb():.0f} MB), mas roda sem supervisor; não será reciclado")
+                return
+            print(f"Reciclando worker {os.getpid()} após {self.documents} documentos "
+                  f"(RSS {current_rss_mb():.0f} MB)")
+            os.kill(os.getpid(), signal.SIGTERM)
+
+def process_memory(pid: int = None) -> dict:
+    """RSS, PSS e USS (memória exclusiva) de um processo em MB (Linux)"""
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(fields.get("Rss", 0.0), 1),
+        "pss_mb": round(fields.get("Pss", 0.0), 1),
+        "uss_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+    }
@@ -2,14 +2,39 @@ from pydantic import BaseModel, field_validator
 from typing import List, Optional
 import re
 
+def clean_cnpj(v):
+    """Remove formatação do CNPJ (numérico ou alfanumérico); senão mantém"""
+    if v is None:
+        return v
+    clean = re.sub(r'\D', '', v)
+    if len(clean) == 14:
+        return clean
+    # CNPJ alfanumérico: 12 posições [0-9A-Z] + 2 dígitos verificadores
+    clean = re.sub(r'[^0-9A-Za-z]', '', v).upper()
+    if re.fullmatch(r'[0-9A-Z]{12}\d{2}', clean):
+        return clean
+    return v
+
+def clean_date(v):
+    """Aceita apenas datas DD/MM/AAAA"""
+    if v and re.match(r'\d{2}/\d{2}/\d{4}', v):
+        return v
+    return None
+
 class InvoiceItem(BaseModel):
     descricao: str
     quantidade: Optional[float] = None
     valor_unitario: Optional[float] = None
     valor_total: Optional[float] = None
+    codigo: Optional[str] = None
+    ncm: Optional[str] = None
+    cfop: Optional[str] = None
+    unidade: Optional[str] = None
 
 class Invoice(BaseModel):
     numero: Optional[str] = None
+    serie: Optional[str] = None
+    chave_acesso: Optional[str] = None
     data_emissao: Optional[str] = None
     cnpj_emitente: Optional[str] = None
     nome_emitente: Optional[str] = None
@@ -17,22 +42,16 @@ class Invoice(BaseModel):
     nome_destinatario: Optional[str] = None
     itens: List[InvoiceItem] = []
     valor_total: Optional[float] = None
+    valor_produtos: Optional[float] = None
     impostos: dict = {}
 
     @field_validator('cnpj_emitente', 'cnpj_destinatario')
     @classmethod
     def validate_cnpj(cls, v):
-        if v is None:
-            return v
         # Remove formatação e valida
-        clean_cnpj = re.sub(r'\D', '', v)
-        if len(clean_cnpj) == 14:
-            return clean_cnpj
-        return v
+        return clean_cnpj(v)
 
     @field_validator('data_emissao')
     @classmethod
     def validate_date(cls, v):
-        if v and re.match(r'\d{2}/\d{2}/\d{4}', v):
-            return v
-        return None
\ No newline at end of file
+        return clean_date(v)
\ No newline at end of file
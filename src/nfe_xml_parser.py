@@ -1,18 +1,48 @@
 import xml.etree.ElementTree as ET
-from src.models import Invoice, InvoiceItem
+import numpy as np
+from src import artifacts
+from src.records import InvoiceRecord, ItemRecord
 import re
 
-def extract_from_xml(xml_path: str) -> dict:
+NFE_NS = 'http://www.portalfiscal.inf.br/nfe'
+
+def _tags(mapping: dict) -> dict:
+    # Mesma chave com e sem o namespace do portal: compara a tag direto, sem separar o prefixo
+    return {**mapping, **{f'{{{NFE_NS}}}{tag}': value for tag, value in mapping.items()}}
+
+# Tag de <prod> -> campo do item
+PROD_FIELDS = _tags({'xProd': 'descricao', 'qCom': 'quantidade', 'vUnCom': 'valor_unitario',
+                     'vProd': 'valor_total', 'cProd': 'codigo', 'NCM': 'ncm', 'CFOP': 'cfop', 'uCom': 'unidade'})
+DET_CHILDREN = _tags({'prod': 'prod', 'imposto': 'imposto'})
+
+# Impostos por item: grupo -> (linha do imposto, tag dentro da situação (ICMS00, IPITrib...) -> coluna)
+TAX_GROUPS = ('ICMS', 'IPI', 'PIS', 'COFINS')
+VALUE_COLUMNS = ('base', 'aliquota', 'valor')
+TAX_FIELDS = _tags({tax: (row, _tags({'CST': -1, 'CSOSN': -1, 'vBC': 0, f'p{tax}': 1, f'v{tax}': 2}))
+                    for row, tax in enumerate(TAX_GROUPS)})
+# Totais declarados em <ICMSTot> para conferir a soma dos itens
+ICMSTOT_FIELDS = {'ICMS': {'base': 'vBC', 'valor': 'vICMS'}, 'IPI': {'valor': 'vIPI'},
+                  'PIS': {'valor': 'vPIS'}, 'COFINS': {'valor': 'vCOFINS'}}
+
+def extract_from_xml(xml_path: str) -> InvoiceRecord:
     """Extrai dados diretamente do XML da NFe"""
+    # Campos já lidos deste documento vêm do cache de artefatos
+    data = artifacts.cached("xml_fields", lambda: _read_xml(xml_path).as_dict())
+    return InvoiceRecord.from_dict(data)
+
+def _read_xml(xml_path: str, taxes: bool = True) -> InvoiceRecord:
     try:
         tree = ET.parse(xml_path)
         root = tree.getroot()
         
         # Namespace da NFe
-        ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+        ns = {'nfe': NFE_NS}
         
         # Encontrar a tag NFe (pode variar)
-        nfe_node = root.find('.//nfe:NFe', ns) or root.find('.//NFe')
+        if root.tag in (f"{{{NFE_NS}}}NFe", "NFe"):
+            nfe_node = root
+        else:
+            nfe_node = root.find('.//nfe:NFe', ns) or root.find('.//NFe')
         
         if nfe_node is None:
             raise ValueError("Estrutura XML inválida para NFe")
@@ -27,6 +57,8 @@ def extract_from_xml(xml_path: str) -> dict:
         
         # Extração dos campos
         numero = get_text(ide, 'nNF')
+        serie = get_text(ide, 'serie')
+        chave_acesso = (infNFe.get('Id') or '').replace('NFe', '') or None
         data_emissao = format_date(get_text(ide, 'dhEmi') or get_text(ide, 'dEmi'))
         
         # Emitente
@@ -37,32 +69,49 @@ def extract_from_xml(xml_path: str) -> dict:
         cnpj_destinatario = get_text(dest, 'CNPJ') or get_text(dest, 'Cnpj')
         nome_destinatario = get_text(dest, 'xNome')
         
-        # Itens
+        # Itens: uma passada pelos filhos de cada <det> (prod e imposto), sem find por campo
         itens = []
-        for item in infNFe.findall('.//nfe:det', ns) or infNFe.findall('.//det'):
-            prod = item.find('nfe:prod', ns) or item.find('prod')
+        dets = infNFe.findall('.//nfe:det', ns) or infNFe.findall('.//det')
+        tax_columns = TaxColumns(len(dets)) if taxes else None
+        for index, item in enumerate(dets):
+            prod = imposto = None
+            for child in item:
+                name = DET_CHILDREN.get(child.tag)
+                if name == 'prod':
+                    prod = child
+                elif name == 'imposto':
+                    imposto = child
+            if imposto is not None and tax_columns is not None:
+                tax_columns.read(index, imposto)
             if prod is not None:
-                descricao = get_text(prod, 'xProd')
-                quantidade = float(get_text(prod, 'qCom') or 0)
-                valor_unitario = float(get_text(prod, 'vUnCom') or 0)
-                valor_total = float(get_text(prod, 'vProd') or 0)
-                
-                itens.append(InvoiceItem(
-                    descricao=descricao,
-                    quantidade=quantidade,
-                    valor_unitario=valor_unitario,
-                    valor_total=valor_total
+                campos = {}
+                for node in prod:
+                    field = PROD_FIELDS.get(node.tag)
+                    if field and field not in campos:
+                        campos[field] = node.text
+                itens.append(ItemRecord(
+                    descricao=campos.get('descricao') or "",
+                    quantidade=float(campos.get('quantidade') or 0),
+                    valor_unitario=float(campos.get('valor_unitario') or 0),
+                    valor_total=float(campos.get('valor_total') or 0),
+                    codigo=campos.get('codigo'),
+                    ncm=campos.get('ncm'),
+                    cfop=campos.get('cfop'),
+                    unidade=campos.get('unidade')
                 ))
         
         # Valor total
         icms_total = total.find('nfe:ICMSTot', ns) or total.find('ICMSTot')
         valor_total = float(get_text(icms_total, 'vNF') or 0)
+        valor_produtos = float(get_text(icms_total, 'vProd') or 0) or None
         
-        # Impostos
-        impostos = extract_taxes(infNFe, ns)
+        # Impostos: totais por imposto/CST somados nas colunas e conferidos com o ICMSTot
+        impostos = extract_taxes(tax_columns, icms_total) if tax_columns is not None else {}
         
-        return Invoice(
+        return InvoiceRecord.from_fields(
             numero=numero,
+            serie=serie,
+            chave_acesso=chave_acesso,
             data_emissao=data_emissao,
             cnpj_emitente=cnpj_emitente,
             nome_emitente=nome_emitente,
@@ -70,8 +119,9 @@ def extract_from_xml(xml_path: str) -> dict:
             nome_destinatario=nome_destinatario,
             itens=itens,
             valor_total=valor_total,
+            valor_produtos=valor_produtos,
             impostos=impostos
-        ).model_dump()
+        )
         
     except Exception as e:
         raise Exception(f"Erro na extração XML: {str(e)}")
@@ -83,6 +133,9 @@ def get_text(element, tag, namespace=None):
         node = element.find(f'{namespace}:{tag}', namespace)
     else:
         node = element.find(tag)
+        if node is None:
+            # XML oficial da NFe usa o namespace do portal fiscal
+            node = element.find(f'{{{NFE_NS}}}{tag}')
     return node.text if node is not None else None
 
 def format_date(date_str):
@@ -94,6 +147,105 @@ def format_date(date_str):
         return f"{match.group(3)}/{match.group(2)}/{match.group(1)}"
     return date_str
 
-def extract_taxes(infNFe, ns):
-    # Implementar extração de impostos específicos
-    return {}
\ No newline at end of file
+class TaxColumns:
+    """CST, base, alíquota e valor de ICMS/IPI/PIS/COFINS por item, em colunas NumPy.
+
+    `values[imposto, campo, item]` (campos: base, alíquota, valor; NaN = ausente)
+    e `cst[imposto, item]` ('' = item sem o imposto). Durante o parse as colunas
+    são listas planas pré-alocadas (atribuir em lista custa menos que em array);
+    viram arrays uma vez só, em `finish()`.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self._values = [np.nan] * (len(TAX_GROUPS) * len(VALUE_COLUMNS) * count)
+        self._cst = [''] * (len(TAX_GROUPS) * count)
+        self.values = self.cst = None
+
+    def read(self, index: int, imposto):
+        """Preenche a posição `index` a partir do <imposto> do item"""
+        values, cst, count = self._values, self._cst, self.count
+        for group in imposto:
+            tax = TAX_FIELDS.get(group.tag)
+            if tax is None:
+                continue  # vTotTrib, ICMSUFDest, II...
+            row, fields = tax
+            # <ICMS><ICMS00>..., <IPI><cEnq/><IPITrib>..., <PIS><PISAliq>...: iter() percorre em C
+            for node in group.iter():
+                column = fields.get(node.tag)
+                if column is None or not node.text:
+                    continue
+                if column < 0:
+                    cst[row * count + index] = node.text
+                else:
+                    values[(row * len(VALUE_COLUMNS) + column) * count + index] = float(node.text)
+
+    def finish(self) -> "TaxColumns":
+        self.values = np.array(self._values, dtype=np.float64).reshape(len(TAX_GROUPS), len(VALUE_COLUMNS), -1)
+        self.cst = np.array(self._cst, dtype=object).reshape(len(TAX_GROUPS), -1)
+        self._values = self._cst = None
+        return self
+
+    def per_item(self, present: np.ndarray) -> dict:
+        """Colunas por imposto (listas; None onde o item não tem o campo)"""
+        values = np.where(np.isnan(self.values), None, self.values).tolist()
+        cst = self.cst.tolist()
+        result = {}
+        for row, tax in enumerate(TAX_GROUPS):
+            if present[row]:
+                result[tax] = {'cst': [code or None for code in cst[row]]}
+                result[tax].update(zip(VALUE_COLUMNS, values[row]))
+        return result
+
+def extract_taxes(tax_columns: TaxColumns, icms_total=None) -> dict:
+    """Totais por imposto e por CST (soma vetorizada das colunas) conferidos com o ICMSTot"""
+    if not tax_columns.count:
+        return {}
+    if tax_columns.values is None:
+        tax_columns.finish()
+    has_tax = tax_columns.cst != ''
+    counts = has_tax.sum(axis=1)
+    if not counts.any():
+        return {}
+    # Centavos inteiros, como items.check_totals (sem erro acumulado de ponto flutuante)
+    cents = np.rint(np.where(np.isnan(tax_columns.values), 0.0, tax_columns.values) * 100).astype(np.int64)
+    base, valor = cents[:, 0, :] * has_tax, cents[:, 2, :] * has_tax
+    # Imposto x CST num único bincount: grupo = linha do imposto * nº de CSTs + CST
+    labels, inverse = np.unique(tax_columns.cst.astype(str), return_inverse=True)
+    groups = (np.arange(len(TAX_GROUPS))[:, None] * len(labels) + inverse.reshape(has_tax.shape)).ravel()
+    size = len(TAX_GROUPS) * len(labels)
+    itens_cst = np.bincount(groups, minlength=size).reshape(len(TAX_GROUPS), -1).tolist()
+    base_cst = np.bincount(groups, weights=base.ravel(), minlength=size).reshape(len(TAX_GROUPS), -1).tolist()
+    valor_cst = np.bincount(groups, weights=valor.ravel(), minlength=size).reshape(len(TAX_GROUPS), -1).tolist()
+    base_total, valor_total = base.sum(axis=1).tolist(), valor.sum(axis=1).tolist()
+    labels = labels.tolist()
+
+    impostos = {}
+    confere = []
+    for row, tax in enumerate(TAX_GROUPS):
+        count = int(counts[row])
+        if not count:
+            continue
+        entry = {
+            'itens': count,
+            'base': base_total[row] / 100,
+            'valor': valor_total[row] / 100,
+            'por_cst': {cst: {'itens': itens_cst[row][i], 'base': round(base_cst[row][i] / 100, 2),
+                              'valor': round(valor_cst[row][i] / 100, 2)}
+                        for i, cst in enumerate(labels) if cst and itens_cst[row][i]},
+        }
+        conferencia = {}
+        for name, tag in ICMSTOT_FIELDS[tax].items():
+            declared = get_text(icms_total, tag)
+            if declared is None:
+                continue
+            diferenca = round(float(declared) - entry[name], 2)
+            conferencia[name] = {'nota': float(declared), 'diferenca': diferenca,
+                                 'confere': abs(diferenca) < 0.01 + 0.0001 * count}
+            confere.append(conferencia[name]['confere'])
+        if conferencia:
+            entry['conferencia'] = conferencia
+        impostos[tax] = entry
+    impostos['confere'] = all(confere) if confere else None
+    impostos['por_item'] = tax_columns.per_item(counts > 0)
+    return impostos
@@ -0,0 +1,92 @@
+# conversão de anotações (doccano / spaCy) em corpora binários DocBin
+import hashlib
+import json
+import os
+import spacy
+from spacy.tokens import DocBin
+
+def read_annotations(path: str):
+    """Lê exportações do doccano (JSONL) ou lista JSON no formato (texto, {"entities": [...]}).
+
+    Gera (texto, [(inicio, fim, label), ...]).
+    """
+    with open(path, encoding="utf-8") as f:
+        first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            for text, annotations in json.load(f):
+                yield text, [tuple(ent) for ent in annotations.get("entities", [])]
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("data") or ""
+            if "entities" in record:
+                # doccano com relações: [{"start_offset", "end_offset", "label"}]
+                spans = [(e["start_offset"], e["end_offset"], e["label"]) for e in record["entities"]]
+            else:
+                # doccano sequence labeling: "label": [[inicio, fim, "LABEL"], ...]
+                spans = [tuple(span) for span in record.get("label", [])]
+            yield text, spans
+
+def validate_spans(doc, spans: list, stats: dict) -> list:
+    """Confere offsets contra o texto e os tokens; descarta (e conta) os inválidos"""
+    text = doc.text
+    ents = []
+    for start, end, label in sorted(spans, key=lambda s: (s[0], s[1])):
+        if not (0 <= start < end <= len(text)):
+            stats["fora_do_texto"] += 1
+            continue
+        # Espaços nas bordas são comuns nas anotações manuais
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start == end:
+            stats["vazias"] += 1
+            continue
+        span = doc.char_span(start, end, label=label, alignment_mode="strict")
+        if span is None:
+            stats["desalinhadas"] += 1
+            continue
+        if ents and span.start < ents[-1].end:
+            stats["sobrepostas"] += 1
+            continue
+        ents.append(span)
+    stats["validas"] += len(ents)
+    return ents
+
+def _is_dev(text: str, dev_ratio: float) -> bool:
+    # Divisão estável: o mesmo documento cai sempre no mesmo conjunto
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") / 2 ** 32 < dev_ratio
+
+def convert(paths: list, out_dir: str, dev_ratio: float = 0.2, lang: str = "pt") -> dict:
+    """Converte arquivos de anotação em train.spacy / dev.spacy"""
+    nlp = spacy.blank(lang)
+    train, dev = DocBin(), DocBin()
+    stats = {"documentos": 0, "train": 0, "dev": 0, "palavras": 0, "validas": 0,
+             "fora_do_texto": 0, "vazias": 0, "desalinhadas": 0, "sobrepostas": 0}
+    for path in paths:
+        for text, spans in read_annotations(path):
+            if not text.strip():
+                continue
+            doc = nlp.make_doc(text)
+            doc.ents = validate_spans(doc, spans, stats)
+            stats["documentos"] += 1
+            stats["palavras"] += len(doc)
+            if _is_dev(text, dev_ratio):
+                dev.add(doc)
+                stats["dev"] += 1
+            else:
+                train.add(doc)
+                stats["train"] += 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    train.to_disk(os.path.join(out_dir, "train.spacy"))
+    dev.to_disk(os.path.join(out_dir, "dev.spacy"))
+    with open(os.path.join(out_dir, "stats.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    return stats
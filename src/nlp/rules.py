@@ -0,0 +1,55 @@
+# regras compiladas para as entidades regulares (antes do NER estatístico)
+import re
+from spacy.language import Language
+from spacy.util import filter_spans
+from src.validators import CNPJ_PATTERN, is_valid_cnpj
+
+CNPJ_RE = re.compile(rf'\b{CNPJ_PATTERN}\b')
+DATE_RE = re.compile(r'\b(\d{2}/\d{2}/\d{4})\b')
+VALOR_TOTAL_RE = re.compile(
+    r'(?:VALOR\s*TOTAL(?:\s*DA\s*NOTA)?|TOTAL\s*DA\s*NOTA|VALOR\s*L[IÍ]QUIDO)[^\d\n]{0,40}?'
+    r'(\d{1,3}(?:\.\d{3})*,\d{2})',
+    re.IGNORECASE,
+)
+NUMERO_RE = re.compile(
+    r'(?:NF-?e\s*N[º°o.]?|NOTA\s*FISCAL\s*(?:N[º°o.]?)?|N[ÚU]MERO(?:\s*/\s*S[ÉE]RIE)?)\s*[:\-]?\s*(\d{1,3}(?:\.\d{3})+|\d+)',
+    re.IGNORECASE,
+)
+
+# Labels resolvidas pelas regras; o NER estatístico fica com os nomes
+RULE_LABELS = {"CNPJ_EMITENTE", "CNPJ_DESTINATARIO", "DATA_EMISSAO", "VALOR_TOTAL", "NUMERO"}
+NAME_LABELS = {"NOME_EMITENTE", "NOME_DESTINATARIO"}
+
+def find_rule_entities(text: str) -> list:
+    """Entidades regulares como (inicio, fim, label) sobre o texto"""
+    found = []
+    cnpjs, seen = [], set()
+    for match in CNPJ_RE.finditer(text):
+        if match.group() not in seen and is_valid_cnpj(match.group()):
+            seen.add(match.group())
+            cnpjs.append(match.span())
+    # Mesma heurística dos extratores: 1º CNPJ emitente, 2º destinatário
+    for (start, end), label in zip(cnpjs, ("CNPJ_EMITENTE", "CNPJ_DESTINATARIO")):
+        found.append((start, end, label))
+
+    match = DATE_RE.search(text)
+    if match:
+        found.append((*match.span(1), "DATA_EMISSAO"))
+    match = VALOR_TOTAL_RE.search(text)
+    if match:
+        found.append((*match.span(1), "VALOR_TOTAL"))
+    match = NUMERO_RE.search(text)
+    if match:
+        found.append((*match.span(1), "NUMERO"))
+    return found
+
+@Language.component("invoice_rules")
+def invoice_rules(doc):
+    """Marca CNPJs, data, valor total e número; o NER posterior respeita esses spans"""
+    spans = []
+    for start, end, label in find_rule_entities(doc.text):
+        span = doc.char_span(start, end, label=label, alignment_mode="expand")
+        if span is not None:
+            spans.append(span)
+    doc.ents = filter_spans(list(doc.ents) + spans)
+    return doc
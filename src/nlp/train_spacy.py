@@ -1,66 +1,156 @@
 # scripts para treinar/retreinar o modelo spacy
+#
+# 1. Converter anotações (exportação do doccano) em corpora DocBin:
+#    python src/nlp/train_spacy.py convert anotacoes.jsonl --out src/nlp/corpus
+# 2. Treinar (config spaCy, minibatches compostos, avaliação no dev):
+#    python src/nlp/train_spacy.py train --corpus src/nlp/corpus [--promote]
+# 3. Avaliar um modelo já treinado:
+#    python src/nlp/train_spacy.py evaluate src/nlp/models/<versao>/model-best --corpus src/nlp/corpus
+# 4. Gravar as regras (invoice_rules) antes do NER no modelo distribuído:
+#    python src/nlp/train_spacy.py rebuild
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+NLP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(NLP_DIR)))
+
 import spacy
+from spacy.cli.train import train as spacy_train
+from spacy.tokens import DocBin
 from spacy.training import Example
+from src.nlp import corpus, rules
+
+CONFIG_PATH = os.path.join(NLP_DIR, "configs", "ner.cfg")
+MODELS_DIR = os.path.join(NLP_DIR, "models")
+SHIPPED_MODEL = os.path.join(NLP_DIR, "spacy_model")
+
+# Palavras/segundos acumulados informados pelo loop de treino do spaCy
+THROUGHPUT = {"words": 0, "seconds": 0.0}
+
+@spacy.registry.loggers("invoicebot.ThroughputLogger.v1")
+def throughput_logger(progress_bar: bool = False):
+    """ConsoleLogger do spaCy + registro da vazão de treino (palavras/s)"""
+    console = spacy.registry.loggers.get("spacy.ConsoleLogger.v1")(progress_bar=progress_bar)
+
+    def setup(nlp, stdout=sys.stdout, stderr=sys.stderr):
+        log_step, finalize = console(nlp, stdout, stderr)
+
+        def step(info):
+            log_step(info)
+            if info is not None:
+                THROUGHPUT["words"] = info["words"]
+                THROUGHPUT["seconds"] = info["seconds"]
+
+        return step, finalize
+
+    return setup
+
+def evaluate(model_path: str, dev_path: str) -> dict:
+    """Scores no conjunto de avaliação + velocidade de inferência (palavras/s)"""
+    nlp = spacy.load(model_path)
+    docs = list(DocBin().from_disk(dev_path).get_docs(nlp.vocab))
+    if not docs:
+        return {}
+    examples = [Example(nlp.make_doc(doc.text), doc) for doc in docs]
+    scores = nlp.evaluate(examples)
+
+    texts = [doc.text for doc in docs]
+    words = sum(len(doc) for doc in docs)
+    start = time.perf_counter()
+    for _ in nlp.pipe(texts, batch_size=256):
+        pass
+    elapsed = time.perf_counter() - start
+    return {
+        "ents_p": scores.get("ents_p"),
+        "ents_r": scores.get("ents_r"),
+        "ents_f": scores.get("ents_f"),
+        "ents_per_type": scores.get("ents_per_type"),
+        "inferencia_palavras_s": round(words / elapsed, 1) if elapsed else None,
+        "inferencia_ms_por_doc": round(elapsed / len(docs) * 1000, 3),
+    }
+
+def rebuild_pipeline(path: str = SHIPPED_MODEL) -> dict:
+    """Insere o componente de regras antes do NER e salva o pipeline"""
+    nlp = spacy.load(path)
+    if "invoice_rules" not in nlp.pipe_names:
+        nlp.add_pipe("invoice_rules", before="ner" if "ner" in nlp.pipe_names else None)
+        nlp.to_disk(path)
+    return {"modelo": path, "pipeline": nlp.pipe_names, "regras": sorted(rules.RULE_LABELS)}
+
+def train(corpus_dir: str, version: str = None, use_gpu: int = -1, promote: bool = False) -> dict:
+    """Treina uma nova versão em src/nlp/models/<versao> e grava report.json"""
+    version = version or datetime.now().strftime("%Y%m%d-%H%M%S")
+    out_dir = os.path.join(MODELS_DIR, version)
+    train_path = os.path.join(corpus_dir, "train.spacy")
+    dev_path = os.path.join(corpus_dir, "dev.spacy")
+
+    start = time.perf_counter()
+    spacy_train(CONFIG_PATH, out_dir, use_gpu=use_gpu,
+                overrides={"paths.train": train_path, "paths.dev": dev_path})
+    elapsed = time.perf_counter() - start
+
+    best = os.path.join(out_dir, "model-best")
+    report = {
+        "versao": version,
+        "criado_em": datetime.now().isoformat(timespec="seconds"),
+        "config": os.path.relpath(CONFIG_PATH, NLP_DIR),
+        "corpus": corpus_dir,
+        "tempo_treino_s": round(elapsed, 1),
+        "treino_palavras_s": round(THROUGHPUT["words"] / THROUGHPUT["seconds"], 1) if THROUGHPUT["seconds"] else None,
+        "avaliacao": evaluate(best, dev_path),
+    }
+    stats_path = os.path.join(corpus_dir, "stats.json")
+    if os.path.exists(stats_path):
+        with open(stats_path, encoding="utf-8") as f:
+            report["corpus_stats"] = json.load(f)
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if promote:
+        # Substitui o modelo carregado pelo serviço (src/nlp/spacy_model)
+        shutil.rmtree(SHIPPED_MODEL, ignore_errors=True)
+        shutil.copytree(best, SHIPPED_MODEL)
+        rebuild_pipeline(SHIPPED_MODEL)
+        print(f"Modelo {version} promovido para {SHIPPED_MODEL}")
+    return report
+
+def main():
+    ap = argparse.ArgumentParser(description="Pipeline de treino do NER de notas fiscais")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="anotações -> train.spacy / dev.spacy")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--out", default=os.path.join(NLP_DIR, "corpus"))
+    p.add_argument("--dev-ratio", type=float, default=0.2)
+
+    p = sub.add_parser("train", help="treina uma nova versão do modelo")
+    p.add_argument("--corpus", default=os.path.join(NLP_DIR, "corpus"))
+    p.add_argument("--version")
+    p.add_argument("--gpu", type=int, default=-1)
+    p.add_argument("--promote", action="store_true", help="copia model-best para src/nlp/spacy_model")
+
+    p = sub.add_parser("evaluate", help="avalia um modelo no dev.spacy")
+    p.add_argument("model")
+    p.add_argument("--corpus", default=os.path.join(NLP_DIR, "corpus"))
+
+    p = sub.add_parser("rebuild", help="adiciona as regras ao pipeline distribuído")
+    p.add_argument("--model", default=SHIPPED_MODEL)
+
+    args = ap.parse_args()
+    if args.command == "convert":
+        result = corpus.convert(args.inputs, args.out, args.dev_ratio)
+    elif args.command == "train":
+        result = train(args.corpus, args.version, args.gpu, args.promote)
+    elif args.command == "rebuild":
+        result = rebuild_pipeline(args.model)
+    else:
+        result = evaluate(args.model, os.path.join(args.corpus, "dev.spacy"))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
 
-TRAIN_DATA = [
-    (
-        "Nota Fiscal 12345\nCNPJ: 12.345.678/0001-99\nEmitente: Empresa XYZ\nValor Total: R$ 1.234,56",
-        {"entities": [(12, 17, "NUMERO"), (25, 43, "CNPJ"), (55, 65, "EMITENTE"), (79, 89, "VALOR_TOTAL")]}
-    ),
-    (
-        """PREFEITURA DE SÃO JOSÉ DOS CAMPOS
-        ...
-        Data e Hora de Emissão da NFS-e Competência da NFS-e Número / Série Código de Verificação
-        29/09/2025 16:14:34 09/2025 414 / E R6L1oNBg5
-        ...
-        CPF/CNPJ: Inscrição Municipal:
-        31.339.613/0001-81
-        344608
-        Nome/Razão Social
-        31.339.613 AISLAN PEREIRA MACHADO E-mail:
-        naoinformado@email.com
-        ...
-        CPF/CNPJ: Inscrição Municipal:
-        16.950.334/0001-66 -
-        Nome/Nome E-mail:
-        PENIEL MONTAGEM MANUTENÇÃO INDUSTRIAL LTDA - EPP financeiro@grupopeniel.com
-        ...
-        VALOR TOTAL DA NOTA
-        Base Cálculo ISSQN (R$) Retenções (R$) Descontos (R$) Valor Líquido (R$)
-        26.000,00 0,00 0,00 26.000,00
-        """,
-        {
-            "entities": [
-                # Use o próprio texto para calcular os índices:
-                (245, 252, "NUMERO"),  # Exemplo: posição de "414 / E"
-                (295, 313, "CNPJ_EMITENTE"),  # posição de "31.339.613/0001-81"
-                (340, 373, "NOME_EMITENTE"),  # posição de "31.339.613 AISLAN PEREIRA MACHADO"
-                (453, 471, "CNPJ_DESTINATARIO"),  # posição de "16.950.334/0001-66"
-                (495, 547, "NOME_DESTINATARIO"),  # posição de "PENIEL MONTAGEM MANUTENÇÃO INDUSTRIAL LTDA - EPP"
-                (650, 659, "VALOR_TOTAL"),  # posição de "26.000,00"
-                (200, 210, "DATA_EMISSAO"),  # posição de "29/09/2025"
-            ]
-        }
-    ),
-    # Adicione mais exemplos reais aqui!
-]
-
-nlp = spacy.blank("pt")
-ner = nlp.add_pipe("ner")
-
-# Adicione os labels
-for _, annotations in TRAIN_DATA:
-    for ent in annotations.get("entities"):
-        ner.add_label(ent[2])
-
-# Treinamento
-optimizer = nlp.begin_training()
-for i in range(20):
-    losses = {}
-    for text, annotations in TRAIN_DATA:
-        example = Example.from_dict(nlp.make_doc(text), annotations)
-        nlp.update([example], losses=losses)
-    print(f"Iteração {i}, perdas: {losses}")
-
-# Salve o modelo treinado
-nlp.to_disk("src/nlp/spacy_model")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
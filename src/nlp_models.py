@@ -0,0 +1,72 @@
+# carregamento único dos pipelines spaCy (compartilhados entre workers via fork)
+import os
+import re
+from functools import lru_cache
+import spacy
+from src.nlp import rules  # registra o componente "invoice_rules"
+
+INVOICE_NER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nlp", "spacy_model")
+
+# Linhas que antecedem os nomes das partes em DANFE/NFS-e
+NAME_KEYWORDS_RE = re.compile(
+    r'EMITENTE|REMETENTE|DESTINAT[AÁ]RIO|TOMADOR|PRESTADOR|CLIENTE|RAZ[AÃ]O\s*SOCIAL|NOME',
+    re.IGNORECASE,
+)
+NAME_WINDOW_LINES = 3
+
+@lru_cache(maxsize=None)
+def invoice_ner():
+    """Modelo NER de notas fiscais; o pipeline salvo já tem as regras antes do NER
+    (train_spacy.py rebuild, feito também no --promote)"""
+    return spacy.load(INVOICE_NER_PATH)
+
+def preload():
+    """Carrega todos os modelos no processo atual (antes do fork)"""
+    invoice_ner()
+
+def _name_windows(text: str) -> list:
+    """Trechos (inicio, fim) com as linhas após palavras-chave de nomes"""
+    starts = [0]
+    for match in re.finditer(r'\n', text):
+        starts.append(match.end())
+    windows = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        if NAME_KEYWORDS_RE.search(text, start, end):
+            last = min(i + NAME_WINDOW_LINES, len(starts) - 1)
+            stop = starts[last + 1] if last + 1 < len(starts) else len(text)
+            if windows and start <= windows[-1][1]:
+                windows[-1] = (windows[-1][0], max(stop, windows[-1][1]))
+            else:
+                windows.append((start, stop))
+    return windows
+
+def extract_entities(text: str, needed: set = None) -> list:
+    """Entidades (label, texto) com regras primeiro e NER só no que faltar.
+
+    - As regras resolvem CNPJ, data, valor total e número.
+    - Se faltarem apenas nomes, o NER roda só nas janelas próximas às
+      palavras-chave (EMITENTE, DESTINATÁRIO, ...).
+    - Se as regras já cobrem `needed`, o NER não roda.
+    """
+    nlp = invoice_ner()
+    needed = rules.RULE_LABELS | rules.NAME_LABELS if needed is None else set(needed)
+    # disable por chamada: select_pipes alteraria o pipeline compartilhado entre as threads das faixas
+    doc = nlp(text, disable=["ner"])
+    ents = [(ent.label_, ent.text) for ent in doc.ents]
+    missing = needed - {label for label, _ in ents}
+    if not missing or "ner" not in nlp.pipe_names:
+        return ents
+
+    ner = nlp.get_pipe("ner")
+    windows = _name_windows(text) if missing <= rules.NAME_LABELS else None
+    if windows:
+        for start, end in windows:
+            window_doc = ner(nlp.make_doc(text[start:end]))
+            ents.extend((ent.label_, ent.text) for ent in window_doc.ents
+                        if ent.label_ in missing)
+        return ents
+
+    # Demais casos: NER no documento todo, respeitando os spans das regras
+    doc = ner(doc)
+    return [(ent.label_, ent.text) for ent in doc.ents]
@@ -5,6 +5,7 @@ from PIL import Image
 import pytesseract
 import pandas as pd
 from lxml import etree
+from src import csv_ingest, preprocess
 
 # Configurações do Tesseract - abordagem mais robusta
 TESSERACT_PATHS = [
@@ -80,13 +81,15 @@ def parse_pdf(path: str) -> str:
                     for table in tables:
                         for row in table:
                             text += ' | '.join(str(cell) for cell in row if cell) + "\n"
+                # Libera o cache da página antes de seguir para a próxima
+                page.close()
     except Exception as e:
         print(f"Erro ao processar DANFE: {e}")
         raise
     return text
 
 def parse_image(path: str) -> str:
-    img = Image.open(path)
+    img = preprocess.prepare_image(Image.open(path), photo=True)
     try:
         if check_tesseract_languages():
             return pytesseract.image_to_string(img, lang="por")
@@ -101,7 +104,10 @@ def parse_xml(path: str) -> str:
     return etree.tostring(tree, encoding="unicode")
 
 def parse_csv(path: str) -> str:
-    df = pd.read_csv(path, dtype=str, sep=None, engine='python')
+    # Dialeto pela amostra do início + engine C (o sniffer do engine 'python' lê o arquivo todo)
+    dialect = csv_ingest.sniff(path)
+    df = pd.read_csv(path, dtype=str, sep=dialect["delimitador"], encoding=dialect["encoding"],
+                     encoding_errors="replace", keep_default_na=False, engine='c')
     return df.to_string()
 
 # Teste de configuração ao importar o módulo
@@ -0,0 +1,156 @@
+# pré-processamento de imagens antes do OCR (fotos de celular e PDFs escaneados)
+#
+# Etapas, todas em NumPy/OpenCV e medidas com profiling.stage:
+#   1. reduz a imagem até a altura de texto alvo (Tesseract rende melhor com
+#      letras de ~30 px; fotos de 12 MP costumam ter 60-100 px e custam 4-10x mais);
+#   2. encontra o quadrilátero do papel e corrige a perspectiva (só fotos);
+#   3. corrige a inclinação pelas linhas de texto;
+#   4. remove sombras dividindo pelo fundo estimado;
+#   5. binariza com limiar adaptativo.
+import time
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+from src import config, profiling
+
+THUMB_SIDE = 1000          # lado maior da miniatura usada nas estimativas
+MIN_COMPONENTS = 30        # componentes conexos mínimos para estimar a altura do texto
+MAX_SKEW_DEGREES = 15.0
+MIN_SKEW_DEGREES = 0.3
+MIN_QUAD_AREA = 0.25       # fração da imagem que o papel precisa ocupar
+
+def _thumbnail(gray: np.ndarray) -> tuple:
+    scale = THUMB_SIDE / max(gray.shape)
+    if scale >= 1:
+        return gray, 1.0
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+def text_height(gray: np.ndarray):
+    """Altura mediana dos caracteres (px na imagem original) ou None"""
+    thumb, scale = _thumbnail(gray)
+    binary = cv2.adaptiveThreshold(thumb, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    w, h, area = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_AREA]
+    # Caracteres: nem ruído, nem linhas de tabela, proporção de letra
+    chars = (h >= 3) & (h <= 80) & (w <= 3 * h) & (w * 8 >= h) & (area >= 6)
+    if np.count_nonzero(chars) < MIN_COMPONENTS:
+        return None
+    return float(np.median(h[chars])) / scale
+
+def downscale(gray: np.ndarray) -> np.ndarray:
+    """Reduz até OCR_TEXT_HEIGHT (nunca amplia); sem texto detectável, limita o lado maior"""
+    height = text_height(gray)
+    scale = config.OCR_TEXT_HEIGHT / height if height else 1.0
+    scale = min(scale, 1.0, config.OCR_MAX_SIDE / max(gray.shape))
+    if scale >= 0.95:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    # superior esquerdo, superior direito, inferior direito, inferior esquerdo
+    s = points.sum(axis=1)
+    d = np.diff(points, axis=1).ravel()
+    return np.array([points[np.argmin(s)], points[np.argmin(d)], points[np.argmax(s)], points[np.argmax(d)]],
+                    dtype=np.float32)
+
+def find_document(gray: np.ndarray):
+    """Cantos do papel na foto (float32 4x2) ou None"""
+    thumb, scale = _thumbnail(gray)
+    edges = cv2.Canny(cv2.GaussianBlur(thumb, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    total = thumb.shape[0] * thumb.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        area = cv2.contourArea(contour)
+        if area < MIN_QUAD_AREA * total:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            if area > 0.97 * total:
+                return None  # o papel já ocupa a foto inteira
+            return _order_corners(approx.reshape(4, 2).astype(np.float32) / scale)
+    return None
+
+def correct_perspective(gray: np.ndarray) -> np.ndarray:
+    corners = find_document(gray)
+    if corners is None:
+        return gray
+    tl, tr, br, bl = corners
+    width = int(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))
+    height = int(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(gray, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+def skew_angle(gray: np.ndarray) -> float:
+    """Inclinação (graus) pela mediana das linhas de texto"""
+    thumb, _ = _thumbnail(gray)
+    binary = cv2.adaptiveThreshold(thumb, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+    # Junta as letras de cada linha num borrão horizontal
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    angles = []
+    for contour in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(contour)
+        if w < h:
+            w, h = h, w
+            angle -= 90
+        if w < 40 or w < 4 * h:
+            continue  # não parece uma linha de texto
+        while angle > 45:
+            angle -= 90
+        while angle <= -45:
+            angle += 90
+        angles.append(angle)
+    return float(np.median(angles)) if len(angles) >= 5 else 0.0
+
+def deskew(gray: np.ndarray) -> np.ndarray:
+    angle = skew_angle(gray)
+    if not MIN_SKEW_DEGREES <= abs(angle) <= MAX_SKEW_DEGREES:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def remove_shadows(gray: np.ndarray) -> np.ndarray:
+    """Divide pelo fundo (dilatação + mediana apaga o texto e deixa a iluminação)"""
+    # A iluminação varia devagar: estima o fundo em 1/4 da resolução
+    small = cv2.resize(gray, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
+    background = cv2.medianBlur(cv2.dilate(small, np.ones((3, 3), np.uint8)), 7)
+    background = cv2.resize(background, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_LINEAR)
+    return cv2.divide(gray, background, scale=255)
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+def _to_gray(image) -> np.ndarray:
+    if isinstance(image, np.ndarray):
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    # Fotos de celular vêm "deitadas" com a rotação só no EXIF
+    return np.asarray(ImageOps.exif_transpose(image).convert("L"))
+
+def prepare(image, photo: bool = False) -> tuple:
+    """Imagem binarizada pronta para o OCR e tempos de cada etapa (ms).
+
+    `photo=True` inclui a correção de perspectiva (página escaneada já é plana).
+    """
+    steps = [("downscale", downscale)]
+    if photo:
+        steps.append(("perspective", correct_perspective))
+    steps += [("deskew", deskew), ("shadows", remove_shadows), ("binarize", binarize)]
+
+    timings = {}
+    gray = _to_gray(image)
+    for name, step in steps:
+        start = time.perf_counter()
+        with profiling.stage(f"preprocess_{name}"):
+            gray = step(gray)
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return gray, timings
+
+def prepare_image(image, photo: bool = False):
+    """Como prepare(), devolvendo PIL.Image (ou a original se desligado)"""
+    if not config.OCR_PREPROCESS:
+        return image
+    return Image.fromarray(prepare(image, photo)[0])
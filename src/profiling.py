@@ -0,0 +1,85 @@
+# profiling opcional por requisição (cProfile + tempos por etapa)
+import cProfile
+import hmac
+import json
+import os
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from src import config, events
+
+_current = ContextVar("request_profile", default=None)
+_NULL = nullcontext()
+
+class RequestProfile:
+    """Perfil de uma requisição: cProfile determinístico + tempos das etapas"""
+
+    def __init__(self, doc_hash: str):
+        self.doc_hash = doc_hash
+        self.timings = {}
+        self._profiler = cProfile.Profile()
+        self._start = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._start = time.perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler.disable()
+        self.timings["total"] = _ms(time.perf_counter() - self._start)
+        _current.reset(self._token)
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Etapas repetidas (ex.: uma por página) são somadas
+            self.timings[name] = round(self.timings.get(name, 0.0) + _ms(time.perf_counter() - start), 3)
+
+    def save(self, directory: str = None) -> str:
+        """Grava <hash>_<ts>.pstats e o JSON de tempos; retorna o prefixo"""
+        directory = directory or config.PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"{self.doc_hash[:16]}_{int(time.time() * 1000)}")
+        self._profiler.dump_stats(prefix + ".pstats")
+        with open(prefix + ".json", "w", encoding="utf-8") as f:
+            json.dump({"document_hash": self.doc_hash, "timings": self.timings}, f, indent=2)
+        return prefix
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+def should_profile(headers) -> bool:
+    """Ativa pelo cabeçalho com o segredo (X-Profile: <PROFILE_TOKEN>) ou por amostragem"""
+    # Sem PROFILE_TOKEN o cabeçalho é ignorado: cliente anônimo não liga o cProfile
+    value = headers.get(config.PROFILE_HEADER)
+    if value is not None and config.PROFILE_TOKEN:
+        return hmac.compare_digest(value.strip().encode(), config.PROFILE_TOKEN.encode())
+    return config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+
+def stage(name: str):
+    """Mede uma etapa se houver perfil ativo ou ouvinte de eventos; sem os dois é um no-op"""
+    profile = _current.get()
+    if not events.active():
+        return _NULL if profile is None else profile.stage(name)
+    return _observed_stage(name, profile)
+
+@contextmanager
+def _observed_stage(name: str, profile):
+    # Início/fim da etapa para o /upload/stream (e o tempo no perfil, se houver)
+    events.emit("etapa", {"etapa": name, "estado": "inicio"})
+    start = time.perf_counter()
+    try:
+        with profile.stage(name) if profile is not None else _NULL:
+            yield
+    finally:
+        events.emit("etapa", {"etapa": name, "estado": "fim", "ms": _ms(time.perf_counter() - start)})
+
+def current():
+    return _current.get()
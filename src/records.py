@@ -0,0 +1,77 @@
+# representação interna leve da nota (Pydantic só na resposta da API)
+from dataclasses import dataclass, field
+from typing import List, Optional
+from src.models import Invoice, clean_cnpj, clean_date
+
+ITEM_FIELDS = ('descricao', 'quantidade', 'valor_unitario', 'valor_total', 'codigo', 'ncm', 'cfop', 'unidade')
+INVOICE_FIELDS = ('numero', 'serie', 'chave_acesso', 'data_emissao', 'cnpj_emitente', 'nome_emitente',
+                  'cnpj_destinatario', 'nome_destinatario', 'itens', 'valor_total', 'valor_produtos', 'impostos')
+_EMPTY = (None, "", [], {})
+
+@dataclass(slots=True)
+class ItemRecord:
+    descricao: str
+    quantidade: Optional[float] = None
+    valor_unitario: Optional[float] = None
+    valor_total: Optional[float] = None
+    codigo: Optional[str] = None
+    ncm: Optional[str] = None
+    cfop: Optional[str] = None
+    unidade: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {'descricao': self.descricao, 'quantidade': self.quantidade,
+                'valor_unitario': self.valor_unitario, 'valor_total': self.valor_total,
+                'codigo': self.codigo, 'ncm': self.ncm, 'cfop': self.cfop, 'unidade': self.unidade}
+
+@dataclass(slots=True)
+class InvoiceRecord:
+    numero: Optional[str] = None
+    serie: Optional[str] = None
+    chave_acesso: Optional[str] = None
+    data_emissao: Optional[str] = None
+    cnpj_emitente: Optional[str] = None
+    nome_emitente: Optional[str] = None
+    cnpj_destinatario: Optional[str] = None
+    nome_destinatario: Optional[str] = None
+    itens: List[ItemRecord] = field(default_factory=list)
+    valor_total: Optional[float] = None
+    valor_produtos: Optional[float] = None
+    impostos: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_fields(cls, **campos) -> "InvoiceRecord":
+        """Monta o registro aplicando a mesma limpeza dos validadores de Invoice"""
+        record = cls(**{k: v for k, v in campos.items() if k in INVOICE_FIELDS})
+        record.cnpj_emitente = clean_cnpj(record.cnpj_emitente)
+        record.cnpj_destinatario = clean_cnpj(record.cnpj_destinatario)
+        record.data_emissao = clean_date(record.data_emissao)
+        # items.parse_items é um gerador: a nota guarda a lista, que é gravada e
+        # deduplicada antes da resposta (e percorrida de novo no streaming)
+        record.itens = list(record.itens or [])
+        return record
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "InvoiceRecord":
+        """Inverso de as_dict (ex.: registro lido do cache de artefatos)"""
+        record = cls(**{k: v for k, v in data.items() if k in INVOICE_FIELDS})
+        record.itens = [ItemRecord(**item) for item in record.itens or []]
+        record.impostos = record.impostos or {}
+        return record
+
+    def get(self, name: str, default=None):
+        return getattr(self, name, default)
+
+    def filled_count(self) -> int:
+        """Número de campos preenchidos (mesmo critério do antigo model_dump)"""
+        return sum(1 for name in INVOICE_FIELDS if getattr(self, name) not in _EMPTY)
+
+    def as_dict(self) -> dict:
+        """Dicionário simples, sem validação (itens também como dicts)"""
+        data = {name: getattr(self, name) for name in INVOICE_FIELDS}
+        data['itens'] = [item.as_dict() for item in self.itens]
+        return data
+
+    def to_model(self) -> Invoice:
+        """Converte para o schema da API; feito uma única vez por resposta"""
+        return Invoice.model_validate(self.as_dict())
@@ -0,0 +1,368 @@
+# armazenamento local das notas extraídas e consultas para conciliação
+#
+# SQLite (WAL) em RESULTS_DB:
+#   notas          - uma linha por nota; `identidade` é a chave de deduplicação
+#                    (src/dedup.record_keys) e uma nova extração da mesma nota
+#                    substitui a anterior com o mesmo id. data_emissao em AAAA-MM-DD ('' se
+#                    desconhecida, para o índice servir a ordenação).
+#   itens          - itens por nota (nota_id, seq), sem rowid
+#   totais_mensais - notas e valor por emitente/mês, mantido a cada gravação:
+#                    os agregados não varrem a tabela de notas
+# Índices (cnpj_emitente | cnpj_destinatario | data_emissao, id) atendem aos
+# filtros com paginação por cursor (data, id), sem OFFSET.
+#
+# Gravação em lotes: add() só enfileira; uma thread descarrega a cada
+# RESULTS_FLUSH_MS ou quando a fila chega a RESULTS_BATCH_SIZE, numa única
+# transação. Ferramentas em lote chamam flush() no fim.
+#
+#   python -m src.results stats
+#   python -m src.results totais --cnpj 11222333000181 --de 2024-01 --ate 2024-12
+import argparse
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+import orjson
+from src import config, dedup
+from src.records import InvoiceRecord
+
+NOTA_COLUMNS = ("numero", "serie", "chave_acesso", "data_emissao", "cnpj_emitente", "nome_emitente",
+                "cnpj_destinatario", "nome_destinatario", "valor_total", "valor_produtos")
+ITEM_COLUMNS = ("descricao", "quantidade", "valor_unitario", "valor_total", "codigo", "ncm", "cfop", "unidade")
+FILTERS = {
+    "cnpj_emitente": "cnpj_emitente = ?",
+    "cnpj_destinatario": "cnpj_destinatario = ?",
+    "numero": "numero = ?",
+    "chave_acesso": "chave_acesso = ?",
+    "data_inicio": "data_emissao >= ?",
+    "data_fim": "data_emissao > '' AND data_emissao <= ?",
+}
+
+_CURSOR_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})?:(\d+)$')  # "data:id" devolvido em `proximo`
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notas (
+    id INTEGER PRIMARY KEY,
+    identidade TEXT NOT NULL UNIQUE,
+    document_hash TEXT,
+    numero TEXT, serie TEXT, chave_acesso TEXT, data_emissao TEXT,
+    cnpj_emitente TEXT, nome_emitente TEXT, cnpj_destinatario TEXT, nome_destinatario TEXT,
+    valor_total REAL, valor_produtos REAL, impostos TEXT,
+    metodo TEXT, completude REAL, gravado_em TEXT);
+CREATE INDEX IF NOT EXISTS notas_emitente ON notas (cnpj_emitente, data_emissao, id);
+CREATE INDEX IF NOT EXISTS notas_destinatario ON notas (cnpj_destinatario, data_emissao, id);
+CREATE INDEX IF NOT EXISTS notas_data ON notas (data_emissao, id);
+CREATE INDEX IF NOT EXISTS notas_numero ON notas (numero);
+CREATE TABLE IF NOT EXISTS itens (
+    nota_id INTEGER NOT NULL, seq INTEGER NOT NULL,
+    descricao TEXT, quantidade REAL, valor_unitario REAL, valor_total REAL,
+    codigo TEXT, ncm TEXT, cfop TEXT, unidade TEXT,
+    PRIMARY KEY (nota_id, seq)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS totais_mensais (
+    cnpj_emitente TEXT NOT NULL, mes TEXT NOT NULL,
+    notas INTEGER NOT NULL, valor_total REAL NOT NULL,
+    PRIMARY KEY (cnpj_emitente, mes)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS totais_mes ON totais_mensais (mes);
+"""
+
+def _iso_date(value: str):
+    """DD/MM/AAAA -> AAAA-MM-DD (ordenável e agrupável por mês)"""
+    if value and len(value) >= 10 and value[2] == "/" and value[5] == "/":
+        return f"{value[6:10]}-{value[3:5]}-{value[0:2]}"
+    return ""
+
+def _br_date(value: str):
+    return f"{value[8:10]}/{value[5:7]}/{value[0:4]}" if value else None
+
+def _taxes_json(impostos: dict):
+    # Só os totais por imposto/CST: as colunas por item ficam no XML (e no cache de artefatos)
+    totals = {k: v for k, v in (impostos or {}).items() if k != "por_item"}
+    return orjson.dumps(totals).decode() if totals else None
+
+class ResultStore:
+    """Notas extraídas em SQLite, gravadas em lotes"""
+
+    def __init__(self, db_path: str = None, batch_size: int = None, flush_ms: int = None):
+        self.db_path = db_path or config.RESULTS_DB
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.db = self._connect()
+        self.db.executescript(SCHEMA)
+        self.batch_size = batch_size or config.RESULTS_BATCH_SIZE
+        self.flush_interval = (flush_ms if flush_ms is not None else config.RESULTS_FLUSH_MS) / 1000
+        self.pending = []  # (linha da nota, itens, tentativas)
+        self.written = 0
+        self.dropped = 0
+        self._lock = threading.Lock()        # fila pendente
+        self._write_lock = threading.Lock()  # conexão de escrita
+        self._readers = threading.local()    # consultas não esperam a gravação do lote
+        self._wake = threading.Event()
+        self._closed = False
+        if self.flush_interval > 0:
+            threading.Thread(target=self._flusher, name="results-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self):
+        db = getattr(self._readers, "db", None)
+        if db is None:
+            db = self._readers.db = self._connect()
+            db.execute("PRAGMA query_only=1")
+        return db
+
+    def _flusher(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # A thread não pode morrer: sem ela nada mais é gravado
+                print(f"Falha ao gravar lote de notas: {e}")
+
+    def add(self, invoice: InvoiceRecord, meta: dict = None, document_hash: str = None):
+        """Enfileira a nota para o próximo lote"""
+        meta = meta or {}
+        keys = dedup.record_keys(invoice)
+        identidade = keys[0] if keys else f"hash:{document_hash}:{invoice.numero or ''}"
+        row = (identidade, document_hash, *(invoice.get(c) for c in NOTA_COLUMNS[:3]),
+               _iso_date(invoice.data_emissao), *(invoice.get(c) for c in NOTA_COLUMNS[4:]),
+               _taxes_json(invoice.impostos),
+               meta.get("extraction_method"), meta.get("extraction_completeness"),
+               datetime.now().isoformat(timespec="seconds"))
+        itens = [(item.descricao, item.quantidade, item.valor_unitario, item.valor_total, item.codigo,
+                  item.ncm, item.cfop, item.unidade) for item in invoice.itens]
+        with self._lock:
+            self.pending.append((row, itens, 0))
+            size = len(self.pending)
+        if size < self.batch_size:
+            return
+        if self.flush_interval > 0 and size < self.batch_size * config.RESULTS_MAX_PENDING_BATCHES:
+            self._wake.set()
+            return
+        # Contrapressão: a fila (com as notas devolvidas por _retry) não cresce sem
+        # limite; quem enfileira grava o lote e espera a conexão de escrita
+        try:
+            self.flush()
+        except sqlite3.OperationalError as e:
+            # Notas voltaram à fila (até RESULTS_MAX_RETRIES); a extração segue
+            print(f"Falha ao gravar lote de notas: {e}")
+
+    def flush(self) -> int:
+        """Grava as notas pendentes numa transação; devolve quantas.
+
+        Erro do SQLite em operação (banco travado, disco) devolve o lote à fila,
+        até RESULTS_MAX_RETRIES tentativas por nota. Qualquer outro erro é de
+        alguma linha: as notas são gravadas uma a uma e só as ruins são
+        descartadas (e registradas no log), sem travar as demais.
+        """
+        with self._lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return 0
+        # A mesma nota duas vezes no lote: vale a última
+        batch = list({entry[0][0]: entry for entry in batch}.values())
+        try:
+            self._write(batch)
+        except sqlite3.OperationalError:
+            self._retry(batch)
+            raise
+        except Exception as e:
+            print(f"Lote de {len(batch)} notas rejeitado ({e}); gravando uma a uma")
+            written = 0
+            for entry in batch:
+                try:
+                    self._write([entry])
+                    written += 1
+                except sqlite3.OperationalError:
+                    self._retry([entry])
+                except Exception as e:
+                    self.dropped += 1
+                    print(f"Nota {entry[0][0]} descartada: {e}")
+            return written
+        return len(batch)
+
+    def _retry(self, batch: list):
+        """Devolve as notas à frente da fila; descarta as que já esgotaram as tentativas"""
+        keep = []
+        for row, itens, tries in batch:
+            if tries + 1 >= config.RESULTS_MAX_RETRIES:
+                self.dropped += 1
+                print(f"Nota {row[0]} descartada após {tries + 1} tentativas de gravação")
+            else:
+                keep.append((row, itens, tries + 1))
+        with self._lock:
+            self.pending[:0] = keep
+
+    def _write(self, batch: list):
+        identities = [row[0] for row, _, _ in batch]
+        with self._write_lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                totals = defaultdict(lambda: [0, 0.0])
+                old = []
+                for start in range(0, len(identities), 500):
+                    part = identities[start:start + 500]
+                    old += db.execute(
+                        f"SELECT id, identidade, cnpj_emitente, substr(data_emissao, 1, 7), "
+                        f"COALESCE(valor_total, valor_produtos) FROM notas "
+                        f"WHERE identidade IN ({','.join('?' * len(part))})", part).fetchall()
+                for _, _, cnpj, mes, valor in old:
+                    if cnpj and mes:
+                        totals[(cnpj, mes)][0] -= 1
+                        totals[(cnpj, mes)][1] -= valor or 0.0
+                # Nota já gravada mantém o id (links para /notas/{id} continuam valendo);
+                # as novas recebem ids aqui (a transação é exclusiva) para um único executemany
+                ids = {identidade: nota_id for nota_id, identidade, *_ in old}
+                if ids:
+                    db.executemany("DELETE FROM itens WHERE nota_id = ?", [(nota_id,) for nota_id in ids.values()])
+                next_id = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM notas").fetchone()[0]
+                for identidade in identities:
+                    if identidade not in ids:
+                        ids[identidade] = next_id
+                        next_id += 1
+
+                columns = ("identidade", "document_hash") + NOTA_COLUMNS + \
+                          ("impostos", "metodo", "completude", "gravado_em")
+                db.executemany(
+                    f"INSERT INTO notas (id, {', '.join(columns)}) VALUES ({','.join('?' * (len(columns) + 1))}) "
+                    f"ON CONFLICT(identidade) DO UPDATE SET " +
+                    ", ".join(f"{c} = excluded.{c}" for c in columns[1:]),
+                    [(ids[row[0]], *row) for row, _, _ in batch])
+                item_rows = []
+                for row, itens, _ in batch:
+                    nota_id = ids[row[0]]
+                    item_rows += [(nota_id, seq, *item) for seq, item in enumerate(itens)]
+                    # Sem total da nota (ex.: CSV só com itens), vale o dos produtos
+                    cnpj, data, valor = row[6], row[5], row[10] if row[10] is not None else row[11]
+                    if cnpj and data:
+                        totals[(cnpj, data[:7])][0] += 1
+                        totals[(cnpj, data[:7])][1] += valor or 0.0
+                db.executemany(f"INSERT INTO itens VALUES ({','.join('?' * (len(ITEM_COLUMNS) + 2))})", item_rows)
+                db.executemany(
+                    "INSERT INTO totais_mensais VALUES (?, ?, ?, ?) ON CONFLICT(cnpj_emitente, mes) DO UPDATE "
+                    "SET notas = notas + excluded.notas, valor_total = valor_total + excluded.valor_total",
+                    [(cnpj, mes, count, round(valor, 2)) for (cnpj, mes), (count, valor) in totals.items()])
+                db.executemany("DELETE FROM totais_mensais WHERE cnpj_emitente = ? AND mes = ? AND notas <= 0",
+                               list(totals))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        self.written += len(batch)
+
+    def query(self, filters: dict, limit: int = 50, cursor: str = None, with_items: bool = False) -> dict:
+        """Notas filtradas, mais recentes primeiro; `proximo` é o cursor da página seguinte"""
+        limit = max(1, min(limit, config.RESULTS_MAX_PAGE))
+        where, params = [], []
+        for name, clause in FILTERS.items():
+            value = filters.get(name)
+            if value:
+                where.append(clause)
+                params.append(value)
+        if cursor:
+            match = _CURSOR_RE.match(cursor)
+            if not match:
+                raise ValueError(f"Cursor inválido: {cursor!r}")
+            where.append("(data_emissao, id) < (?, ?)")
+            params += [match.group(1) or "", int(match.group(2))]
+        sql = ("SELECT id, identidade, document_hash, " + ", ".join(NOTA_COLUMNS) +
+               ", impostos, metodo, completude, gravado_em FROM notas" +
+               (" WHERE " + " AND ".join(where) if where else "") +
+               " ORDER BY data_emissao DESC, id DESC LIMIT ?")
+        db = self._reader()
+        rows = db.execute(sql, params + [limit]).fetchall()
+        notas = [self._nota(db, row, with_items) for row in rows]
+        proximo = None
+        if len(rows) == limit:
+            last = rows[-1]
+            proximo = f"{last[6]}:{last[0]}"
+        return {"notas": notas, "proximo": proximo}
+
+    def _nota(self, db, row, with_items: bool) -> dict:
+        nota = dict(zip(("id", "identidade", "document_hash") + NOTA_COLUMNS +
+                        ("impostos", "extraction_method", "extraction_completeness", "gravado_em"), row))
+        nota["data_emissao"] = _br_date(nota["data_emissao"])
+        nota["impostos"] = orjson.loads(nota["impostos"]) if nota["impostos"] else {}
+        if with_items:
+            nota["itens"] = [dict(zip(ITEM_COLUMNS, item)) for item in db.execute(
+                f"SELECT {', '.join(ITEM_COLUMNS)} FROM itens WHERE nota_id = ? ORDER BY seq", (nota["id"],))]
+        return nota
+
+    def get(self, nota_id: int):
+        """Nota com itens (ou None)"""
+        db = self._reader()
+        row = db.execute("SELECT id, identidade, document_hash, " + ", ".join(NOTA_COLUMNS) +
+                         ", impostos, metodo, completude, gravado_em FROM notas WHERE id = ?",
+                         (nota_id,)).fetchone()
+        return self._nota(db, row, True) if row else None
+
+    def monthly_totals(self, cnpj_emitente: str = None, mes_inicio: str = None, mes_fim: str = None) -> list:
+        """Notas e valor total por emitente/mês (AAAA-MM), da tabela de totais"""
+        where, params = [], []
+        for clause, value in (("cnpj_emitente = ?", cnpj_emitente), ("mes >= ?", mes_inicio),
+                              ("mes <= ?", mes_fim)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        rows = self._reader().execute(
+            "SELECT cnpj_emitente, mes, notas, valor_total FROM totais_mensais" +
+            (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY cnpj_emitente, mes", params)
+        return [{"cnpj_emitente": cnpj, "mes": mes, "notas": notas, "valor_total": round(valor, 2)}
+                for cnpj, mes, notas, valor in rows]
+
+    def stats(self) -> dict:
+        db = self._reader()
+        notas, itens = (db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("notas", "itens"))
+        return {"notas": notas, "itens": itens, "pendentes": len(self.pending), "gravadas": self.written,
+                "descartadas": self.dropped}
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        self.db.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Store configurado (None se RESULTS_ENABLED estiver desligado)"""
+    global _store
+    if _store is None and config.RESULTS_ENABLED:
+        with _store_lock:
+            if _store is None:
+                _store = ResultStore()
+    return _store
+
+def save(invoice: InvoiceRecord, meta: dict = None, document_hash: str = None):
+    """Enfileira a nota no store (no-op se desligado ou se a extração foi cortada pelo prazo)"""
+    store = get_store()
+    if store is not None and invoice is not None and not (meta or {}).get("parcial"):
+        store.add(invoice, meta, document_hash)
+
+def main():
+    ap = argparse.ArgumentParser(description="Notas extraídas gravadas localmente")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="quantidade de notas e itens")
+    p = sub.add_parser("totais", help="notas e valor por emitente/mês")
+    p.add_argument("--cnpj")
+    p.add_argument("--de", help="AAAA-MM")
+    p.add_argument("--ate", help="AAAA-MM")
+    args = ap.parse_args()
+
+    store = ResultStore(flush_ms=0)
+    result = store.stats() if args.command == "stats" else store.monthly_totals(args.cnpj, args.de, args.ate)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# serialização rápida das respostas (orjson, streaming e itens colunares)
+from itertools import islice
+from typing import List
+import orjson
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
+from src import config
+from src.models import Invoice, InvoiceItem
+from src.records import InvoiceRecord, ITEM_FIELDS
+
+ITENS_FORMATS = ("rows", "columnar")
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+_ITEMS = TypeAdapter(List[InvoiceItem])
+
+def json_response(content, status_code: int = 200, headers: dict = None) -> Response:
+    """JSON codificado com orjson, sem passar pelo jsonable_encoder"""
+    return Response(orjson.dumps(content, option=_OPTIONS), status_code=status_code,
+                    headers=headers, media_type="application/json")
+
+def sse_event(event: str, data) -> bytes:
+    """Evento Server-Sent Events; `data` já em bytes (JSON pronto) ou objeto para o orjson"""
+    payload = data if isinstance(data, bytes) else orjson.dumps(data, option=_OPTIONS)
+    return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+
+def _validated_chunks(itens, chunk_size: int):
+    """Valida os itens em blocos pelo schema da API"""
+    itens = iter(itens)
+    while True:
+        chunk = list(islice(itens, chunk_size))
+        if not chunk:
+            return
+        yield _ITEMS.validate_python([item.as_dict() for item in chunk])
+
+def _taxes(content: dict, per_item: bool):
+    # Colunas de impostos por item (4 impostos x 4 colunas x itens) só quando pedidas
+    if not per_item and 'por_item' in content.get('impostos', {}):
+        content['impostos'] = {k: v for k, v in content['impostos'].items() if k != 'por_item'}
+
+def _header(invoice: InvoiceRecord, meta: dict, impostos_itens: bool = False) -> dict:
+    """Cabeçalho validado (sem itens) + metadados"""
+    data = invoice.as_dict()
+    data['itens'] = []
+    header = Invoice.model_validate(data).model_dump()
+    del header['itens']
+    _taxes(header, impostos_itens)
+    header.update(meta)
+    return header
+
+def columnar_items(itens: list, chunk_size: int = None) -> dict:
+    """Itens como arrays paralelos: {"descricao": [...], "quantidade": [...], ...}"""
+    columns = {name: [] for name in ITEM_FIELDS}
+    for models in _validated_chunks(itens, chunk_size or config.STREAM_CHUNK_SIZE):
+        for model in models:
+            for name in ITEM_FIELDS:
+                columns[name].append(getattr(model, name))
+    return columns
+
+def _stream_rows(header: dict, first: list, chunks):
+    # {"numero": ..., ..., "itens": [ {...}, {...} ]}
+    # Status e cabeçalhos já foram enviados: um item inválido no meio fecha o
+    # documento com "itens_erro" em vez de cortar o JSON
+    head = orjson.dumps(header, option=_OPTIONS)
+    yield head[:-1] + (b',"itens":[' if len(head) > 2 else b'"itens":[')
+    written = 0
+    models = first
+    try:
+        while models is not None:
+            body = _ITEMS.dump_json(models)[1:-1]
+            if body:
+                yield body if not written else b"," + body
+                written += len(models)
+            models = next(chunks, None)
+    except Exception as e:
+        yield b"]," + orjson.dumps({"itens_erro": str(e), "itens_enviados": written})[1:]
+        return
+    yield b"]}"
+
+def invoice_content(invoice: InvoiceRecord, meta: dict, itens_format: str = "rows",
+                    impostos_itens: bool = False) -> dict:
+    """Nota validada + metadados, itens em linhas ou colunas"""
+    if itens_format == "columnar":
+        content = _header(invoice, meta, impostos_itens)
+        content['itens'] = columnar_items(invoice.itens)
+        content['itens_format'] = "columnar"
+        return content
+    content = invoice.to_model().model_dump()
+    _taxes(content, impostos_itens)
+    content.update(meta)
+    return content
+
+def render_invoice(invoice: InvoiceRecord, meta: dict, itens_format: str = "rows", impostos_itens: bool = False):
+    """Resposta JSON da nota: orjson direto, streaming para listas grandes"""
+    if itens_format != "columnar" and len(invoice.itens) > config.STREAM_ITEMS_THRESHOLD:
+        # Cabeçalho e primeiro bloco validados antes do 200: erro aqui ainda vira status de erro
+        header = _header(invoice, meta, impostos_itens)
+        chunks = _validated_chunks(invoice.itens, config.STREAM_CHUNK_SIZE)
+        first = next(chunks, None)
+        return StreamingResponse(
+            _stream_rows(header, first, chunks),
+            media_type="application/json",
+        )
+    return json_response(invoice_content(invoice, meta, itens_format, impostos_itens))
+
+def render_invoices(results: list, meta: dict, itens_format: str = "rows"):
+    """Resposta de um PDF com várias notas: {"notas": [...], ...metadados}"""
+    content = {"notas": [invoice_content(invoice, note_meta, itens_format) for invoice, note_meta in results]}
+    content.update(meta)
+    return json_response(content)
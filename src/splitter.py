@@ -0,0 +1,122 @@
+# separação de PDFs com várias notas (DANFEs impressos em sequência)
+#
+# Cada página é lida com o pdfium (~1 ms/página) e uma nova nota começa quando:
+#   - aparece "FOLHA 1/N" (ou "FL. 1 DE N");
+#   - aparece uma chave de acesso diferente da nota atual;
+#   - a nota atual já tem as N folhas declaradas e a página tem cabeçalho DANFE.
+# Os grupos de páginas viram PDFs temporários, extraídos em paralelo por um
+# pool de processos (o tempo total fica próximo ao da nota mais demorada).
+# PDFs escaneados (sem camada de texto) não têm como ser separados sem OCR
+# e seguem como um único documento.
+import atexit
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import pypdfium2 as pdfium
+from src import config
+from src.fileutils import PDFIUM_LOCK
+from src.validators import find_chave_acesso
+
+FOLHA_RE = re.compile(r'(?:FOLHA|FL\.?)\s*:?\s*(\d{1,3})\s*(?:/|DE)\s*(\d{1,3})', re.IGNORECASE)
+HEADER_RE = re.compile(r'DANFE|DOCUMENTO\s+AUXILIAR', re.IGNORECASE)
+
+_pool = None
+
+def page_texts(path: str) -> list:
+    """Texto nativo de cada página (vazio nas páginas escaneadas)"""
+    with PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            texts = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                texts.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return texts
+        finally:
+            pdf.close()
+
+def split_pages(texts: list) -> list:
+    """Agrupa as páginas (índices a partir de 0) por nota fiscal"""
+    groups = []
+    current_chave = None
+    declared = 0
+    for number, text in enumerate(texts):
+        chave = find_chave_acesso(text)
+        folha = FOLHA_RE.search(text)
+        if not groups or (chave and current_chave and chave != current_chave):
+            starts = True
+        elif folha:
+            starts = int(folha.group(1)) == 1
+        else:
+            starts = bool(declared) and len(groups[-1]) >= declared and bool(HEADER_RE.search(text))
+
+        if starts:
+            groups.append([number])
+            current_chave = chave
+            declared = int(folha.group(2)) if folha else 0
+        else:
+            groups[-1].append(number)
+            current_chave = current_chave or chave
+            if folha and not declared:
+                declared = int(folha.group(2))
+    return groups
+
+def split(path: str) -> list:
+    """Grupos de páginas do PDF (um único grupo se não houver separação)"""
+    texts = page_texts(path)
+    if not any(text.strip() for text in texts):
+        return [list(range(len(texts)))]
+    return split_pages(texts)
+
+def write_parts(path: str, groups: list, out_dir: str) -> list:
+    """Grava cada grupo de páginas como um PDF próprio"""
+    parts = []
+    with PDFIUM_LOCK:
+        source = pdfium.PdfDocument(path)
+        try:
+            for n, pages in enumerate(groups, start=1):
+                part = pdfium.PdfDocument.new()
+                part.import_pages(source, pages)
+                part_path = os.path.join(out_dir, f"nota_{n:04d}.pdf")
+                part.save(part_path)
+                part.close()
+                parts.append(part_path)
+        finally:
+            source.close()
+    return parts
+
+def _executor() -> ProcessPoolExecutor:
+    # Sem fork: o pool nasce sob demanda numa thread de faixa, com conexões SQLite
+    # (dedup, results) e locks abertos, que o processo filho herdaria pela metade.
+    # O forkserver é um processo limpo que já importou só os módulos de extração;
+    # os filhos saem dele
+    global _pool
+    if _pool is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["src.danfe_ocr_parser", "src.items"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(max_workers=config.SPLIT_WORKERS, mp_context=context)
+    return _pool
+
+def shutdown():
+    """Encerra o pool (e o forkserver); sem isso o resource_tracker avisa de semáforos vazados"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+atexit.register(shutdown)
+
+def extract_groups(path: str, groups: list, extract_fn) -> list:
+    """Extrai cada grupo com `extract_fn(caminho)`, em paralelo; mantém a ordem"""
+    with tempfile.TemporaryDirectory(prefix="split_") as tmp:
+        parts = write_parts(path, groups, tmp)
+        if len(parts) == 1 or config.SPLIT_WORKERS <= 1:
+            return [extract_fn(part) for part in parts]
+        return list(_executor().map(extract_fn, parts))
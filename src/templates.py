@@ -0,0 +1,343 @@
+# templates de layout por emitente (DANFEs que se repetem todo mês)
+#
+# Impressão digital do layout = CNPJ do emitente + posição (em grade) dos
+# rótulos de cabeçalho do DANFE na 1ª página. Quando uma extração genérica
+# passa na validação, as caixas (coordenadas normalizadas) de cada campo
+# são aprendidas e gravadas em TEMPLATES_DIR/<impressao>.json. Nas próximas
+# notas do mesmo layout os campos são lidos direto dessas coordenadas; se a
+# validação falhar, a cascata completa roda normalmente.
+#
+#   python -m src.templates list
+#   python -m src.templates show <arquivo.pdf>
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import pdfplumber
+from unidecode import unidecode
+from src import artifacts, config, items
+from src.records import InvoiceRecord
+from src.validators import CNPJ_PATTERN, clean_document, find_chave_acesso, is_valid_chave_acesso, is_valid_cnpj, strip_zeros
+
+# Rótulos fixos do DANFE usados na impressão digital
+ANCHORS = ("DANFE", "CHAVE DE ACESSO", "NATUREZA DA OPERACAO", "PROTOCOLO DE AUTORIZACAO",
+           "DESTINATARIO", "DATA DA EMISSAO", "CALCULO DO IMPOSTO", "VALOR TOTAL DA NOTA",
+           "DADOS DOS PRODUTOS")
+ANCHOR_GRID = 20       # posições arredondadas para 1/20 da página
+LINE_TOLERANCE = 3     # pontos: palavras na mesma linha
+BOX_MARGIN = 0.01      # folga das caixas (fração da página)
+TEXT_SLACK = 0.15      # nomes podem ser mais longos que o aprendido
+
+# Tipo de cada campo aprendido; o tipo define a leitura e a validação
+FIELD_KINDS = {
+    "cnpj_emitente": "cnpj",
+    "cnpj_destinatario": "cnpj",
+    "chave_acesso": "chave",
+    "numero": "digits",
+    "serie": "digits",
+    "data_emissao": "date",
+    "valor_total": "money",
+    "nome_emitente": "text",
+    "nome_destinatario": "text",
+}
+REQUIRED_FIELDS = ("cnpj_emitente", "numero", "valor_total")
+MAX_RUN_WORDS = 12
+
+_DATE_RE = re.compile(r'\d{2}/\d{2}/\d{4}')
+_MONEY_RE = re.compile(r'(?:R\$\s*)?(\d{1,3}(?:\.\d{3})*,\d{2}|\d+,\d{2})')
+_DIGITS_RE = re.compile(r'\d[\d.]*')
+
+class PageLayout:
+    """Palavras da 1ª página com coordenadas normalizadas (0..1), em linhas"""
+
+    def __init__(self, path: str, lines: list, text: str):
+        self.path = path
+        self.lines = lines
+        self.text = text
+        self.key = None
+        self._full_text = None
+
+    @property
+    def full_text(self) -> str:
+        """Texto de todas as páginas (só quando o template precisar dos itens)"""
+        if self._full_text is None:
+            self._full_text = artifacts.cached("page_text", lambda: _read_full_text(self.path))
+        return self._full_text
+
+def _read_full_text(path: str) -> str:
+    parts = []
+    with pdfplumber.open(path) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            try:
+                parts.append(page.extract_text() or "")
+            except Exception as e:
+                # Página ilegível não derruba as demais; o texto não vai para o cache
+                artifacts.incomplete(f"página {number}: {e}")
+                parts.append("")
+            finally:
+                page.close()
+    return "\n".join(parts)
+
+def read_layout(path: str):
+    """Layout da 1ª página de um PDF com camada de texto (None se não houver)"""
+    # Palavras já normalizadas ficam no cache de artefatos do documento
+    words = artifacts.cached("word_boxes", lambda: _read_words(path))
+    if words is None:
+        return None
+    return PageLayout(path, words["lines"], words["text"])
+
+def _read_words(path: str):
+    with pdfplumber.open(path) as pdf:
+        if not pdf.pages:
+            return None
+        page = pdf.pages[0]
+        try:
+            width, height = float(page.width), float(page.height)
+            words = page.extract_words()
+            text = page.extract_text() or ""
+        finally:
+            page.close()
+    if not words:
+        return None
+
+    lines = []
+    for w in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        word = {"text": w["text"], "x0": w["x0"] / width, "x1": w["x1"] / width,
+                "top": w["top"] / height, "bottom": w["bottom"] / height}
+        if lines and abs(w["top"] / height - lines[-1][0]["top"]) * height <= LINE_TOLERANCE:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    for line in lines:
+        line.sort(key=lambda w: w["x0"])
+    return {"lines": lines, "text": text}
+
+def _runs(lines: list):
+    """(linha, início, fim) de sequências de até MAX_RUN_WORDS palavras de cada linha"""
+    for n, line in enumerate(lines):
+        for i in range(len(line)):
+            for j in range(i + 1, min(i + MAX_RUN_WORDS, len(line)) + 1):
+                yield n, i, j
+
+def _box(words: list) -> list:
+    return [min(w["x0"] for w in words), min(w["top"] for w in words),
+            max(w["x1"] for w in words), max(w["bottom"] for w in words)]
+
+def parse_value(kind: str, text: str):
+    """Lê o valor de um trecho conforme o tipo do campo (None se não casar)"""
+    if kind == "cnpj":
+        match = re.search(CNPJ_PATTERN, text) or re.search(r'\d{14}', text)
+        return clean_document(match.group(0)) if match and is_valid_cnpj(match.group(0)) else None
+    if kind == "chave":
+        return find_chave_acesso(text)
+    if kind == "date":
+        match = _DATE_RE.search(text)
+        return match.group(0) if match else None
+    if kind == "money":
+        match = _MONEY_RE.search(text)
+        return float(match.group(1).replace(".", "").replace(",", ".")) if match else None
+    if kind == "digits":
+        match = _DIGITS_RE.search(text)
+        return strip_zeros(match.group(0).replace(".", "")) if match else None
+    text = " ".join(text.split())
+    return text or None
+
+def _same_value(kind: str, extracted, expected) -> bool:
+    if extracted is None:
+        return False
+    if kind == "money":
+        return abs(extracted - float(expected)) < 0.005
+    if kind == "digits":
+        return extracted == strip_zeros(str(expected))
+    if kind == "cnpj":
+        return extracted == clean_document(expected)
+    if kind == "text":
+        return extracted.casefold() == " ".join(str(expected).split()).casefold()
+    return extracted == expected
+
+def _run_text(run: list) -> str:
+    return " ".join(w["text"] for w in run)
+
+def issuer_cnpj(layout: PageLayout):
+    """Primeiro CNPJ válido em ordem de leitura (o emitente no DANFE)"""
+    for line in layout.lines:
+        for match in re.finditer(CNPJ_PATTERN + r'|\d{14}', _run_text(line)):
+            if is_valid_cnpj(match.group(0)):
+                return clean_document(match.group(0))
+    return None
+
+def fingerprint(layout: PageLayout):
+    """CNPJ do emitente + hash das posições dos rótulos (None sem CNPJ válido)"""
+    if layout.key is not None:
+        return layout.key or None
+    cnpj = issuer_cnpj(layout)
+    layout.key = ""
+    if not cnpj:
+        return None
+    signature = []
+    for anchor in ANCHORS:
+        position = "-"
+        for line in layout.lines:
+            normalized = [unidecode(w["text"]).upper() for w in line]
+            joined = " ".join(normalized)
+            index = joined.find(anchor)
+            if index >= 0:
+                word = line[joined[:index].count(" ")]
+                position = f"{int(word['x0'] * ANCHOR_GRID)},{int(word['top'] * ANCHOR_GRID)}"
+                break
+        signature.append(f"{anchor}={position}")
+    digest = hashlib.blake2b("|".join(signature).encode(), digest_size=8).hexdigest()
+    layout.key = f"{cnpj}-{digest}"
+    return layout.key
+
+def is_validated(invoice) -> bool:
+    """Extração confiável o bastante para ensinar um template"""
+    cnpj = invoice.get("cnpj_emitente")
+    if not cnpj or not is_valid_cnpj(cnpj) or not invoice.get("numero") or not invoice.get("valor_total"):
+        return False
+    chave = invoice.get("chave_acesso")
+    if chave:
+        # A chave contém o CNPJ do emitente (posições 7-20) e o número (26-34)
+        if not is_valid_chave_acesso(chave) or chave[6:20] != clean_document(cnpj):
+            return False
+        if strip_zeros(chave[25:34]) != strip_zeros(str(invoice.get("numero"))):
+            return False
+    return True
+
+class TemplateStore:
+    """Templates em arquivos JSON com cache em memória"""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or config.TEMPLATES_DIR
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+        # Threads das faixas aprendem o mesmo emitente ao mesmo tempo; leitores não travam
+        self._learn_lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        template = self._cache.get(key)
+        if template is None and os.path.exists(self._path(key)):
+            with open(self._path(key), encoding="utf-8") as f:
+                template = self._cache[key] = json.load(f)
+        return template
+
+    def save(self, key: str, template: dict):
+        # Escrita atômica: outros workers podem estar lendo o mesmo arquivo
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(template, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+        self._cache[key] = template
+
+    def keys(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def learn(self, layout: PageLayout, invoice):
+        """Aprende/atualiza as caixas dos campos a partir de uma extração validada"""
+        if not is_validated(invoice):
+            return None
+        key = fingerprint(layout)
+        if not key or not key.startswith(clean_document(invoice.get("cnpj_emitente"))):
+            return None
+
+        boxes = {}
+        for field, kind in FIELD_KINDS.items():
+            expected = invoice.get(field)
+            if not expected:
+                continue
+            matches = [(n, i, j) for n, i, j in _runs(layout.lines)
+                       if _same_value(kind, parse_value(kind, _run_text(layout.lines[n][i:j])), expected)]
+            # Menor trecho que contém o valor; valores ambíguos (ex.: série "1") ficam de fora
+            matches = [(n, i, j) for n, i, j in matches
+                       if not any(n2 == n and i <= i2 and j2 <= j and (i2, j2) != (i, j)
+                                  for n2, i2, j2 in matches)]
+            if 1 <= len(matches) <= 2:
+                n, i, j = matches[0]
+                boxes[field] = _box(layout.lines[n][i:j])
+        if not all(field in boxes for field in REQUIRED_FIELDS):
+            return None
+
+        with self._learn_lock:
+            # Atualiza uma cópia e troca no cache: extract() nunca vê o template pela metade
+            current = self.get(key)
+            template = ({**current, "campos": dict(current["campos"])} if current else
+                        {"impressao": key, "cnpj_emitente": key.split("-")[0], "campos": {}, "amostras": 0})
+            for field, box in boxes.items():
+                old = template["campos"].get(field)
+                # União com as caixas anteriores: cobre variações de largura entre notas
+                template["campos"][field] = box if old is None else [
+                    min(old[0], box[0]), min(old[1], box[1]), max(old[2], box[2]), max(old[3], box[3])]
+            template["amostras"] += 1
+            self.save(key, template)
+        return key
+
+    def _read_field(self, layout: PageLayout, kind: str, box: list):
+        x0, top, x1, bottom = box
+        right = x1 + (TEXT_SLACK if kind == "text" else BOX_MARGIN)
+        words = [w for line in layout.lines for w in line
+                 if top - BOX_MARGIN <= (w["top"] + w["bottom"]) / 2 <= bottom + BOX_MARGIN
+                 and w["x1"] >= x0 - BOX_MARGIN and w["x0"] <= right]
+        return parse_value(kind, _run_text(words)) if words else None
+
+    def extract(self, layout: PageLayout):
+        """Extração por coordenadas; None se não houver template ou a validação falhar"""
+        key = fingerprint(layout)
+        template = self.get(key) if key else None
+        if template is None:
+            return None
+
+        campos = {field: self._read_field(layout, FIELD_KINDS[field], box)
+                  for field, box in template["campos"].items()}
+        # Campos não aprendidos: heurísticas baratas sobre o texto da página
+        if not campos.get("chave_acesso"):
+            campos["chave_acesso"] = find_chave_acesso(layout.text)
+        if not campos.get("serie"):
+            match = re.search(r'S[ÉE]RIE\s*[:.]?\s*(\d{1,3})\b', layout.text, re.IGNORECASE)
+            campos["serie"] = strip_zeros(match.group(1)) if match else None
+
+        if campos.get("cnpj_emitente") != template["cnpj_emitente"] or not is_validated(campos):
+            self.misses += 1
+            print(f"Template {key} não validou; usando a cascata completa")
+            return None
+        self.hits += 1
+
+        campos["itens"] = items.parse_items(layout.full_text.splitlines())
+        campos["valor_produtos"] = items.find_products_total(layout.full_text)
+        return InvoiceRecord.from_fields(**campos)
+
+# Instância global
+store = TemplateStore()
+
+def extract(layout: PageLayout):
+    return store.extract(layout)
+
+def learn(layout: PageLayout, invoice):
+    return store.learn(layout, invoice)
+
+def main():
+    ap = argparse.ArgumentParser(description="Templates de layout por emitente")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="templates aprendidos")
+    p = sub.add_parser("show", help="impressão digital e template de um PDF")
+    p.add_argument("pdf")
+    args = ap.parse_args()
+
+    if args.command == "list":
+        result = [{k: v for k, v in store.get(key).items() if k != "campos"} for key in store.keys()]
+    else:
+        layout = read_layout(args.pdf)
+        key = fingerprint(layout) if layout else None
+        result = {"impressao": key, "template": store.get(key) if key else None}
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,144 @@
 # validação CNPJ, soma de itens, etc.
+import re
+import numpy as np
+
+# CNPJ numérico ou alfanumérico (a partir de 2026): 12 posições [0-9A-Z] + 2 DVs
+CNPJ_PATTERN = r'[0-9A-Z]{2}\.[0-9A-Z]{3}\.[0-9A-Z]{3}/[0-9A-Z]{4}-\d{2}'
+_CNPJ_CLEAN_RE = re.compile(r'^[0-9A-Z]{12}\d{2}$')
+_SEPARATORS_RE = re.compile(r'[.\-/\s]')
+
+_CNPJ_W1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+_CNPJ_W2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+_CPF_W1 = list(range(10, 1, -1))
+_CPF_W2 = list(range(11, 1, -1))
+
+def _check_digit(values, weights) -> int:
+    r = sum(v * w for v, w in zip(values, weights)) % 11
+    return 0 if r < 2 else 11 - r
+
+def clean_document(value: str) -> str:
+    """Remove pontuação de CNPJ/CPF e padroniza letras em maiúsculas"""
+    return _SEPARATORS_RE.sub('', value or '').upper()
+
+def strip_zeros(value: str) -> str:
+    """Série/número sem zeros à esquerda: "001" e "1" são o mesmo em DANFE e XML"""
+    value = str(value).strip()
+    return str(int(value)) if value.isdigit() else value
 
 def is_valid_cnpj(cnpj: str) -> bool:
-    # Implementação simplificada
-    return len(cnpj) == 14
\ No newline at end of file
+    """CNPJ (numérico ou alfanumérico) com dígitos verificadores módulo 11"""
+    clean = clean_document(cnpj)
+    if not _CNPJ_CLEAN_RE.match(clean) or len(set(clean)) == 1:
+        return False
+    # Valor de cada posição: código ASCII - 48 ('0'..'9' -> 0..9, 'A' -> 17, ...)
+    values = [ord(c) - 48 for c in clean]
+    dv1 = _check_digit(values[:12], _CNPJ_W1)
+    dv2 = _check_digit(values[:12] + [dv1], _CNPJ_W2)
+    return values[12] == dv1 and values[13] == dv2
+
+def is_valid_cpf(cpf: str) -> bool:
+    """CPF com dígitos verificadores módulo 11"""
+    clean = clean_document(cpf)
+    if len(clean) != 11 or not clean.isdigit() or len(set(clean)) == 1:
+        return False
+    values = [int(c) for c in clean]
+    dv1 = _check_digit(values[:9], _CPF_W1)
+    dv2 = _check_digit(values[:9] + [dv1], _CPF_W2)
+    return values[9] == dv1 and values[10] == dv2
+
+# Chave de acesso NF-e/NFC-e: 44 dígitos, impressa no DANFE em grupos de 4
+_CHAVE_RE = re.compile(r'(?<!\d)((?:\d{4}[ .]?){10}\d{4})(?!\d)')
+
+def is_valid_chave_acesso(chave: str) -> bool:
+    """Chave de 44 dígitos com DV módulo 11 (pesos 2..9 da direita para a esquerda)"""
+    digits = re.sub(r'\D', '', chave or '')
+    if len(digits) != 44:
+        return False
+    total = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(digits[:43])))
+    dv = 11 - total % 11
+    return int(digits[43]) == (0 if dv >= 10 else dv)
+
+def find_chave_acesso(text: str):
+    """Primeira chave de acesso válida no texto (só dígitos) ou None"""
+    for match in _CHAVE_RE.finditer(text or ''):
+        digits = re.sub(r'\D', '', match.group(1))
+        if is_valid_chave_acesso(digits):
+            return digits
+    return None
+
+def valid_cnpjs(candidates: list) -> list:
+    """Filtra candidatos mantendo a ordem (descarta lixo de OCR)"""
+    return [c for c in candidates if is_valid_cnpj(c)]
+
+def _as_columns(values, width: int) -> tuple:
+    """Converte IDs em colunas (uma por posição) de valores ASCII - 48.
+
+    Aceita inteiros (CNPJ/CPF numérico) ou strings/bytes já sem pontuação.
+    Trabalhar coluna a coluna (vetores contíguos de tamanho n) é bem mais
+    rápido no NumPy do que reduzir linhas de 14 posições.
+    Retorna (colunas int16, máscara de tamanho/faixa).
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iu":
+        arr = arr.astype(np.int64)
+        ok = (arr >= 0) & (arr < 10 ** width)
+        columns = []
+        rest = arr.copy()
+        for _ in range(width):
+            rest, digit = np.divmod(rest, 10)
+            columns.append(digit.astype(np.int16))
+        return columns[::-1], ok
+    if arr.dtype.kind == "U":
+        arr = np.char.upper(arr)
+    elif arr.dtype.kind != "S":
+        arr = np.asarray([str(v).upper() for v in values])
+    ok = np.char.str_len(arr) == width
+    try:
+        arr = np.ascontiguousarray(arr.astype(f"S{width}"))
+    except UnicodeEncodeError:
+        # Fora do ASCII vira "?" (um byte por caractere) e reprova só aquele ID,
+        # em vez de derrubar o lote inteiro
+        arr = np.asarray([v.encode("ascii", errors="replace")[:width] for v in arr.tolist()],
+                         dtype=f"S{width}")
+    raw = arr.view(np.uint8).reshape(-1, width)
+    return [raw[:, j].astype(np.int16) - 48 for j in range(width)], ok
+
+def _validate_columns(columns: list, ok: np.ndarray, w1: list, w2: list, alnum: bool) -> np.ndarray:
+    n_base = len(w1)
+    s1 = np.zeros(len(ok), dtype=np.int16)
+    s2 = np.zeros(len(ok), dtype=np.int16)
+    same = np.ones(len(ok), dtype=bool)
+    first = columns[0]
+    for j, col in enumerate(columns):
+        if j < n_base and alnum:
+            # '0'-'9' -> 0..9, 'A'-'Z' -> 17..42
+            ok &= ((col >= 0) & (col <= 9)) | ((col >= 17) & (col <= 42))
+        else:
+            ok &= (col >= 0) & (col <= 9)
+        if j:
+            same &= col == first
+        if j < n_base:
+            s1 += w1[j] * col
+            s2 += w2[j] * col
+    r = s1 % 11
+    dv1 = np.where(r < 2, 0, 11 - r)
+    r = (s2 + w2[n_base] * columns[n_base]) % 11
+    dv2 = np.where(r < 2, 0, 11 - r)
+    return ok & ~same & (columns[n_base] == dv1) & (columns[n_base + 1] == dv2)
+
+def validate_cnpj_batch(values) -> np.ndarray:
+    """Valida muitos CNPJs de uma vez (vetorizado); retorna array de bool.
+
+    Para máxima vazão passe um array de inteiros ou de bytes 'S14' sem pontuação.
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool)
+    columns, ok = _as_columns(values, 14)
+    return _validate_columns(columns, ok, _CNPJ_W1, _CNPJ_W2, alnum=True)
+
+def validate_cpf_batch(values) -> np.ndarray:
+    """Valida muitos CPFs de uma vez (vetorizado); retorna array de bool"""
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool)
+    columns, ok = _as_columns(values, 11)
+    return _validate_columns(columns, ok, _CPF_W1, _CPF_W2, alnum=False)